@@ -71,6 +71,7 @@ from .results.bench_result import BenchResult
 from .results.panel_result import PanelResult
 from .results.holoview_result import ReduceType, HoloviewResult
 from .bench_report import BenchReport, GithubPagesCfg
-from .job import Executors
+from .job import Executors, ExecutorPool
+from .cache_backends import CacheBackends, ShardedStore
 from .video_writer import VideoWriter, add_image
 from .class_enum import ClassEnum, ExampleEnum
@@ -8,11 +8,14 @@ from typing import List
 import param
 import panel as pn
 from datetime import datetime
+from uuid import uuid4
 
 from bencher.variables.sweep_base import hash_sha1, describe_variable
+from bencher.utils import hash_callable
 from bencher.variables.time import TimeSnapshot, TimeEvent
 from bencher.variables.results import OptDir
 from bencher.job import Executors
+from bencher.cache_backends import CacheBackends
 from bencher.results.laxtex_result import to_latex
 
 
@@ -94,6 +97,75 @@ class BenchRunCfg(BenchPlotSrvCfg):
         doc="If true, every time the benchmark function is called, bencher will check if that value has been calculated before and if so load the from the cache.  Note that the sample level cache is different from the benchmark level cache which only caches the aggregate of all the results at the end of the benchmark. This cache lets you stop a benchmark halfway through and continue. However, beware that depending on how you change code in the objective function, the cache could provide values that are not correct.",
     )
 
+    sample_cache_backend = param.Selector(
+        objects=list(CacheBackends),
+        default=CacheBackends.DISKCACHE,
+        doc="The storage of the sample cache.  DISKCACHE stores the results in a single sqlite database that only the process running the sweep writes to.  SHARDED stores each result in its own file so that the worker processes and threads of the MULTIPROCESSING and THREADS executors write their results directly and concurrently, which avoids a single writer becoming the bottleneck of parallel sweeps with large results.  The backends use separate directories",
+    )
+
+    sample_cache_codec = param.String(
+        default="none",
+        doc='The codec the results in the sample cache are compressed with, as "name" or "name:level".  The codecs are none, zlib and lzma, and zstd and lz4 if the zstandard and lz4 packages are installed.  The codec is recorded with each result, so results stored with any codec (or none) are decompressed transparently and the codec can be changed without clearing the cache.  Sample results are usually small, so compression only pays off for workers that return large arrays',
+    )
+
+    bench_cache_codec = param.String(
+        default="zlib:1",
+        doc='The codec the cached BenchResults of whole sweeps and the over_time history are compressed with, as "name" or "name:level".  See sample_cache_codec for the available codecs',
+    )
+
+    history_window = param.Integer(
+        default=None,
+        bounds=[1, None],
+        allow_None=True,
+        doc="The number of the most recent runs of an over_time benchmark that are loaded from the history and plotted.  Runs are appended to the history without reading it, and only the chunks of the runs in the window are read, so the cost of a run does not grow with the length of the history.  If None, the whole history is loaded",
+    )
+
+    checkpoint = param.Boolean(
+        False,
+        doc="Append each completed sample of a sweep to a log in cachedir/checkpoints keyed by the hash of the benchmark.  If the sweep is interrupted, the next run of the same sweep replays the log into the results in one read and only runs the samples that are missing, even when cache_samples is off.  The log is deleted when the sweep completes",
+    )
+
+    out_of_core = param.Boolean(
+        False,
+        doc="Store the numeric results of a sweep in memory mapped files under cachedir/out_of_core instead of in memory, so sweeps with more results than fit in RAM are paged to disk as they are filled.  The mean, std, min and max over the repeats are calculated in blocks so the whole result is never read into memory at once.  The files of a sweep are overwritten the next time the same sweep is run",
+    )
+
+    reuse_repeats = param.Boolean(
+        True,
+        doc="When the results of a sweep are not in the benchmark cache, reuse the results of the same sweep that were saved with a different number of repeats.  If the number of repeats grows, the saved repeats are copied into the new result and only the extra repeats are calculated.  If it shrinks, the first repeats of the saved result are used.  This does not apply to over_time benchmarks or to results with ResultReference or ResultDataSet variables",
+    )
+
+    blob_threshold = param.Integer(
+        default=None,
+        bounds=[0, None],
+        allow_None=True,
+        doc="Results in the sample cache that are numpy arrays of at least this many bytes are stored once in a content addressed blob store under cachedir/blobs and the cache entries refer to them, and the image and video files that workers write to the paths from gen_path are moved into the store.  Identical arrays and files are only stored once, and a blob is deleted when the last cache entry that refers to it is removed.  Arrays are loaded back as read only memory maps, and the files are no longer at the paths the worker returned, so only turn this on for workers that do not change their results in place.  Defaults to None, where results are stored inline in the sample cache and files are left where the worker wrote them",
+    )
+
+    shared_sample_caches = param.List(
+        default=[],
+        item_type=str,
+        doc="Directories of sample caches that are shared read only, for example a prebuilt cache copied into a CI image or on a network mount.  Samples that are not in the local sample cache are looked up in the shared caches in order, and new results are only written to the local cache.  The directories can be diskcache or SHARDED sample caches, such as the cachedir/sample_cache directory of another machine",
+    )
+
+    memory_cache_entries = param.Integer(
+        default=10000,
+        bounds=[0, None],
+        doc="The number of the most recently used sample cache results that are kept in memory in front of the sample cache on disk.  The memory tier is shared by all the sweeps in a process, so results that are loaded again by the next level or repeat of a BenchRunner do not need a disk lookup.  Set to 0 to disable the memory tier",
+    )
+
+    memory_cache_bytes = param.Integer(
+        default=int(256e6),
+        bounds=[1, None],
+        allow_None=True,
+        doc="The maximum total size in bytes of the results kept in the memory tier of the sample cache, estimated from the size of their arrays and containers.  If None, the memory tier is only limited by memory_cache_entries",
+    )
+
+    legacy_cache_keys: bool = param.Boolean(
+        True,
+        doc="Samples are cached under a blake2b hash of the canonical binary representation of their inputs.  If true, samples that are not found under that key are also looked up under the sha1 key of the string representation of their inputs that older versions of bencher used, and results that are found are copied to the new key.  This migrates an existing sample cache as it is used, but costs an extra hash per missing sample, so turn it off once the cache has been migrated.  It is on by default for this release so that caches written by older versions keep being hit after an upgrade, and will be off by default in a later release",
+    )
+
     only_hash_tag: bool = param.Boolean(
         False,
         doc="By default when checking if a sample has been calculated before it includes the hash of the greater benchmarking context.  This is safer because it means that data generated from one benchmark will not affect data from another benchmark.  However, if you are careful it can be more flexible to ignore which benchmark generated the data and only use the tag hash to check if that data has been calculated before. ie, you can create two benchmarks that sample a subset of the problem during exploration and give them the same tag, and then afterwards create a larger benchmark that covers the cases you already explored.  If this value is true, the combined benchmark will use any data from other benchmarks with the same tag.",
@@ -157,6 +229,43 @@ class BenchRunCfg(BenchPlotSrvCfg):
         doc="The function can be run serially or in parallel with different futures executors",
     )
 
+    max_workers = param.Integer(
+        default=None,
+        bounds=[1, None],
+        allow_None=True,
+        doc="The number of workers used by the multiprocessing and thread executors, or the number of async workers that are awaited concurrently by the asyncio executor.  If None the executor default is used",
+    )
+
+    max_jobs_in_flight = param.Integer(
+        default=None,
+        bounds=[1, None],
+        allow_None=True,
+        doc="The maximum number of jobs submitted to a parallel executor that have not had their results stored yet.  Results are stored as soon as they complete, so memory use stays flat for large sweeps.  If None it defaults to 4x the number of cpus",
+    )
+
+    batch_size = param.Integer(
+        default=1000,
+        bounds=[1, None],
+        doc="The number of samples passed to each call of ParametrizedSweep.call_batch if the worker class implements it.  Batched workers are not run through the executor or sample cache",
+    )
+
+    remote_workers = param.List(
+        default=None,
+        allow_None=True,
+        item_type=str,
+        doc="The host:port addresses of the bencher-worker agents that evaluate samples when the executor is Executors.REMOTE.  Start an agent on each host with the bencher-worker command and set the BENCHER_AUTHKEY environment variable to the same value for the agents and the benchmark",
+    )
+
+    order_jobs_by_cost: bool = param.Boolean(
+        False,
+        doc="If true, the wall time of every sample is recorded and later runs of the sweep submit the samples that took longest first.  This avoids a long tail where a few slow samples run at the end of a parallel sweep while the other workers are idle.  Samples without a recorded time are submitted first",
+    )
+
+    inline_samples: bool = param.Boolean(
+        True,
+        doc="If true and the sweep runs with the serial executor without the sample cache, samples are evaluated inline without creating jobs, hashing their inputs or logging each call.  This removes most of the per sample overhead for very cheap benchmark functions",
+    )
+
     plot_size = param.Integer(default=None, doc="Sets the width and height of the plot")
     plot_width = param.Integer(
         default=None,
@@ -229,6 +338,11 @@ class BenchCfg(BenchRunCfg):
         doc="A list of ParameterizedSweep results collect and plot.",
     )
 
+    level_input_vars = param.List(
+        default=None,
+        doc="The input variables before they were sampled at the level of the benchmark, so that the benchmark can be refined to a higher level with Bench.refine().  None if the benchmark was not sampled with a level",
+    )
+
     const_vars = param.List(
         default=None,
         doc="Variables to keep constant but are different from the default value",
@@ -298,6 +412,11 @@ class BenchCfg(BenchRunCfg):
         doc="A callable that takes a BenchResult and returns panel representation of the results",
     )
 
+    constraint = param.Callable(
+        None,
+        doc="A function that is passed a dict of the input values of a sample and returns False if the combination of inputs should not be sampled.  Samples that are excluded are never scheduled, and the results are stored as a list of the sampled coordinates that are only converted to dense arrays when they are indexed, so sweeps with many inputs where most combinations are invalid do not allocate the full Cartesian product",
+    )
+
     def __init__(self, **params):
         super().__init__(**params)
         self.plot_lib = None
@@ -333,8 +452,20 @@ class BenchCfg(BenchRunCfg):
         for v in self.const_vars:
             hash_val = hash_sha1((v[0].hash_persistent(), hash_sha1(v[1])))
 
+        if self.constraint is not None:
+            # a constraint that can not be hashed reliably gets a unique hash so its results are never reused
+            hash_val = hash_sha1((hash_val, hash_callable(self.constraint) or uuid4().hex))
+
         return hash_val
 
+    def cacheable(self) -> bool:
+        """Returns false if the results of this sweep can not be identified by its hash, because it has a constraint that can not be hashed reliably
+
+        Returns:
+            bool: true if results can be stored and loaded by the hash of this config
+        """
+        return self.constraint is None or hash_callable(self.constraint) is not None
+
     def inputs_as_str(self) -> List[str]:
         return [i.name for i in self.input_vars]
 
@@ -6,7 +6,8 @@ from typing import List, Tuple
 from threading import Thread
 
 import panel as pn
-from diskcache import Cache
+from bencher.compression import open_cache
+from bencher.result_store import ResultStore, load_bench_result
 
 from bencher.bench_cfg import BenchCfg, BenchPlotSrvCfg
 
@@ -52,17 +53,17 @@ class BenchPlotServer:
             FileNotFoundError: No data found was found in the database to plot
         """
 
-        with Cache("cachedir/benchmark_inputs") as cache:
+        result_store = ResultStore()
+        with open_cache("cachedir/benchmark_inputs") as cache:
             if bench_name in cache:
                 logging.info(f"loading benchmarks: {bench_name}")
                 # use the benchmark name to look up the hash of the results
                 bench_cfg_hashes = cache[bench_name]
                 plots_instance = None
                 for bench_cfg_hash in bench_cfg_hashes:
-                    # load the results based on the hash retrieved from the benchmark name
-                    if bench_cfg_hash in cache:
-                        logging.info(f"loading cached results from key: {bench_cfg_hash}")
-                        bench_res = cache[bench_cfg_hash]
+                    # load the results based on the hash retrieved from the benchmark name.  Only the variables that are plotted are read
+                    bench_res = load_bench_result(bench_cfg_hash, cache, result_store)
+                    if bench_res is not None:
                         logging.info(f"loaded: {bench_res.bench_cfg.title}")
 
                         plots_instance = bench_res.to_auto_plots()
@@ -4,6 +4,7 @@ from bencher.bench_cfg import BenchRunCfg, BenchCfg
 from bencher.variables.parametrised_sweep import ParametrizedSweep
 from bencher.bencher import Bench
 from bencher.bench_report import BenchReport, GithubPagesCfg
+from bencher.job import ExecutorPool
 from copy import deepcopy
 
 
@@ -30,6 +31,8 @@ class BenchRunner:
             self.add_bench(bench_class)
         self.results = []
         self.servers = []
+        # executors are kept alive across levels and repeats so worker processes are only spawned once
+        self.executor_pool = ExecutorPool()
 
     @staticmethod
     def setup_run_cfg(
@@ -80,7 +83,7 @@ class BenchRunner:
         grouped: bool = True,
         cache_results: bool = True,
     ) -> List[Bench]:
-        """This function controls how a benchmark or a set of benchmarks are run. If you are only running a single benchmark it can be simpler to just run it directly, but if you are running several benchmarks together and want them to be sampled at different levels of fidelity or published together in a single report this function enables that workflow.  If you have an expensive function, it can be useful to view low fidelity results as they are computed but also continue to compute higher fidelity results while reusing previously computed values. The parameters min_level and max_level let you specify how to progressivly increase the sampling resolution of the benchmark sweep. By default cache_results=True so that previous values are reused.
+        """This function controls how a benchmark or a set of benchmarks are run. The executors used to run the benchmarks are owned by the BenchRunner, so parallel worker processes are reused across levels, repeats and calls to run() until shutdown() is called. If you are only running a single benchmark it can be simpler to just run it directly, but if you are running several benchmarks together and want them to be sampled at different levels of fidelity or published together in a single report this function enables that workflow.  If you have an expensive function, it can be useful to view low fidelity results as they are computed but also continue to compute higher fidelity results while reusing previously computed values. The parameters min_level and max_level let you specify how to progressivly increase the sampling resolution of the benchmark sweep. By default cache_results=True so that previous values are reused.
 
         Args:
             min_level (int, optional): The minimum level to start sampling at. Defaults to 2.
@@ -105,25 +108,26 @@ class BenchRunner:
         if level is not None:
             min_level = level
             max_level = level
-        for r in range(1, repeats + 1):
-            for lvl in range(min_level, max_level + 1):
-                if grouped:
-                    report_level = BenchReport(f"{run_cfg.run_tag}_{self.name}")
-
-                for bch_fn in self.bench_fns:
-                    run_lvl = deepcopy(run_cfg)
-                    run_lvl.level = lvl
-                    run_lvl.repeats = r
-                    logging.info(f"Running {bch_fn} at level: {lvl} with repeats:{r}")
+        with self.executor_pool.activate():
+            for r in range(1, repeats + 1):
+                for lvl in range(min_level, max_level + 1):
                     if grouped:
-                        res = bch_fn(run_lvl, report_level)
-                    else:
-                        res = bch_fn(run_lvl, BenchReport())
-                        res.report.bench_name = f"{run_cfg.run_tag}_{res.report.bench_name}"
-                        self.show_publish(res.report, show, publish, save, debug)
-                    self.results.append(res)
-                if grouped:
-                    self.show_publish(report_level, show, publish, save, debug)
+                        report_level = BenchReport(f"{run_cfg.run_tag}_{self.name}")
+
+                    for bch_fn in self.bench_fns:
+                        run_lvl = deepcopy(run_cfg)
+                        run_lvl.level = lvl
+                        run_lvl.repeats = r
+                        logging.info(f"Running {bch_fn} at level: {lvl} with repeats:{r}")
+                        if grouped:
+                            res = bch_fn(run_lvl, report_level)
+                        else:
+                            res = bch_fn(run_lvl, BenchReport())
+                            res.report.bench_name = f"{run_cfg.run_tag}_{res.report.bench_name}"
+                            self.show_publish(res.report, show, publish, save, debug)
+                        self.results.append(res)
+                    if grouped:
+                        self.show_publish(report_level, show, publish, save, debug)
         return self.results
 
     def show_publish(self, report: BenchReport, show: bool, publish: bool, save: bool, debug: bool):
@@ -154,8 +158,10 @@ class BenchRunner:
         self.show_publish(report=report, show=show, publish=publish, save=save, debug=debug)
 
     def shutdown(self):
+        """Stop any servers that were launched and release the worker processes"""
         while self.servers:
             self.servers.pop().stop()
+        self.executor_pool.shutdown()
 
     def __del__(self) -> None:
         self.shutdown()
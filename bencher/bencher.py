@@ -1,21 +1,27 @@
 import logging
+import math
+import os
+from concurrent.futures import Future, wait, FIRST_COMPLETED
 from datetime import datetime
 from itertools import product, combinations
 
-from typing import Callable, List, Optional
+from typing import Any, Callable, Iterator, List, Optional, Tuple
 from copy import deepcopy
 import numpy as np
 import param
 import xarray as xr
-from diskcache import Cache
 from contextlib import suppress
 from functools import partial
 import panel as pn
 
-from bencher.worker_job import WorkerJob
+from bencher.worker_job import WorkerJob, InlineSample, SampleKeyEncoder
 
 from bencher.bench_cfg import BenchCfg, BenchRunCfg, DimsCfg
 from bencher.bench_plot_server import BenchPlotServer
+from bencher.compression import open_cache
+from bencher.checkpoint_log import CheckpointLog
+from bencher.history_store import HistoryStore
+from bencher.result_store import ResultStore, load_bench_result
 from bencher.bench_report import BenchReport
 
 from bencher.variables.inputs import IntSweep
@@ -33,9 +39,20 @@ from bencher.variables.results import (
     ResultDataSet,
 )
 from bencher.results.bench_result import BenchResult
+from bencher.result_buffer import ResultBuffer, SparseResultBuffer
 from bencher.variables.parametrised_sweep import ParametrizedSweep
-from bencher.job import Job, FutureCache, JobFuture, Executors
-from bencher.utils import params_to_str
+from bencher.job import Job, FutureCache, JobFuture, ExecutorPool, Executors, await_result
+from bencher.utils import params_to_str, hmap_canonical_input, chunks
+from bencher.worker_registry import (
+    WorkerContext,
+    worker_key,
+    content_key,
+    register_context,
+    publish_context,
+    get_context,
+    run_in_context,
+    release_context,
+)
 
 # Customize the formatter
 formatter = logging.Formatter("%(levelname)s: %(message)s")
@@ -46,65 +63,26 @@ for handler in logging.root.handlers:
     handler.setFormatter(formatter)
 
 
-def set_xarray_multidim(data_array: xr.DataArray, index_tuple, value: float) -> xr.DataArray:
-    # """This is terrible, I need to do this in a better way, but [] does not like *args syntax and the () version of the set function doesn't either"""
-    match len(index_tuple):
-        case 1:
-            data_array[index_tuple[0]] = value
-        case 2:
-            data_array[index_tuple[0], index_tuple[1]] = value
-        case 3:
-            data_array[index_tuple[0], index_tuple[1], index_tuple[2]] = value
-        case 4:
-            data_array[index_tuple[0], index_tuple[1], index_tuple[2], index_tuple[3]] = value
-        case 5:
-            data_array[
-                index_tuple[0], index_tuple[1], index_tuple[2], index_tuple[3], index_tuple[4]
-            ] = value
-        case 6:
-            data_array[
-                index_tuple[0],
-                index_tuple[1],
-                index_tuple[2],
-                index_tuple[3],
-                index_tuple[4],
-                index_tuple[5],
-            ] = value
-        case 7:
-            data_array[
-                index_tuple[0],
-                index_tuple[1],
-                index_tuple[2],
-                index_tuple[3],
-                index_tuple[4],
-                index_tuple[5],
-                index_tuple[6],
-            ] = value
-        case 8:
-            data_array[
-                index_tuple[0],
-                index_tuple[1],
-                index_tuple[2],
-                index_tuple[3],
-                index_tuple[4],
-                index_tuple[5],
-                index_tuple[6],
-                index_tuple[7],
-            ] = value
-        case 9:
-            data_array[
-                index_tuple[0],
-                index_tuple[1],
-                index_tuple[2],
-                index_tuple[3],
-                index_tuple[4],
-                index_tuple[5],
-                index_tuple[6],
-                index_tuple[7],
-                index_tuple[8],
-            ] = value
-
-    return data_array
+# the number of samples that are looked up in the sample cache at once
+CACHE_PROBE_SIZE = 1000
+
+# result types that can be written into the dataset directly from an array of values
+BATCH_RESULT_TYPES = (
+    ResultVar,
+    ResultVec,
+    ResultVideo,
+    ResultImage,
+    ResultString,
+    ResultContainer,
+    ResultPath,
+)
+
+
+def batch_column(values: List) -> np.ndarray:
+    """Convert a list of sweep values to a column for ParametrizedSweep.call_batch. Numeric values become a numeric array and all other values such as enums and strings are kept as python objects"""
+    if all(isinstance(v, (bool, int, float, np.number, np.bool_)) for v in values):
+        return np.array(values)
+    return np.fromiter(values, dtype=object, count=len(values))
 
 
 def kwargs_to_input_cfg(worker_input_cfg: ParametrizedSweep, **kwargs) -> ParametrizedSweep:
@@ -118,17 +96,6 @@ def worker_cfg_wrapper(worker, worker_input_cfg: ParametrizedSweep, **kwargs) ->
     return worker(input_cfg)
 
 
-def worker_kwargs_wrapper(worker: Callable, bench_cfg: BenchCfg, **kwargs) -> dict:
-    function_input_deep = deepcopy(kwargs)
-    if not bench_cfg.pass_repeat:
-        function_input_deep.pop("repeat")
-    if "over_time" in function_input_deep:
-        function_input_deep.pop("over_time")
-    if "time_event" in function_input_deep:
-        function_input_deep.pop("time_event")
-    return worker(**function_input_deep)
-
-
 class Bench(BenchPlotServer):
     def __init__(
         self,
@@ -137,6 +104,7 @@ class Bench(BenchPlotServer):
         worker_input_cfg: ParametrizedSweep = None,
         run_cfg=None,
         report=None,
+        executor_pool: ExecutorPool = None,
     ) -> None:
         """Create a new Bench object from a function and a class defining the inputs to the function
 
@@ -144,6 +112,7 @@ class Bench(BenchPlotServer):
             bench_name (str): The name of the benchmark and output folder for the figures
             worker (Callable | ParametrizedSweep): A function that accepts a class of type (worker_input_config)
             worker_input_config (ParametrizedSweep): A class defining the parameters of the function.
+            executor_pool (ExecutorPool, optional): A pool of long lived executors that are reused across sweeps. If None, the active ExecutorPool is used, otherwise a new executor is created and shut down for every sweep. Defaults to None.
         """
         assert isinstance(bench_name, str)
         self.bench_name = bench_name
@@ -164,6 +133,9 @@ class Bench(BenchPlotServer):
         self.bench_cfg_hashes = []  # a list of hashes that point to benchmark results
         self.last_run_cfg = None  # cached run_cfg used to pass to the plotting function
         self.sample_cache = None  # store the results of each benchmark function call in a cache
+        self.executor_pool = executor_pool
+        self.worker_context_key = None  # the key of the worker in the worker registry
+        self.checkpoint_log = None  # the log of the completed samples of the running sweep
         self.ds_dynamic = {}  # A dictionary to store unstructured vector datasets
 
         self.cache_size = int(100e9)  # default to 100gb
@@ -258,6 +230,7 @@ class Bench(BenchPlotServer):
         tag: str = "",
         run_cfg: BenchRunCfg = None,
         plot_callbacks: List | bool = None,
+        constraint: Callable[[dict], bool] = None,
     ) -> BenchResult:
         """The all in 1 function benchmarker and results plotter.
 
@@ -274,6 +247,7 @@ class Bench(BenchPlotServer):
             tag (str,optional): Use tags to group different benchmarks together.
             run_cfg: (BenchRunCfg, optional): A config for storing how the benchmarks and run
             plot_callbacks: (List | bool) A list of plot callbacks to call on the results. Pass false or an empty list to turn off plotting
+            constraint: (Callable[[dict], bool], optional) A function that is passed a dict of the input values of a sample and returns False if the combination of inputs should not be sampled. The results of constrained sweeps are stored sparsely so the skipped combinations do not use memory
         Raises:
             ValueError: If a result variable is not set
 
@@ -373,9 +347,11 @@ class Bench(BenchPlotServer):
             else:
                 title = "Recording: " + ", ".join([i.name for i in result_vars_in])
 
+        level_input_vars = None
         if run_cfg.level > 0:
             inputs = []
             print(input_vars_in)
+            level_input_vars = input_vars_in
             if len(input_vars_in) > 0:
                 for i in input_vars_in:
                     inputs.append(i.with_level(run_cfg.level))
@@ -413,6 +389,7 @@ class Bench(BenchPlotServer):
 
         bench_cfg = BenchCfg(
             input_vars=input_vars_in,
+            level_input_vars=level_input_vars,
             result_vars=result_vars_only,
             result_hmaps=result_hmaps,
             const_vars=const_vars_in,
@@ -423,13 +400,84 @@ class Bench(BenchPlotServer):
             pass_repeat=pass_repeat,
             tag=run_cfg.run_tag + tag,
             plot_callbacks=plot_callbacks,
+            constraint=constraint,
         )
         return self.run_sweep(bench_cfg, run_cfg, time_src)
 
+    def refine(
+        self,
+        bench_res: BenchResult,
+        level: int = None,
+        run_cfg: BenchRunCfg = None,
+        time_src: datetime = None,
+    ) -> BenchResult:
+        """Sample the sweep of a result at a higher level.  The samples of a level are a subset of the samples of the next level, so the samples of the result are copied into the refined result and only the new samples are calculated.  The refined result contains every level up to its own, so the lower levels can be selected from it with BenchResult.select_level()
+
+        Args:
+            bench_res (BenchResult): a result of a sweep that was sampled with run_cfg.level
+            level (int, optional): the level to sample the sweep at. Defaults to the level of the result + 1.
+            run_cfg (BenchRunCfg, optional): the run configuration.  Defaults to the run configuration of the result.
+            time_src (datetime, optional): Set a time that the result was generated. Defaults to datetime.now().
+
+        Raises:
+            ValueError: If the sweep of the result was not sampled with a level, or was run by a different benchmark
+
+        Returns:
+            BenchResult: the refined result
+        """
+        prior_cfg = bench_res.bench_cfg
+        if prior_cfg.level_input_vars is None:
+            raise ValueError("Only the results of sweeps sampled with run_cfg.level can be refined")
+        if prior_cfg.bench_name != self.bench_name:
+            raise ValueError(
+                f"the result was run by the benchmark {prior_cfg.bench_name}, not {self.bench_name}"
+            )
+        if run_cfg is None:
+            run_params = BenchRunCfg.param.objects().keys() - {"name"}
+            run_cfg = BenchRunCfg(
+                **{k: v for k, v in prior_cfg.param.values().items() if k in run_params}
+            )
+        else:
+            run_cfg = deepcopy(run_cfg)
+        run_cfg.level = prior_cfg.level + 1 if level is None else level
+        self.last_run_cfg = run_cfg
+
+        bench_cfg = BenchCfg(
+            input_vars=[i.with_level(run_cfg.level) for i in prior_cfg.level_input_vars],
+            level_input_vars=prior_cfg.level_input_vars,
+            result_vars=prior_cfg.result_vars,
+            result_hmaps=prior_cfg.result_hmaps,
+            const_vars=prior_cfg.const_vars,
+            bench_name=self.bench_name,
+            description=prior_cfg.description,
+            post_description=prior_cfg.post_description,
+            title=prior_cfg.title,
+            pass_repeat=prior_cfg.pass_repeat,
+            tag=prior_cfg.tag,
+            plot_callbacks=prior_cfg.plot_callbacks,
+            constraint=prior_cfg.constraint,
+        )
+        return self.run_sweep(bench_cfg, run_cfg, time_src, bench_res)
+
     def run_sweep(
-        self, bench_cfg: BenchCfg, run_cfg: BenchRunCfg, time_src: datetime
+        self,
+        bench_cfg: BenchCfg,
+        run_cfg: BenchRunCfg,
+        time_src: datetime,
+        prior_res: BenchResult = None,
     ) -> BenchResult:
-        print("tag", bench_cfg.tag)
+        logging.debug(f"tag {bench_cfg.tag}")
+
+        if not bench_cfg.cacheable():
+            if run_cfg.only_plot:
+                raise ValueError(
+                    "the results of a sweep with a constraint that can not be hashed can not be loaded"
+                )
+            logging.warning(
+                f"the constraint {bench_cfg.constraint} can not be hashed reliably, so the results of this sweep are not cached or checkpointed"
+            )
+            run_cfg = deepcopy(run_cfg)
+            run_cfg.param.update(cache_results=False, reuse_repeats=False, checkpoint=False)
 
         bench_cfg.param.update(run_cfg.param.values())
         bench_cfg_hash = bench_cfg.hash_persistent(True)
@@ -444,42 +492,64 @@ class Bench(BenchPlotServer):
             self.clear_tag_from_sample_cache(bench_cfg.tag, run_cfg)
 
         calculate_results = True
-        with Cache("cachedir/benchmark_inputs", size_limit=self.cache_size) as c:
+        if prior_res is not None and not self.prior_reusable(bench_cfg):
+            prior_res = None
+        result_store = ResultStore(codec=run_cfg.bench_cache_codec)
+        with open_cache(
+            "cachedir/benchmark_inputs", run_cfg.bench_cache_codec, size_limit=self.cache_size
+        ) as c:
             if run_cfg.clear_cache:
                 c.delete(bench_cfg_hash)
+                result_store.delete(bench_cfg_hash)
+                c.delete(("repeats", bench_cfg_sample_hash))
+                if self.sample_cache.blobs is not None:
+                    self.sample_cache.blobs.release("benchmark_inputs", [bench_cfg_hash])
                 logging.info("cleared cache")
             elif run_cfg.cache_results:
                 logging.info(
                     f"checking for previously calculated results with key: {bench_cfg_hash}"
                 )
-                if bench_cfg_hash in c:
-                    logging.info(f"loading cached results from key: {bench_cfg_hash}")
-                    bench_res = c[bench_cfg_hash]
+                cached_res = load_bench_result(bench_cfg_hash, c, result_store)
+                if cached_res is not None:
+                    logging.info(f"loaded cached results from key: {bench_cfg_hash}")
+                    bench_res = cached_res
                     # if not over_time:  # if over time we always want to calculate results
                     calculate_results = False
                 else:
                     logging.info("did not detect results in cache")
                     if run_cfg.only_plot:
                         raise FileNotFoundError("Was not able to load the results to plot!")
+                    if prior_res is None and run_cfg.reuse_repeats:
+                        prior_res = self.load_prior_repeats(
+                            c, result_store, bench_cfg, bench_cfg_sample_hash
+                        )
 
         if calculate_results:
             if run_cfg.time_event is not None:
                 time_src = run_cfg.time_event
             bench_res = self.calculate_benchmark_results(
-                bench_cfg, time_src, bench_cfg_sample_hash, run_cfg
+                bench_cfg, time_src, bench_cfg_sample_hash, run_cfg, prior_res
             )
 
             # use the hash of the inputs to look up historical values in the cache
             if run_cfg.over_time:
                 bench_res.ds = self.load_history_cache(
-                    bench_res.ds, bench_cfg_hash, run_cfg.clear_history
+                    bench_res.ds,
+                    bench_cfg_hash,
+                    run_cfg.clear_history,
+                    run_cfg.bench_cache_codec,
+                    run_cfg.history_window,
                 )
 
             self.report_results(bench_res, run_cfg.print_xarray, run_cfg.print_pandas)
-            self.cache_results(bench_res, bench_cfg_hash)
+            if bench_cfg.cacheable():
+                self.cache_results(bench_res, bench_cfg_hash, result_store, bench_cfg_sample_hash)
 
         logging.info(self.sample_cache.stats())
         self.sample_cache.close()
+        if self.worker_context_key is not None:
+            # tear down the worker if it was set up by the serial, thread or asyncio executors
+            release_context(self.worker_context_key)
 
         bench_res.post_setup()
 
@@ -523,21 +593,150 @@ class Bench(BenchPlotServer):
             )
         return variable
 
-    def cache_results(self, bench_res: BenchResult, bench_cfg_hash: int) -> None:
-        with Cache("cachedir/benchmark_inputs", size_limit=self.cache_size) as c:
-            logging.info(f"saving results with key: {bench_cfg_hash}")
+    def cache_results(
+        self,
+        bench_res: BenchResult,
+        bench_cfg_hash: int,
+        result_store: ResultStore = None,
+        bench_cfg_sample_hash: str = None,
+    ) -> None:
+        """Save the results of the benchmark to the result store, and the hash of the results to the benchmark cache under the name of the benchmark so the plot server can find them
+
+        Args:
+            bench_res (BenchResult): the results of the benchmark
+            bench_cfg_hash (int): the hash of the benchmark configuration
+            result_store (ResultStore, optional): the store to save the results to. Defaults to None, the default ResultStore.
+            bench_cfg_sample_hash (str, optional): the hash of the benchmark configuration without the repeats.  If passed, the results are recorded as a source of repeats for the same sweep with a different number of repeats. Defaults to None.
+        """
+        if result_store is None:
+            result_store = ResultStore()
+        logging.info(f"saving results with key: {bench_cfg_hash}")
+        # object index may not be pickleable so it is not saved
+        result_store.save(bench_cfg_hash, bench_res)
+        # the stored result refers to the image and video files in the blob store
+        if self.sample_cache is not None and self.sample_cache.blobs is not None:
+            self.sample_cache.blobs.retain("benchmark_inputs", bench_cfg_hash, bench_res.ds)
+
+        with open_cache("cachedir/benchmark_inputs", size_limit=self.cache_size) as c:
+            # remove the whole pickled result an older version of bencher may have saved
+            c.delete(bench_cfg_hash)
             self.bench_cfg_hashes.append(bench_cfg_hash)
-            # object index may not be pickleable so remove before caching
-            obj_index_tmp = bench_res.object_index
-            bench_res.object_index = []
+            logging.info(f"saving benchmark: {self.bench_name}")
+            c[self.bench_name] = self.bench_cfg_hashes
+            if bench_cfg_sample_hash is not None:
+                with c.transact():
+                    stored = c.get(("repeats", bench_cfg_sample_hash), {})
+                    stored[bench_res.bench_cfg.repeats] = bench_cfg_hash
+                    c[("repeats", bench_cfg_sample_hash)] = stored
+
+    @staticmethod
+    def prior_reusable(bench_cfg: BenchCfg) -> bool:
+        """The samples of a previous result can be reused by a sweep with a different number of repeats or level unless the result has a time dimension, or refers to objects and datasets by their index in lists that are not saved"""
+        return not bench_cfg.over_time and not any(
+            isinstance(rv, (ResultReference, ResultDataSet)) for rv in bench_cfg.result_vars
+        )
 
-            c[bench_cfg_hash] = bench_res
+    def load_prior_repeats(
+        self, cache, result_store: ResultStore, bench_cfg: BenchCfg, bench_cfg_sample_hash: str
+    ) -> Optional[BenchResult]:
+        """Find the saved results of the same sweep with a different number of repeats.  A result with at least as many repeats is preferred as no samples need to be calculated, otherwise the result with the most repeats is used
 
-            # restore object index
-            bench_res.object_index = obj_index_tmp
+        Args:
+            cache (Cache): the benchmark cache
+            result_store (ResultStore): the store of the results
+            bench_cfg (BenchCfg): the sweep
+            bench_cfg_sample_hash (str): the hash of the sweep without the repeats
 
-            logging.info(f"saving benchmark: {self.bench_name}")
-            c[self.bench_name] = self.bench_cfg_hashes
+        Returns:
+            Optional[BenchResult]: the saved result, or None if there is no result to reuse
+        """
+        if not self.prior_reusable(bench_cfg):
+            return None
+        stored = cache.get(("repeats", bench_cfg_sample_hash), {})
+        if not stored:
+            return None
+        enough = [r for r in stored if r >= bench_cfg.repeats]
+        repeats = min(enough) if enough else max(stored)
+        prior_res = load_bench_result(stored[repeats], cache, result_store)
+        if prior_res is not None:
+            logging.info(f"reusing {min(repeats, bench_cfg.repeats)} repeats of a saved result")
+        return prior_res
+
+    @staticmethod
+    def match_coords(prior: Any, current: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """Find the values of the coordinates of a dimension of a previous result that are also coordinates of the current sweep.  Numeric values are compared with a tolerance because the float samples of different levels are calculated separately, and other values are compared by their string representation because boolean coordinates are converted to strings after a sweep
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: the indices of the matching values in the previous and the current coordinates
+        """
+        prior = np.asarray(prior)
+        current = np.asarray(current)
+        if prior.dtype.kind in "iuf" and current.dtype.kind in "iuf":
+            matches = np.isclose(prior[:, None], current[None, :], rtol=1e-9, atol=1e-12)
+        else:
+            matches = prior.astype(str)[:, None] == current.astype(str)[None, :]
+        prior_index, current_index = np.nonzero(matches)
+        current_index, first = np.unique(current_index, return_index=True)
+        return prior_index[first], current_index
+
+    def reuse_prior_result(
+        self,
+        prior_res: BenchResult,
+        bench_res: BenchResult,
+        result_buffer: ResultBuffer,
+        func_inputs: List,
+        dims_name: List[str],
+    ) -> List:
+        """Copy the samples of a previous result of the same sweep into the result buffer.  The previous result can have a different number of repeats, or be sampled at a different level, so only the samples at the coordinates the sweeps have in common are copied
+
+        Args:
+            prior_res (BenchResult): the previous result
+            bench_res (BenchResult): the results of this sweep
+            result_buffer (ResultBuffer): the arrays of the results of this sweep
+            func_inputs (List): A list of (index_tuple, input_values) for every sample of the sweep
+            dims_name (List[str]): The names of the dimensions of the dataset
+
+        Returns:
+            List: the samples of func_inputs that still need to be calculated
+        """
+        prior_ds = prior_res.ds
+        if set(prior_ds.dims) != set(dims_name) or any(
+            name not in prior_ds for name in result_buffer.data_vars
+        ):
+            return func_inputs
+        prior_lookup = []
+        for name in dims_name:
+            p, c = self.match_coords(prior_ds.coords[name].values, result_buffer.coords[name])
+            if len(c) == 0:
+                return func_inputs
+            # the index of each coordinate of this sweep in the previous result, or -1
+            lookup = np.full(len(result_buffer.coords[name]), -1)
+            lookup[c] = p
+            prior_lookup.append(lookup)
+
+        reused, remaining = [], []
+        for sample in func_inputs:
+            prior_idx = tuple(lookup[i] for i, lookup in zip(sample[0], prior_lookup))
+            if min(prior_idx) < 0:
+                remaining.append(sample)
+            else:
+                reused.append((sample[0], prior_idx))
+
+        if len(reused) > 0:
+            index = result_buffer.flat_index(tuple(np.array([i for i, _ in reused]).T))
+            prior_index = {
+                name: xr.DataArray(np.array([p for _, p in reused])[:, d], dims="sample")
+                for d, name in enumerate(dims_name)
+            }
+            for name in result_buffer.data_vars:
+                result_buffer.set(name, index, prior_ds[name].isel(prior_index).values)
+        for name, hmap in prior_res.hmaps.items():
+            bench_res.hmaps[name].update(hmap)
+
+        logging.info(
+            f"reused {len(func_inputs) - len(remaining)} of {len(func_inputs)} samples from a previous result"
+        )
+        return remaining
 
     # def show(self, run_cfg: BenchRunCfg = None, pane=None) -> None:
     #     """Launches a webserver with plots of the benchmark results, blocking
@@ -555,45 +754,64 @@ class Bench(BenchPlotServer):
     #     return BenchPlotServer().plot_server(self.bench_name, run_cfg, pane)
 
     def load_history_cache(
-        self, dataset: xr.Dataset, bench_cfg_hash: int, clear_history: bool
+        self,
+        dataset: xr.Dataset,
+        bench_cfg_hash: int,
+        clear_history: bool,
+        codec: str = "none",
+        window: int = None,
     ) -> xr.Dataset:
-        """Load historical data from a cache if over_time=true
+        """Add the results to the history of the benchmark if over_time=true and load the history.  Each run is appended to the history as a chunk, so the existing history is not read or rewritten
 
         Args:
             ds (xr.Dataset): Freshly calculated data
             bench_cfg_hash (int): Hash of the input variables used to generate the data
             clear_history (bool): Optionally clear the history
+            codec (str, optional): The codec the history is compressed with. Defaults to "none".
+            window (int, optional): Only load this many of the most recent runs. Defaults to None.
 
         Returns:
             xr.Dataset: historical data as an xr dataset
         """
-        with Cache("cachedir/history", size_limit=self.cache_size) as c:
-            if clear_history:
-                logging.info("clearing history")
-            else:
-                logging.info(f"checking historical key: {bench_cfg_hash}")
-                if bench_cfg_hash in c:
-                    logging.info("loading historical data from cache")
-                    ds_old = c[bench_cfg_hash]
-                    dataset = xr.concat([ds_old, dataset], "over_time")
-                else:
-                    logging.info("did not detect any historical data")
-
-            logging.info("saving data to history cache")
-            c[bench_cfg_hash] = dataset
-        return dataset
+        history = HistoryStore(codec=codec)
+        blobs = self.sample_cache.blobs if self.sample_cache is not None else None
+        if clear_history:
+            logging.info("clearing history")
+            removed = history.clear(bench_cfg_hash)
+            if blobs is not None:
+                blobs.release("history", removed)
+        elif bench_cfg_hash not in history:
+            self.migrate_history_cache(history, bench_cfg_hash)
+
+        logging.info("saving data to history cache")
+        chunk = history.append(bench_cfg_hash, dataset)
+        # the history refers to the image and video files in the blob store
+        if blobs is not None:
+            blobs.retain("history", chunk, dataset)
+        return history.load(bench_cfg_hash, last=window)
+
+    def migrate_history_cache(self, history: HistoryStore, bench_cfg_hash: int) -> None:
+        """Move the history that older versions of bencher stored as a single dataset in cachedir/history into the first chunk of the history store"""
+        if not os.path.isdir("cachedir/history"):
+            return
+        with open_cache("cachedir/history", size_limit=self.cache_size) as c:
+            ds_old = c.get(bench_cfg_hash)
+            if ds_old is not None:
+                logging.info("moving historical data to the history store")
+                history.append(bench_cfg_hash, ds_old)
+                c.delete(bench_cfg_hash)
 
     def setup_dataset(
         self, bench_cfg: BenchCfg, time_src: datetime | str
-    ) -> tuple[BenchResult, List, List]:
-        """A function for generating an n-d xarray from a set of input variables in the BenchCfg
+    ) -> tuple[BenchResult, List, List, ResultBuffer]:
+        """A function for allocating the n-d result arrays for a set of input variables in the BenchCfg
 
         Args:
             bench_cfg (BenchCfg): description of the benchmark parameters
             time_src (datetime | str): a representation of the sample time
 
         Returns:
-            tuple[BenchResult, List, List]: bench_result, function inputs, dimension names
+            tuple[BenchResult, List, List, ResultBuffer]: bench_result, function inputs, dimension names, result buffer
         """
 
         if time_src is None:
@@ -611,35 +829,51 @@ class Bench(BenchPlotServer):
         function_inputs = list(
             zip(product(*dims_cfg.dim_ranges_index), product(*dims_cfg.dim_ranges))
         )
-        # xarray stores K N-dimensional arrays of data.  Each array is named and in this case we have an ND array for each result variable
-        data_vars = {}
+        # xarray stores K N-dimensional arrays of data.  Each array is named and in this case we have an ND array for each result variable.  The arrays are filled as flat buffers and converted to a dataset once all the results are stored
+        if bench_cfg.constraint is None:
+            result_buffer = ResultBuffer(
+                dims_cfg.dims_name,
+                dims_cfg.dims_size,
+                dims_cfg.coords,
+                f"cachedir/out_of_core/{bench_cfg.hash_value}" if bench_cfg.out_of_core else None,
+            )
+        else:
+            # only the combinations of inputs that satisfy the constraint are sampled and stored
+            input_names = [i.name for i in bench_cfg.input_vars]
+            function_inputs = [
+                (index_tuple, values)
+                for index_tuple, values in function_inputs
+                if bench_cfg.constraint(dict(zip(input_names, values)))
+            ]
+            logging.info(f"the constraint selected {len(function_inputs)} samples")
+            result_buffer = SparseResultBuffer(
+                dims_cfg.dims_name,
+                dims_cfg.dims_size,
+                dims_cfg.coords,
+                [index_tuple for index_tuple, _ in function_inputs],
+            )
         dataset_list = []
 
         for rv in bench_cfg.result_vars:
             if isinstance(rv, ResultVar):
-                result_data = np.full(dims_cfg.dims_size, np.nan, dtype=float)
-                data_vars[rv.name] = (dims_cfg.dims_name, result_data)
+                result_buffer.add_var(rv.name, np.nan, float)
             if isinstance(rv, (ResultReference, ResultDataSet)):
-                result_data = np.full(dims_cfg.dims_size, -1, dtype=int)
-                data_vars[rv.name] = (dims_cfg.dims_name, result_data)
+                result_buffer.add_var(rv.name, -1, int)
             if isinstance(
                 rv, (ResultPath, ResultVideo, ResultImage, ResultString, ResultContainer)
             ):
-                result_data = np.full(dims_cfg.dims_size, "NAN", dtype=object)
-                data_vars[rv.name] = (dims_cfg.dims_name, result_data)
+                result_buffer.add_var(rv.name, "NAN", object)
 
             elif type(rv) is ResultVec:
                 for i in range(rv.size):
-                    result_data = np.full(dims_cfg.dims_size, np.nan)
-                    data_vars[rv.index_name(i)] = (dims_cfg.dims_name, result_data)
+                    result_buffer.add_var(rv.index_name(i), np.nan, float)
 
         bench_res = BenchResult(bench_cfg)
-        bench_res.ds = xr.Dataset(data_vars=data_vars, coords=dims_cfg.coords)
         bench_res.ds_dynamic = self.ds_dynamic
         bench_res.dataset_list = dataset_list
         bench_res.setup_object_index()
 
-        return bench_res, function_inputs, dims_cfg.dims_name
+        return bench_res, function_inputs, dims_cfg.dims_name, result_buffer
 
     def define_const_inputs(self, const_vars) -> dict:
         constant_inputs = None
@@ -685,126 +919,513 @@ class Bench(BenchPlotServer):
         return extra_vars
 
     def calculate_benchmark_results(
-        self, bench_cfg, time_src: datetime | str, bench_cfg_sample_hash, bench_run_cfg
+        self,
+        bench_cfg,
+        time_src: datetime | str,
+        bench_cfg_sample_hash,
+        bench_run_cfg,
+        prior_res: BenchResult = None,
     ) -> BenchResult:
         """A function for generating an n-d xarray from a set of input variables in the BenchCfg
 
         Args:
             bench_cfg (BenchCfg): description of the benchmark parameters
             time_src (datetime): a representation of the sample time
+            prior_res (BenchResult, optional): a saved result of the same sweep with a different number of repeats to copy repeats from. Defaults to None.
 
         Returns:
             bench_cfg (BenchCfg): description of the benchmark parameters
         """
-        bench_res, func_inputs, dims_name = self.setup_dataset(bench_cfg, time_src)
+        bench_res, func_inputs, dims_name, result_buffer = self.setup_dataset(bench_cfg, time_src)
         bench_res.bench_cfg.hmap_kdims = sorted(dims_name)
+        if prior_res is not None:
+            func_inputs = self.reuse_prior_result(
+                prior_res, bench_res, result_buffer, func_inputs, dims_name
+            )
+        checkpoint = None
+        if bench_run_cfg.checkpoint:
+            checkpoint = CheckpointLog(bench_cfg.hash_value)
+            func_inputs = self.replay_checkpoint(
+                checkpoint, bench_res, result_buffer, func_inputs, bench_run_cfg
+            )
         constant_inputs = self.define_const_inputs(bench_res.bench_cfg.const_vars)
-        callcount = 1
+        worker = self.setup_worker_context(bench_res.bench_cfg, bench_run_cfg)
 
-        results_list = []
-        jobs = []
+        self.checkpoint_log = checkpoint
+        try:
+            if self.use_batch_call(bench_res.bench_cfg):
+                self.calculate_batched_results(
+                    bench_res, result_buffer, func_inputs, dims_name, constant_inputs, bench_run_cfg
+                )
+            elif self.use_inline_call(bench_run_cfg):
+                self.calculate_inline_results(
+                    bench_res, result_buffer, func_inputs, dims_name, constant_inputs, bench_run_cfg
+                )
+            else:
+                self.calculate_job_results(
+                    bench_res,
+                    result_buffer,
+                    func_inputs,
+                    dims_name,
+                    constant_inputs,
+                    bench_cfg_sample_hash,
+                    bench_run_cfg,
+                    worker,
+                )
+        finally:
+            # the log is kept if the sweep is interrupted so the next run can resume from it
+            self.checkpoint_log = None
+            if checkpoint is not None:
+                checkpoint.close()
+        if checkpoint is not None:
+            checkpoint.delete()
+        bench_res.ds = result_buffer.to_dataset()
 
-        for idx_tuple, function_input_vars in func_inputs:
+        for inp in bench_res.bench_cfg.all_vars:
+            self.add_metadata_to_dataset(bench_res, inp)
+
+        return bench_res
+
+    def replay_checkpoint(
+        self,
+        checkpoint: CheckpointLog,
+        bench_res: BenchResult,
+        result_buffer: ResultBuffer,
+        func_inputs: List,
+        bench_run_cfg: BenchRunCfg,
+    ) -> List:
+        """Store the samples recorded in the checkpoint log of an interrupted run of the sweep
+
+        Args:
+            checkpoint (CheckpointLog): the log of the sweep
+            bench_res (BenchResult): The results to store the samples in
+            result_buffer (ResultBuffer): The arrays to store the samples in
+            func_inputs (List): A list of (index_tuple, input_values) for every sample of the sweep
+            bench_run_cfg (BenchRunCfg): The run configuration
+
+        Returns:
+            List: the samples of func_inputs that are not in the log
+        """
+        replayed = set()
+        for index_tuple, result, canonical_input in checkpoint.replay():
+            sample = InlineSample(index_tuple, {}, canonical_input)
+            self.store_sample(result, bench_res, result_buffer, sample, bench_run_cfg)
+            replayed.add(index_tuple)
+        if len(replayed) == 0:
+            return func_inputs
+        logging.info(f"replayed {len(replayed)} samples from {checkpoint.path}")
+        return [(idx, values) for idx, values in func_inputs if tuple(idx) not in replayed]
+
+    def calculate_job_results(
+        self,
+        bench_res: BenchResult,
+        result_buffer: ResultBuffer,
+        func_inputs: List,
+        dims_name: List[str],
+        constant_inputs: dict,
+        bench_cfg_sample_hash: str,
+        bench_run_cfg: BenchRunCfg,
+        worker: Callable,
+    ) -> None:
+        """Evaluate the sweep by submitting a job for every sample to the sample cache, which either loads the result from the cache or runs the job on the executor
+
+        Args:
+            bench_res (BenchResult): The results to store the job outputs in
+            result_buffer (ResultBuffer): The arrays to store the job outputs in
+            func_inputs (List): A list of (index_tuple, input_values) for every sample of the sweep
+            dims_name (List[str]): The names of the dimensions of the dataset
+            constant_inputs (dict): Inputs that are the same for every sample
+            bench_cfg_sample_hash (str): The hash of the sweep without the repeats, used in the key of each sample
+            bench_run_cfg (BenchRunCfg): The run configuration
+            worker (Callable): The function that is submitted with each job
+        """
+        max_in_flight = bench_run_cfg.max_jobs_in_flight
+        if max_in_flight is None:
+            max_in_flight = 4 * (os.cpu_count() or 1)
+        # jobs that have been submitted to the executor but whose results have not been stored yet
+        in_flight = {}
+
+        jobs = self.create_jobs(
+            bench_res,
+            func_inputs,
+            dims_name,
+            constant_inputs,
+            bench_cfg_sample_hash,
+            bench_run_cfg,
+            worker,
+        )
+        if bench_run_cfg.order_jobs_by_cost:
+            jobs = self.order_jobs_by_cost(list(jobs))
+
+        for chunk in chunks(jobs, CACHE_PROBE_SIZE):
+            # look up which samples are already cached in bulk and only submit the rest
+            cached = self.sample_cache.probe([cache_job for _, cache_job in chunk])
+            for job, cache_job in chunk:
+                result = cached.get(cache_job.job_key)
+                if result is None:
+                    result = self.sample_cache.submit(cache_job, check_cache=False)
+
+                if result.future is None:
+                    self.store_results(result, bench_res, result_buffer, job, bench_run_cfg)
+                else:
+                    in_flight[result.future] = (result, job)
+                    self.store_completed_results(
+                        in_flight, bench_res, result_buffer, bench_run_cfg, max_in_flight - 1
+                    )
+
+        self.store_completed_results(in_flight, bench_res, result_buffer, bench_run_cfg, 0)
+
+    def create_jobs(
+        self,
+        bench_res: BenchResult,
+        func_inputs: List,
+        dims_name: List[str],
+        constant_inputs: dict,
+        bench_cfg_sample_hash: str,
+        bench_run_cfg: BenchRunCfg,
+        worker: Callable,
+    ) -> Iterator[Tuple[WorkerJob, Job]]:
+        """Create the jobs for each sample of the sweep in the order of func_inputs
+
+        Args:
+            bench_res (BenchResult): The results the job outputs are stored in
+            func_inputs (List): A list of (index_tuple, input_values) for every sample of the sweep
+            dims_name (List[str]): The names of the dimensions of the dataset
+            constant_inputs (dict): Inputs that are the same for every sample
+            bench_cfg_sample_hash (str): The hash of the sweep without the repeats, used in the key of each sample
+            bench_run_cfg (BenchRunCfg): The run configuration
+            worker (Callable): The function that is submitted with each job
+
+        Yields:
+            Iterator[Tuple[WorkerJob, Job]]: the sample and the job that evaluates it
+        """
+        tag = bench_res.bench_cfg.tag
+        use_hmaps = len(bench_res.result_hmaps) > 0
+        key_encoder = SampleKeyEncoder(dims_name, constant_inputs, tag)
+        cost_key_encoder = SampleKeyEncoder(
+            dims_name, constant_inputs, tag, exclude=("repeat", "over_time")
+        )
+        for callcount, (idx_tuple, function_input_vars) in enumerate(func_inputs, 1):
             job = WorkerJob(
                 function_input_vars,
                 idx_tuple,
                 dims_name,
                 constant_inputs,
                 bench_cfg_sample_hash,
-                bench_res.bench_cfg.tag,
+                tag,
             )
-            job.setup_hashes()
-            jobs.append(job)
+            job.setup_hashes(key_encoder, hmap_input=use_hmaps)
+            if bench_run_cfg.order_jobs_by_cost:
+                job.setup_cost_key(cost_key_encoder)
 
             jid = f"{bench_res.bench_cfg.title}:call {callcount}/{len(func_inputs)}"
-            worker = partial(worker_kwargs_wrapper, self.worker, bench_res.bench_cfg)
-            cache_job = Job(
-                job_id=jid,
-                function=worker,
-                job_args=job.function_input,
-                job_key=job.function_input_signature_pure,
-                tag=job.tag,
+            yield (
+                job,
+                Job(
+                    job_id=jid,
+                    function=worker,
+                    job_args=job.function_input,
+                    job_key=job.function_input_signature_pure,
+                    tag=job.tag,
+                    cost_key=job.cost_key,
+                    legacy_key=job.legacy_signature() if bench_run_cfg.legacy_cache_keys else None,
+                ),
             )
-            result = self.sample_cache.submit(cache_job)
-            results_list.append(result)
-            callcount += 1
 
-            if bench_run_cfg.executor == Executors.SERIAL:
-                self.store_results(result, bench_res, job, bench_run_cfg)
+    def order_jobs_by_cost(self, jobs: List[Tuple[WorkerJob, Job]]) -> List[Tuple[WorkerJob, Job]]:
+        """Sort the jobs so that the ones that took longest the last time they were run are submitted first, which keeps all the workers busy until the end of the sweep.  Jobs that have not been timed yet are submitted before all the others
 
-        if bench_run_cfg.executor != Executors.SERIAL:
-            for job, res in zip(jobs, results_list):
-                self.store_results(res, bench_res, job, bench_run_cfg)
+        Args:
+            jobs (List[Tuple[WorkerJob, Job]]): the jobs in sweep order
 
-        for inp in bench_res.bench_cfg.all_vars:
-            self.add_metadata_to_dataset(bench_res, inp)
+        Returns:
+            List[Tuple[WorkerJob, Job]]: the jobs in the order they should be submitted
+        """
+        durations = self.sample_cache.expected_durations([cache_job for _, cache_job in jobs])
+        timed = sum(d is not None for d in durations)
+        logging.info(f"ordering {len(jobs)} jobs by cost, {timed} have a recorded time")
+        order = sorted(
+            range(len(jobs)),
+            key=lambda i: -math.inf if durations[i] is None else -durations[i],
+        )
+        return [jobs[i] for i in order]
 
-        return bench_res
+    def use_inline_call(self, bench_run_cfg: BenchRunCfg) -> bool:
+        """Samples are evaluated inline if they run serially and are not cached, because then the jobs, hashes and futures of the sample cache are not needed
+
+        Args:
+            bench_run_cfg (BenchRunCfg): The run configuration
+
+        Returns:
+            bool: True if the sweep should be evaluated inline
+        """
+        return (
+            bench_run_cfg.inline_samples
+            and self.sample_cache.executor_type == Executors.SERIAL
+            and self.sample_cache.cache is None
+        )
+
+    def calculate_inline_results(
+        self,
+        bench_res: BenchResult,
+        result_buffer: ResultBuffer,
+        func_inputs: List,
+        dims_name: List[str],
+        constant_inputs: dict,
+        bench_run_cfg: BenchRunCfg,
+    ) -> None:
+        """Evaluate the sweep by calling the worker directly for each sample.  Only the inputs the worker needs are passed to it and the inputs are not hashed or copied, so the overhead per sample is as small as possible
+
+        Args:
+            bench_res (BenchResult): The results to store the job outputs in
+            result_buffer (ResultBuffer): The arrays to store the job outputs in
+            func_inputs (List): A list of (index_tuple, input_values) for every sample of the sweep
+            dims_name (List[str]): The names of the dimensions of the dataset
+            constant_inputs (dict): Inputs that are the same for every sample
+            bench_run_cfg (BenchRunCfg): The run configuration
+        """
+        bench_cfg = bench_res.bench_cfg
+        meta_dims = {"over_time", "time_event"}
+        if not bench_cfg.pass_repeat:
+            meta_dims.add("repeat")
+        worker = get_context(self.worker_context_key).worker
+        use_hmaps = len(bench_res.result_hmaps) > 0
+        logging.info(f"{bench_cfg.title}: evaluating {len(func_inputs)} samples inline")
+
+        for idx_tuple, function_input_vars in func_inputs:
+            function_input = dict(zip(dims_name, function_input_vars))
+            sample = InlineSample(
+                idx_tuple,
+                function_input,
+                hmap_canonical_input(function_input) if use_hmaps else None,
+            )
+            if constant_inputs is not None:
+                function_input.update(constant_inputs)
+            result = await_result(
+                worker(**{k: v for k, v in function_input.items() if k not in meta_dims})
+            )
+            assert result is not None, (
+                "make sure you are returning a dict or super().__call__(**kwargs) from your __call__ function"
+            )
+            self.store_sample(result, bench_res, result_buffer, sample, bench_run_cfg)
+
+        self.sample_cache.worker_wrapper_call_count += len(func_inputs)
+        self.sample_cache.worker_fn_call_count += len(func_inputs)
+
+    def setup_worker_context(self, bench_cfg: BenchCfg, bench_run_cfg: BenchRunCfg) -> Callable:
+        """Send the worker and the parts of the sweep configuration it needs to the executor once, and return the function that is submitted with each job.  The function only refers to the context by its key, so the worker and BenchCfg are not pickled into every job
+
+        Args:
+            bench_cfg (BenchCfg): description of the benchmark parameters
+            bench_run_cfg (BenchRunCfg): The run configuration
+
+        Returns:
+            Callable: a function that evaluates a sample from the kwargs of the sample
+        """
+        worker = self.worker if self.worker_class_instance is None else self.worker_class_instance
+        context = WorkerContext(worker, bench_cfg.pass_repeat)
+        key = f"{worker_key(worker)}:{bench_cfg.pass_repeat}"
+        data = None
+        if bench_run_cfg.executor in (Executors.MULTIPROCESSING, Executors.SCOOP, Executors.REMOTE):
+            # other processes keep the contexts they have set up, so the key changes with the state of the worker
+            key, data = content_key(key, context)
+        self.worker_context_key = key
+        register_context(key, context)
+
+        if bench_run_cfg.executor == Executors.MULTIPROCESSING:
+            # worker processes load the context from disk the first time they see the key
+            return partial(run_in_context, key, publish_context(key, context, data), None)
+        if bench_run_cfg.executor in (Executors.SCOOP, Executors.REMOTE):
+            # scoop and remote workers can run on other hosts, so the context is sent with every job
+            return partial(run_in_context, key, None, context)
+        return partial(run_in_context, key, None, None)
+
+    def use_batch_call(self, bench_cfg: BenchCfg) -> bool:
+        """Samples are evaluated in batches if the worker class implements ParametrizedSweep.call_batch and all of the result types can be scattered directly into the dataset
+
+        Args:
+            bench_cfg (BenchCfg): description of the benchmark parameters
+
+        Returns:
+            bool: True if the sweep should be evaluated with call_batch
+        """
+        if self.worker_class_instance is None or not self.worker_class_instance.has_batch_call():
+            return False
+        if bench_cfg.result_hmaps:
+            return False
+        return all(isinstance(rv, BATCH_RESULT_TYPES) for rv in bench_cfg.result_vars)
+
+    def calculate_batched_results(
+        self,
+        bench_res: BenchResult,
+        result_buffer: ResultBuffer,
+        func_inputs: List,
+        dims_name: List[str],
+        constant_inputs: dict,
+        bench_run_cfg: BenchRunCfg,
+    ) -> None:
+        """Evaluate the sweep by passing columns of inputs to ParametrizedSweep.call_batch and scattering the returned columns of results into the dataset
+
+        Args:
+            bench_res (BenchResult): The results to store the job outputs in
+            result_buffer (ResultBuffer): The arrays to scatter the results into
+            func_inputs (List): A list of (index_tuple, input_values) for every sample of the sweep
+            dims_name (List[str]): The names of the dimensions of the dataset
+            constant_inputs (dict): Inputs that are the same for every sample
+            bench_run_cfg (BenchRunCfg): The run configuration
+        """
+        bench_cfg = bench_res.bench_cfg
+        meta_dims = ["over_time", "time_event"]
+        if not bench_cfg.pass_repeat:
+            meta_dims.append("repeat")
+        batch_dims = [(d, name) for d, name in enumerate(dims_name) if name not in meta_dims]
+        worker = get_context(self.worker_context_key).worker
+
+        for start in range(0, len(func_inputs), bench_run_cfg.batch_size):
+            batch = func_inputs[start : start + bench_run_cfg.batch_size]
+            logging.info(f"{bench_cfg.title}:batch {start + len(batch)}/{len(func_inputs)} samples")
+            index = result_buffer.flat_index(tuple(np.array([idx for idx, _ in batch]).T))
+            batch_inputs = {name: batch_column([v[d] for _, v in batch]) for d, name in batch_dims}
+            if constant_inputs is not None:
+                for k, v in constant_inputs.items():
+                    batch_inputs[k] = batch_column([v] * len(batch))
+
+            results = worker.call_batch(**batch_inputs)
+
+            columns = {}
+            for rv in bench_cfg.result_vars:
+                values = np.asarray(results[rv.name])
+                columns[rv.name] = values
+                if isinstance(rv, ResultVec):
+                    for i in range(rv.size):
+                        result_buffer.set(rv.index_name(i), index, values[:, i])
+                else:
+                    result_buffer.set(rv.name, index, values)
+            if self.checkpoint_log is not None:
+                self.checkpoint_log.extend(
+                    [
+                        (
+                            tuple(int(i) for i in idx),
+                            {k: v[j] for k, v in columns.items()},
+                            None,
+                        )
+                        for j, (idx, _) in enumerate(batch)
+                    ]
+                )
+
+            self.sample_cache.worker_wrapper_call_count += len(batch)
+            self.sample_cache.worker_fn_call_count += len(batch)
+
+    def store_completed_results(
+        self,
+        in_flight: dict,
+        bench_res: BenchResult,
+        result_buffer: ResultBuffer,
+        bench_run_cfg: BenchRunCfg,
+        max_remaining: int,
+    ) -> None:
+        """Wait for submitted jobs to complete and store their results until at most max_remaining jobs are still in flight
+
+        Args:
+            in_flight (dict): A mapping of future -> (JobFuture, WorkerJob) for jobs that have not been stored yet. Stored jobs are removed from the dict
+            bench_res (BenchResult): The results to store the job outputs in
+            result_buffer (ResultBuffer): The arrays to store the job outputs in
+            bench_run_cfg (BenchRunCfg): The run configuration
+            max_remaining (int): The number of jobs allowed to still be running when this function returns
+        """
+        while len(in_flight) > max_remaining:
+            if all(isinstance(f, Future) for f in in_flight):
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            else:
+                # executors such as scoop do not return concurrent.futures.Future so wait on the oldest job instead
+                done = [next(iter(in_flight))]
+            for future in done:
+                job_future, worker_job = in_flight.pop(future)
+                self.store_results(job_future, bench_res, result_buffer, worker_job, bench_run_cfg)
 
     def store_results(
         self,
         job_result: JobFuture,
         bench_res: BenchResult,
+        result_buffer: ResultBuffer,
         worker_job: WorkerJob,
         bench_run_cfg: BenchRunCfg,
     ) -> None:
         result = job_result.result()
         if result is not None:
             logging.info(f"{job_result.job.job_id}:")
-            if bench_res.bench_cfg.print_bench_inputs:
-                for k, v in worker_job.function_input.items():
-                    logging.info(f"\t {k}:{v}")
-
-            result_dict = result if isinstance(result, dict) else result.param.values()
-
-            for rv in bench_res.bench_cfg.result_vars:
-                result_value = result_dict[rv.name]
-                if bench_run_cfg.print_bench_results:
-                    logging.info(f"{rv.name}: {result_value}")
-
-                if isinstance(
-                    rv,
-                    (
-                        ResultVar,
-                        ResultVideo,
-                        ResultImage,
-                        ResultString,
-                        ResultContainer,
-                        ResultPath,
-                    ),
-                ):
-                    set_xarray_multidim(bench_res.ds[rv.name], worker_job.index_tuple, result_value)
-                elif isinstance(rv, ResultDataSet):
-                    bench_res.dataset_list.append(result_value)
-                    set_xarray_multidim(
-                        bench_res.ds[rv.name],
-                        worker_job.index_tuple,
-                        len(bench_res.dataset_list) - 1,
-                    )
-                elif isinstance(rv, ResultReference):
-                    bench_res.object_index.append(result_value)
-                    set_xarray_multidim(
-                        bench_res.ds[rv.name],
-                        worker_job.index_tuple,
-                        len(bench_res.object_index) - 1,
-                    )
+            self.store_sample(result, bench_res, result_buffer, worker_job, bench_run_cfg)
 
-                elif isinstance(rv, ResultVec):
-                    if isinstance(result_value, (list, np.ndarray)):
-                        if len(result_value) == rv.size:
-                            for i in range(rv.size):
-                                set_xarray_multidim(
-                                    bench_res.ds[rv.index_name(i)],
-                                    worker_job.index_tuple,
-                                    result_value[i],
-                                )
+    def store_sample(
+        self,
+        result: Any,
+        bench_res: BenchResult,
+        result_buffer: ResultBuffer,
+        sample: WorkerJob | InlineSample,
+        bench_run_cfg: BenchRunCfg,
+    ) -> None:
+        """Store the result of a single sample in the dataset
 
-                else:
-                    raise RuntimeError("Unsupported result type")
-            for rv in bench_res.result_hmaps:
-                bench_res.hmaps[rv.name][worker_job.canonical_input] = result_dict[rv.name]
+        Args:
+            result (Any): The dict or ParametrizedSweep returned by the worker
+            bench_res (BenchResult): The results to store the sample outputs in
+            result_buffer (ResultBuffer): The arrays to store the sample outputs in
+            sample (WorkerJob | InlineSample): The inputs and index of the sample
+            bench_run_cfg (BenchRunCfg): The run configuration
+        """
+        if bench_res.bench_cfg.print_bench_inputs:
+            for k, v in sample.function_input.items():
+                logging.info(f"\t {k}:{v}")
+
+        result_dict = result if isinstance(result, dict) else result.param.values()
+        flat_index = result_buffer.flat_index(sample.index_tuple)
+
+        for rv in bench_res.bench_cfg.result_vars:
+            result_value = result_dict[rv.name]
+            if bench_run_cfg.print_bench_results:
+                logging.info(f"{rv.name}: {result_value}")
+
+            if isinstance(
+                rv,
+                (
+                    ResultVar,
+                    ResultVideo,
+                    ResultImage,
+                    ResultString,
+                    ResultContainer,
+                    ResultPath,
+                ),
+            ):
+                result_buffer.set(rv.name, flat_index, result_value)
+            elif isinstance(rv, ResultDataSet):
+                bench_res.dataset_list.append(result_value)
+                result_buffer.set(rv.name, flat_index, len(bench_res.dataset_list) - 1)
+            elif isinstance(rv, ResultReference):
+                bench_res.object_index.append(result_value)
+                result_buffer.set(rv.name, flat_index, len(bench_res.object_index) - 1)
+
+            elif isinstance(rv, ResultVec):
+                if isinstance(result_value, (list, np.ndarray)):
+                    if len(result_value) == rv.size:
+                        for i in range(rv.size):
+                            result_buffer.set(rv.index_name(i), flat_index, result_value[i])
+
+            else:
+                raise RuntimeError("Unsupported result type")
+        for rv in bench_res.result_hmaps:
+            bench_res.hmaps[rv.name][sample.canonical_input] = result_dict[rv.name]
+
+        if self.checkpoint_log is not None:
+            names = [rv.name for rv in bench_res.bench_cfg.result_vars + bench_res.result_hmaps]
+            self.checkpoint_log.append(
+                (
+                    tuple(int(i) for i in sample.index_tuple),
+                    {k: result_dict[k] for k in names},
+                    sample.canonical_input,
+                )
+            )
 
-            # bench_cfg.hmap = bench_cfg.hmaps[bench_cfg.result_hmaps[0].name]
+        # bench_cfg.hmap = bench_cfg.hmaps[bench_cfg.result_hmaps[0].name]
 
     def init_sample_cache(self, run_cfg: BenchRunCfg):
         return FutureCache(
@@ -814,6 +1435,16 @@ class Bench(BenchPlotServer):
             tag_index=True,
             size_limit=self.cache_size,
             cache_results=run_cfg.cache_samples,
+            executor_pool=self.executor_pool or ExecutorPool.active,
+            max_workers=run_cfg.max_workers,
+            remote_workers=run_cfg.remote_workers,
+            record_durations=run_cfg.order_jobs_by_cost,
+            memory_cache_entries=run_cfg.memory_cache_entries,
+            memory_cache_bytes=run_cfg.memory_cache_bytes,
+            backend=run_cfg.sample_cache_backend,
+            codec=run_cfg.sample_cache_codec,
+            blob_threshold=run_cfg.blob_threshold,
+            read_only_caches=run_cfg.shared_sample_caches,
         )
 
     def clear_tag_from_sample_cache(self, tag: str, run_cfg):
@@ -0,0 +1,270 @@
+"""Content addressed storage of large results.  Arrays larger than a threshold and the image and video files that workers write to the paths from gen_path are stored once under the digest of their content, and the cache entries and datasets that use them hold a reference instead of a copy.  Reference counts are kept for each blob so that blobs are deleted when the last cache entry that uses them is removed"""
+
+from __future__ import annotations
+from typing import Any, Iterable, List, Set
+import hashlib
+import io
+import os
+import numpy as np
+import xarray as xr
+from diskcache import Cache
+from .cache_backends import ShardedStore
+from .utils import is_generated_path
+
+_CHUNK_SIZE = 1 << 20
+
+
+class BlobArray:
+    """A reference to an array in a BlobStore that is stored in the sample cache in place of the array"""
+
+    __slots__ = ["path", "shape", "dtype"]
+
+    def __init__(self, path: str, shape: tuple, dtype: np.dtype) -> None:
+        self.path = path
+        self.shape = shape
+        self.dtype = dtype
+
+    def load(self) -> np.ndarray:
+        """Map the array from disk.  The blob is never modified so it is mapped read only"""
+        return np.load(self.path, mmap_mode="r")
+
+    def __getstate__(self):
+        return (self.path, self.shape, self.dtype)
+
+    def __setstate__(self, state) -> None:
+        self.path, self.shape, self.dtype = state
+
+    def __repr__(self) -> str:
+        return f"BlobArray({self.path}, shape={self.shape}, dtype={self.dtype})"
+
+
+def digest_file(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class BlobStore:
+    """Stores blobs in files named by the blake2b digest of their content, spread over 256 shard directories.  Writing the same content twice stores it once.
+
+    The references to the blobs are recorded per owner, such as a key of the sample cache, in a diskcache in the same directory.  Owners belong to a namespace and have a tag so that all the owners of a cache or of a tag can be released together.  When the reference count of a blob drops to zero the blob is deleted.
+    """
+
+    def __init__(
+        self, directory: str = "cachedir/blobs", threshold: int = int(1e6), media_root="cachedir"
+    ) -> None:
+        """
+        Args:
+            directory (str, optional): the directory of the blobs. Defaults to "cachedir/blobs".
+            threshold (int, optional): arrays with at least this many bytes are stored as blobs. Defaults to int(1e6).
+            media_root (str, optional): files from gen_path in this directory that results refer to are moved into the store. Defaults to "cachedir", the root of gen_path.
+        """
+        self.directory = os.path.abspath(directory)
+        self.threshold = threshold
+        self.media_root = os.path.abspath(media_root) + os.sep
+        os.makedirs(self.directory, exist_ok=True)
+        self.refs = Cache(os.path.join(self.directory, "refs"))
+
+    def blob_path(self, digest: str, suffix: str = "") -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}{suffix}")
+
+    def is_blob(self, path: str) -> bool:
+        return path.startswith(self.directory + os.sep)
+
+    def put_bytes(self, data: bytes, suffix: str = "") -> str:
+        """Store bytes and return the path of the blob"""
+        path = self.blob_path(hashlib.blake2b(data, digest_size=16).hexdigest(), suffix)
+        if not os.path.exists(path):
+            ShardedStore.write_atomic(path, data)
+        return path
+
+    def put_file(self, path: str) -> str:
+        """Move a file into the store and return the path of the blob.  If the store already has a file with the same content, the file is deleted instead"""
+        blob = self.blob_path(digest_file(path), os.path.splitext(path)[1])
+        if os.path.exists(blob):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(path, blob)
+        return blob
+
+    def put_array(self, array: np.ndarray) -> BlobArray:
+        buffer = io.BytesIO()
+        np.save(buffer, array, allow_pickle=False)
+        return BlobArray(self.put_bytes(buffer.getvalue(), ".npy"), array.shape, array.dtype)
+
+    def is_media(self, value: Any) -> bool:
+        """Returns true if a value is the path of a file that a worker wrote to a path from gen_path.  Other files are never moved into the store, even if they are in the media root"""
+        return (
+            isinstance(value, str)
+            and os.path.abspath(value).startswith(self.media_root)
+            and is_generated_path(value)
+            and not self.is_blob(os.path.abspath(value))
+            and os.path.isfile(value)
+        )
+
+    def externalise(self, result: dict) -> dict:
+        """Replace the large arrays of a result with references to blobs, and move the files the result refers to into the store
+
+        Args:
+            result (dict): the result of a worker
+
+        Returns:
+            dict: a copy of the result that refers to the blobs
+        """
+        if not isinstance(result, dict):
+            return result
+        stored = dict(result)
+        # a file that the result refers to more than once is moved once and every reference refers to the blob
+        moved = {}
+        for k, v in result.items():
+            if (
+                isinstance(v, np.ndarray)
+                and v.dtype != object
+                and self.threshold is not None
+                and v.nbytes >= self.threshold
+            ):
+                stored[k] = self.put_array(v)
+            elif isinstance(v, str) and v in moved:
+                stored[k] = moved[v]
+            elif self.is_media(v):
+                stored[k] = moved[v] = self.put_file(v)
+        return stored
+
+    @staticmethod
+    def internalise(result: dict) -> dict:
+        """Replace the references to blob arrays in a result with the arrays"""
+        if not isinstance(result, dict) or not any(
+            isinstance(v, BlobArray) for v in result.values()
+        ):
+            return result
+        return {k: v.load() if isinstance(v, BlobArray) else v for k, v in result.items()}
+
+    def references(self, value: Any) -> Set[str]:
+        """Find the paths of the blobs that a result, list or dataset refers to"""
+        found = set()
+        self._find_references(value, found)
+        return found
+
+    def _find_references(self, value: Any, found: Set[str]) -> None:
+        if isinstance(value, BlobArray):
+            found.add(value.path)
+        elif isinstance(value, str):
+            if self.is_blob(value):
+                found.add(value)
+        elif isinstance(value, dict):
+            for v in value.values():
+                self._find_references(v, found)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                self._find_references(v, found)
+        elif isinstance(value, xr.Dataset):
+            for v in value.data_vars.values():
+                self._find_references(v.values, found)
+        elif isinstance(value, np.ndarray) and value.dtype.kind in "OU":
+            for v in value.flat:
+                self._find_references(v, found)
+
+    def retain(self, namespace: str, owner: Any, value: Any, tag: str = "") -> None:
+        """Record the blobs an owner refers to, and release the blobs it referred to before
+
+        Args:
+            namespace (str): the cache the owner belongs to
+            owner (Any): the key of the owner in its cache
+            value (Any): the value that refers to the blobs
+            tag (str, optional): the tag of the owner. Defaults to "".
+        """
+        paths = self.references(value)
+        owner_key = ("owner", namespace, owner)
+        if not paths and owner_key not in self.refs:
+            # most results refer to no blobs, so avoid the write transaction for them
+            return
+        with self.refs.transact():
+            previous = self.refs.get(owner_key)
+            if not paths and previous is None:
+                return
+            # add the new references first so blobs that are still used are not deleted
+            for path in paths:
+                self.refs[("count", path)] = self.refs.get(("count", path), 0) + 1
+            if previous is not None:
+                self._release_paths(previous[0])
+            if paths:
+                self.refs[owner_key] = (tuple(paths), tag)
+                tag_key = ("tag", namespace, tag)
+                owners = self.refs.get(tag_key, frozenset())
+                if owner not in owners:
+                    self.refs[tag_key] = owners | {owner}
+            else:
+                del self.refs[owner_key]
+
+    def release(self, namespace: str, owners: Iterable[Any]) -> int:
+        """Release the blobs of owners that were removed from their cache
+
+        Returns:
+            int: the number of blobs that were deleted
+        """
+        deleted = 0
+        with self.refs.transact():
+            for owner in owners:
+                previous = self.refs.pop(("owner", namespace, owner), None)
+                if previous is not None:
+                    deleted += self._release_paths(previous[0])
+        return deleted
+
+    def release_tag(self, namespace: str, tag: str) -> int:
+        """Release the blobs of all the owners of a namespace that have a tag
+
+        Returns:
+            int: the number of blobs that were deleted
+        """
+        with self.refs.transact():
+            owners = self.refs.pop(("tag", namespace, tag), frozenset())
+            # owners that were stored again with a different tag since keep their blobs
+            owners = [
+                o for o in owners if self.refs.get(("owner", namespace, o), (None, tag))[1] == tag
+            ]
+            return self.release(namespace, owners)
+
+    def release_namespace(self, namespace: str) -> int:
+        """Release the blobs of all the owners of a namespace, for when the whole cache is cleared
+
+        Returns:
+            int: the number of blobs that were deleted
+        """
+        with self.refs.transact():
+            owners = [k[2] for k in self.refs if k[0] == "owner" and k[1] == namespace]
+            for key in [k for k in self.refs if k[0] == "tag" and k[1] == namespace]:
+                del self.refs[key]
+            return self.release(namespace, owners)
+
+    def _release_paths(self, paths: List[str]) -> int:
+        deleted = 0
+        for path in paths:
+            count = self.refs.get(("count", path), 0) - 1
+            if count > 0:
+                self.refs[("count", path)] = count
+            else:
+                self.refs.pop(("count", path), None)
+                try:
+                    os.remove(path)
+                    deleted += 1
+                except FileNotFoundError:
+                    pass
+        return deleted
+
+    def ref_count(self, path: str) -> int:
+        return self.refs.get(("count", path), 0)
+
+    def volume(self) -> int:
+        """The total size of the blobs in bytes"""
+        return sum(
+            os.path.getsize(os.path.join(root, f))
+            for root, _, files in os.walk(self.directory)
+            if not root.startswith(os.path.join(self.directory, "refs"))
+            for f in files
+        )
+
+    def close(self) -> None:
+        self.refs.close()
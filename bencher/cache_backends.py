@@ -0,0 +1,262 @@
+"""Storage backends for the sample cache.  A backend implements the subset of the diskcache.Cache interface that FutureCache uses, so diskcache is used directly as the default backend"""
+
+from __future__ import annotations
+from contextlib import nullcontext
+from enum import auto
+from typing import Any, Iterator, Tuple
+import os
+import pickle
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from diskcache.core import DBNAME
+from strenum import StrEnum
+from .compression import CompressedDisk, dumps, loads, open_cache
+from .utils import hash_canonical
+
+_safe_filename = re.compile(r"[0-9A-Za-z_\-]{1,128}")
+_missing = object()
+
+
+class ShardedStore:
+    """A sample cache that stores each result in its own file, spread over 256 shard directories.  Files are written to a temporary name and atomically renamed, so any number of processes and threads can write to the store concurrently without a shared lock.  This lets worker processes write their results directly instead of sending them to a single writer in the parent process.
+
+    Tags are recorded as empty marker files in a directory per tag so that all the results of a tag can be evicted without reading them.  The size limit of the store is not enforced.  Results are compressed with the codec of the store, see bencher.compression
+    """
+
+    # results can be written by the processes or threads that compute them
+    concurrent_writes = True
+
+    def __init__(self, directory: str, codec: str = "none") -> None:
+        self.directory = os.path.abspath(directory)
+        self.codec = codec
+        os.makedirs(self.directory, exist_ok=True)
+
+    def filename(self, key: Any) -> str:
+        key = str(key)
+        if _safe_filename.fullmatch(key) is None:
+            key = hash_canonical(key)
+        return key
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename[:2], filename)
+
+    def tag_dir(self, tag: str) -> str:
+        return os.path.join(self.directory, "tags", hash_canonical(tag))
+
+    def get(self, key: Any, default: Any = None, tag: bool = False) -> Any:
+        try:
+            with open(self.path(self.filename(key)), "rb") as f:
+                stored_tag, value = loads(f.read())
+        except FileNotFoundError:
+            return (default, None) if tag else default
+        return (value, stored_tag) if tag else value
+
+    def set(self, key: Any, value: Any, tag: str = None) -> None:
+        filename = self.filename(key)
+        path = self.path(filename)
+        self.write_atomic(path, dumps((tag, value), self.codec))
+        if tag is not None:
+            tag_path = os.path.join(self.tag_dir(tag), filename)
+            if not os.path.exists(tag_path):
+                self.write_atomic(tag_path, b"")
+
+    @staticmethod
+    def write_atomic(path: str, data: bytes) -> None:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            f = open(tmp_path, "wb")
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            f = open(tmp_path, "wb")
+        with f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def __contains__(self, key: Any) -> bool:
+        return os.path.exists(self.path(self.filename(key)))
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self.get(key, default=_missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.set(key, value)
+
+    def delete(self, key: Any) -> bool:
+        try:
+            os.remove(self.path(self.filename(key)))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def evict(self, tag: str) -> int:
+        """Remove all the results that were stored with a tag
+
+        Args:
+            tag (str): the tag of the results
+
+        Returns:
+            int: the number of results removed
+        """
+        tag_dir = self.tag_dir(tag)
+        if not os.path.isdir(tag_dir):
+            return 0
+        removed = 0
+        for filename in os.listdir(tag_dir):
+            # the result may have been overwritten with a different tag since
+            _, stored_tag = self.get(filename, tag=True)
+            if stored_tag == tag:
+                removed += self.delete(filename)
+        shutil.rmtree(tag_dir, ignore_errors=True)
+        return removed
+
+    def iter_tag(self, tag: str) -> Iterator[Tuple[Any, Any]]:
+        """Iterate over the keys and results that are stored with a tag.  The keys are the filenames of the results, which are the keys themselves for the hashes the sample cache uses as keys"""
+        tag_dir = self.tag_dir(tag)
+        if not os.path.isdir(tag_dir):
+            return
+        for filename in sorted(os.listdir(tag_dir)):
+            value, stored_tag = self.get(filename, default=_missing, tag=True)
+            if value is not _missing and stored_tag == tag:
+                yield filename, value
+
+    def clear(self) -> int:
+        count = 0
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            if os.path.isdir(path):
+                if entry != "tags":
+                    count += len(os.listdir(path))
+                shutil.rmtree(path, ignore_errors=True)
+        return count
+
+    def volume(self) -> int:
+        """The total size of the stored results in bytes"""
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for f in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, f))
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def transact(self):
+        """Reads and writes are independent files so there is nothing to batch"""
+        return nullcontext()
+
+    def close(self) -> None:
+        pass
+
+
+class ReadOnlyCache:
+    """A diskcache directory opened read only, as a shared layer below the sample cache.  The sqlite database is opened in read only mode, so the directory can be on a read only mount, and reads do not update the statistics or eviction order of the cache"""
+
+    concurrent_writes = False
+
+    def __init__(self, directory: str) -> None:
+        self.directory = os.path.abspath(directory)
+        self.con = sqlite3.connect(
+            f"file:{os.path.join(self.directory, DBNAME)}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+        )
+        # keys that are not strings or numbers are pickled with the protocol the cache was created with
+        protocol = self.con.execute(
+            "SELECT value FROM Settings WHERE key = 'disk_pickle_protocol'"
+        ).fetchone()
+        self.disk = CompressedDisk(
+            self.directory, pickle_protocol=protocol[0] if protocol else pickle.HIGHEST_PROTOCOL
+        )
+
+    def get(self, key: Any, default: Any = None, tag: bool = False) -> Any:
+        db_key, raw = self.disk.put(key)
+        row = self.con.execute(
+            "SELECT mode, filename, value, tag FROM Cache WHERE key = ? AND raw = ?"
+            " AND (expire_time IS NULL OR expire_time > ?)",
+            (db_key, raw, time.time()),
+        ).fetchone()
+        if row is not None:
+            mode, filename, value, stored_tag = row
+            try:
+                value = self.disk.fetch(mode, filename, value, False)
+                return (value, stored_tag) if tag else value
+            except IOError:
+                pass
+        return (default, None) if tag else default
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key, default=_missing) is not _missing
+
+    def iter_tag(self, tag: str) -> Iterator[Tuple[Any, Any]]:
+        """Iterate over the keys and results that are stored with a tag, using the tag index of the cache"""
+        rows = self.con.execute(
+            "SELECT key, raw, mode, filename, value FROM Cache WHERE tag = ?"
+            " AND (expire_time IS NULL OR expire_time > ?)",
+            (tag, time.time()),
+        ).fetchall()
+        for db_key, raw, mode, filename, value in rows:
+            try:
+                value = self.disk.fetch(mode, filename, value, False)
+            except IOError:
+                continue
+            yield self.disk.get(db_key, raw), value
+
+    def transact(self):
+        return nullcontext()
+
+    def close(self) -> None:
+        self.con.close()
+
+
+def open_read_only(directory: str):
+    """Open a sample cache directory of either backend as a read only layer
+
+    Args:
+        directory (str): a diskcache or SHARDED sample cache directory
+
+    Raises:
+        FileNotFoundError: the directory is not a sample cache
+
+    Returns:
+        ReadOnlyCache | ShardedStore: the cache layer
+    """
+    if os.path.exists(os.path.join(directory, DBNAME)):
+        return ReadOnlyCache(directory)
+    if os.path.isdir(directory):
+        # the sharded store only writes when results are set, so it can be read from a read only mount
+        return ShardedStore(directory)
+    raise FileNotFoundError(f"the shared cache {directory} does not exist")
+
+
+class CacheBackends(StrEnum):
+    DISKCACHE = auto()  # a single sqlite database, written to by the process that runs the sweep
+    SHARDED = auto()  # one file per result that worker processes write to directly
+
+    @staticmethod
+    def directory(provider: CacheBackends, directory: str) -> str:
+        """The directory the backend stores a cache in"""
+        return f"{directory}_sharded" if provider == CacheBackends.SHARDED else directory
+
+    @staticmethod
+    def factory(
+        provider: CacheBackends,
+        directory: str,
+        tag_index: bool = True,
+        size_limit: int = None,
+        codec: str = "none",
+    ):
+        """Open the sample cache backend in a directory.  Each backend uses its own directory because the formats are not compatible"""
+        directory = CacheBackends.directory(provider, directory)
+        providers = {
+            CacheBackends.DISKCACHE: lambda: open_cache(
+                directory, codec, tag_index=tag_index, size_limit=size_limit
+            ),
+            CacheBackends.SHARDED: lambda: ShardedStore(directory, codec),
+        }
+        return providers[provider]()
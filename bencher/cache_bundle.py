@@ -0,0 +1,209 @@
+"""Export the sample cache results of a tag, and the image and video files they refer to, to a single compressed bundle that can be imported into the sample cache of another machine.  This lets expensive sweeps be computed once and shipped to laptops and CI.
+
+The results in a bundle are pickled, and importing a bundle unpickles them, which can run any code the bundle contains.  Only import bundles from trusted sources.
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, List, Set
+import argparse
+import io
+import logging
+import os
+import tarfile
+from .blob_store import BlobArray
+from .cache_backends import CacheBackends, open_read_only
+from .compression import dumps, loads
+from .job import FutureCache
+
+CACHE_ROOT = "cachedir"
+ENTRIES_NAME = "entries.pkl"
+FILES_DIR = "files"
+
+
+class BundlePath:
+    """A path to a file under cachedir in a bundle, stored relative to cachedir so it can be moved to the cachedir of the machine that imports the bundle"""
+
+    __slots__ = ["relative"]
+
+    def __init__(self, relative: str) -> None:
+        self.relative = relative
+
+    def __getstate__(self):
+        return self.relative
+
+    def __setstate__(self, state) -> None:
+        self.relative = state
+
+
+def relocate_paths(value: Any, relocate: Callable[[str], Any]) -> Any:
+    """Apply a function to the paths that a result refers to, including the paths of arrays in the blob store"""
+    if not isinstance(value, dict):
+        return value
+    moved = dict(value)
+    for k, v in value.items():
+        if isinstance(v, (str, BundlePath)):
+            moved[k] = relocate(v)
+        elif isinstance(v, BlobArray):
+            moved[k] = BlobArray(relocate(v.path), v.shape, v.dtype)
+    return moved
+
+
+def contained_path(root: str, relative: str) -> str:
+    """Join a path from a bundle to the directory it is extracted to
+
+    Args:
+        root (str): the directory the bundle is extracted to
+        relative (str): a path in the bundle, relative to root
+
+    Raises:
+        ValueError: If the path is absolute or leaves root
+
+    Returns:
+        str: the path under root
+    """
+    relative = os.path.normpath(relative)
+    if os.path.isabs(relative) or relative == ".." or relative.startswith(".." + os.sep):
+        raise ValueError(f"the bundle has a path outside of cachedir: {relative}")
+    return os.path.join(root, relative)
+
+
+def export_bundle(
+    path: str,
+    tags: List[str],
+    cache_name: str = "sample_cache",
+    backend: CacheBackends = CacheBackends.DISKCACHE,
+) -> int:
+    """Export the results of the sample cache that have one of the tags to a bundle
+
+    Args:
+        path (str): the path of the bundle to write
+        tags (List[str]): the tags of the results to export
+        cache_name (str, optional): the name of the sample cache. Defaults to "sample_cache".
+        backend (CacheBackends, optional): the backend of the sample cache. Defaults to CacheBackends.DISKCACHE.
+
+    Returns:
+        int: the number of results exported
+    """
+    layer = open_read_only(CacheBackends.directory(backend, f"{CACHE_ROOT}/{cache_name}"))
+    root = os.path.abspath(CACHE_ROOT) + os.sep
+    files: Set[str] = set()
+
+    def export_path(p):
+        if isinstance(p, str) and os.path.abspath(p).startswith(root) and os.path.isfile(p):
+            relative = os.path.relpath(os.path.abspath(p), root)
+            files.add(relative)
+            return BundlePath(relative)
+        return p
+
+    entries = []
+    try:
+        for tag in tags:
+            for key, value in layer.iter_tag(tag):
+                entries.append((key, relocate_paths(value, export_path), tag))
+    finally:
+        layer.close()
+
+    with tarfile.open(path, "w:xz") as tar:
+        data = dumps(entries, "none")
+        info = tarfile.TarInfo(ENTRIES_NAME)
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+        for relative in sorted(files):
+            tar.add(os.path.join(root, relative), arcname=f"{FILES_DIR}/{relative}")
+    logging.info(f"exported {len(entries)} results and {len(files)} files to {path}")
+    return len(entries)
+
+
+def import_bundle(
+    path: str,
+    cache_name: str = "sample_cache",
+    backend: CacheBackends = CacheBackends.DISKCACHE,
+    overwrite: bool = False,
+    blob_threshold: int = int(1e6),
+) -> int:
+    """Merge the results of a bundle into the sample cache.  The files of the bundle are extracted under cachedir and the results are updated to refer to them.  The results are unpickled, so only import bundles from trusted sources
+
+    Args:
+        path (str): the path of the bundle
+        cache_name (str, optional): the name of the sample cache. Defaults to "sample_cache".
+        backend (CacheBackends, optional): the backend of the sample cache. Defaults to CacheBackends.DISKCACHE.
+        overwrite (bool, optional): replace results that are already in the cache. Defaults to False.
+        blob_threshold (int, optional): see BenchRunCfg.blob_threshold. Defaults to int(1e6).
+
+    Returns:
+        int: the number of results imported
+    """
+    root = os.path.abspath(CACHE_ROOT)
+    entries = []
+    with tarfile.open(path, "r:*") as tar:
+        for member in tar:
+            if member.name == ENTRIES_NAME:
+                entries = loads(tar.extractfile(member).read())
+            elif member.isfile() and member.name.startswith(f"{FILES_DIR}/"):
+                target = contained_path(root, member.name[len(FILES_DIR) + 1 :])
+                if not os.path.exists(target):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with open(target, "wb") as f:
+                        f.write(tar.extractfile(member).read())
+
+    def import_path(p):
+        return contained_path(root, p.relative) if isinstance(p, BundlePath) else p
+
+    cache = FutureCache(
+        overwrite=overwrite, cache_name=cache_name, backend=backend, blob_threshold=blob_threshold
+    )
+    imported = 0
+    try:
+        for key, value, tag in entries:
+            if not overwrite and key in cache.cache:
+                continue
+            cache.set(key, relocate_paths(value, import_path), tag=tag)
+            imported += 1
+    finally:
+        cache.close()
+    logging.info(f"imported {imported}/{len(entries)} results from {path}")
+    return imported
+
+
+def main(argv: List[str] = None) -> None:
+    """Entry point of the bencher command"""
+    parser = argparse.ArgumentParser(
+        prog="bencher",
+        epilog="Bundles are pickled, so only import bundles from trusted sources",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    cache_parser = commands.add_parser("cache", help="manage the sample cache")
+    cache_commands = cache_parser.add_subparsers(dest="cache_command", required=True)
+
+    export_parser = cache_commands.add_parser(
+        "export", help="export the results of tags to a bundle"
+    )
+    export_parser.add_argument(
+        "--tag", action="append", required=True, help="a tag to export, can be repeated"
+    )
+    export_parser.add_argument("-o", "--output", default="bencher_cache.tar.xz")
+
+    import_help = "merge a bundle into the cache.  Importing a bundle unpickles it, which can run any code it contains, so only import bundles from trusted sources"
+    import_parser = cache_commands.add_parser("import", help=import_help, description=import_help)
+    import_parser.add_argument("bundle")
+    import_parser.add_argument(
+        "--overwrite", action="store_true", help="replace results already in the cache"
+    )
+
+    for p in (export_parser, import_parser):
+        p.add_argument("--cache-name", default="sample_cache")
+        p.add_argument("--backend", choices=list(CacheBackends), default=CacheBackends.DISKCACHE)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    backend = CacheBackends(args.backend)
+    if args.cache_command == "export":
+        count = export_bundle(args.output, args.tag, args.cache_name, backend)
+        print(f"exported {count} results to {args.output}")
+    else:
+        count = import_bundle(args.bundle, args.cache_name, backend, args.overwrite)
+        print(f"imported {count} results from {args.bundle}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""An append-only log of the samples of a sweep that have completed, so that a sweep that is interrupted can be resumed without running the samples it already completed, even when the sample cache is off.  Each record is written with its length and checksum, so a record that was only partly written when the process died is detected and discarded when the log is replayed"""
+
+from __future__ import annotations
+from typing import Any, List
+import logging
+import os
+import pickle
+import struct
+import time
+import zlib
+
+HEADER = struct.Struct("<II")
+
+
+class CheckpointLog:
+    """The checkpoint log of a single sweep.  Records are flushed to the file as they are appended so they survive the process being killed, and synced to disk at most once per sync_interval so they also survive a crash of the machine without the cost of a sync per sample"""
+
+    def __init__(
+        self, key: str, directory: str = "cachedir/checkpoints", sync_interval: float = 1.0
+    ) -> None:
+        """
+        Args:
+            key (str): the hash of the benchmark configuration
+            directory (str, optional): the directory of the logs. Defaults to "cachedir/checkpoints".
+            sync_interval (float, optional): the maximum time in seconds between syncs of the log to disk. Defaults to 1.0.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{key}.log")
+        self.sync_interval = sync_interval
+        self.file = None
+        self.last_sync = 0.0
+        self.unpicklable = False
+
+    def replay(self) -> List[Any]:
+        """Read every complete record of the log in one read.  A partly written record at the end of the log is truncated so new records are appended after the last complete record
+
+        Returns:
+            List[Any]: the records in the order they were appended
+        """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        records = []
+        offset = 0
+        while offset + HEADER.size <= len(data):
+            length, crc = HEADER.unpack_from(data, offset)
+            payload = data[offset + HEADER.size : offset + HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            records.append(pickle.loads(payload))
+            offset += HEADER.size + length
+        if offset < len(data):
+            logging.warning(
+                f"discarding {len(data) - offset} bytes of a partial record of {self.path}"
+            )
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        return records
+
+    def append(self, record: Any) -> None:
+        """Append a record to the log
+
+        Args:
+            record (Any): the record to append
+        """
+        self.extend([record])
+
+    def extend(self, records: List[Any]) -> None:
+        """Append records to the log in a single write.  Records that can not be pickled are not appended, so their samples are calculated again when the sweep is resumed
+
+        Args:
+            records (List[Any]): the records to append
+        """
+        data = bytearray()
+        for record in records:
+            try:
+                payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                if not self.unpicklable:
+                    logging.warning(f"results that can not be pickled are not checkpointed: {e}")
+                    self.unpicklable = True
+                continue
+            data += HEADER.pack(len(payload), zlib.crc32(payload))
+            data += payload
+        if self.file is None:
+            self.file = open(self.path, "ab")  # pylint: disable=consider-using-with
+        self.file.write(data)
+        self.file.flush()
+        now = time.monotonic()
+        if now - self.last_sync >= self.sync_interval:
+            os.fsync(self.file.fileno())
+            self.last_sync = now
+
+    def close(self) -> None:
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+
+    def delete(self) -> None:
+        """Close and delete the log once the sweep it records has completed"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
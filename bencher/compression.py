@@ -0,0 +1,150 @@
+"""Compression of the results stored in the caches.  Compressed values start with a header that records the codec, so values are decompressed transparently when they are read regardless of the codec the cache is currently configured with, and values stored without compression can still be read"""
+
+from __future__ import annotations
+from typing import Any, Tuple
+import logging
+import lzma
+import pickle
+import zlib
+from diskcache import Cache, Disk
+from diskcache.core import MODE_BINARY, MODE_RAW
+
+try:
+    import zstandard
+except ImportError as e:
+    logging.debug(e.msg)
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError as e:
+    logging.debug(e.msg)
+    lz4_frame = None
+
+MAGIC = b"\x00bch"
+
+# values smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 256
+
+
+def _zstd_compress(data: bytes, level: int) -> bytes:
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+# name -> (id stored in the header, default level, compress(data, level), decompress(data), is available)
+CODECS = {
+    "none": (0, 0, lambda data, level: data, lambda data: data, True),
+    "zlib": (1, 1, zlib.compress, zlib.decompress, True),
+    "lzma": (
+        2,
+        1,
+        lambda data, level: lzma.compress(data, preset=level),
+        lzma.decompress,
+        True,
+    ),
+    "zstd": (3, 3, _zstd_compress, _zstd_decompress, zstandard is not None),
+    "lz4": (
+        4,
+        0,
+        lambda data, level: lz4_frame.compress(data, compression_level=level),
+        lz4_frame.decompress if lz4_frame is not None else None,
+        lz4_frame is not None,
+    ),
+}
+_codec_names = {spec[0]: name for name, spec in CODECS.items()}
+
+
+def parse_codec(codec: str) -> Tuple[str, int]:
+    """Parse a codec specification of the form "name" or "name:level"
+
+    Args:
+        codec (str): the codec specification, for example "zstd:3"
+
+    Raises:
+        ValueError: the codec is unknown or its library is not installed
+
+    Returns:
+        Tuple[str, int]: the name and level of the codec
+    """
+    name, _, level = (codec or "none").partition(":")
+    if name not in CODECS:
+        raise ValueError(f"unknown codec {name}, the available codecs are {list(CODECS)}")
+    if not CODECS[name][4]:
+        raise ValueError(
+            f"the {name} codec needs an optional package, install it with: pip install holobench[compression]"
+        )
+    return name, int(level) if level else CODECS[name][1]
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """Compress serialised data with a codec and add a header so it can be decompressed without knowing the codec"""
+    name, level = parse_codec(codec)
+    if name == "none" or len(data) < MIN_COMPRESS_SIZE:
+        return MAGIC + b"\x00" + data
+    codec_id, _, compress_fn, _, _ = CODECS[name]
+    return MAGIC + bytes([codec_id]) + compress_fn(data, level)
+
+
+def is_compressed(data: Any) -> bool:
+    return isinstance(data, bytes) and data[: len(MAGIC)] == MAGIC
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompress data that was compressed with compress()"""
+    codec_id = data[len(MAGIC)]
+    name = _codec_names[codec_id]
+    if not CODECS[name][4]:
+        raise ValueError(
+            f"decompressing this value needs the {name} codec, install it with: pip install holobench[compression]"
+        )
+    return CODECS[name][3](data[len(MAGIC) + 1 :])
+
+
+def dumps(value: Any, codec: str) -> bytes:
+    return compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), codec)
+
+
+def loads(data: bytes) -> Any:
+    if is_compressed(data):
+        data = decompress(data)
+    return pickle.loads(data)
+
+
+class CompressedDisk(Disk):
+    """A diskcache Disk that pickles and compresses values.  Values that were stored by the default Disk are still read as normal"""
+
+    # set on the instance by open_cache, so the codec is not saved in the settings of the cache
+    codec = "none"
+
+    def store(self, value, read, key=None):
+        if not read and self.codec != "none":
+            value = dumps(value, self.codec)
+        if key is None:
+            return super().store(value, read)
+        return super().store(value, read, key=key)
+
+    def fetch(self, mode, filename, value, read):
+        data = super().fetch(mode, filename, value, read)
+        if not read and mode in (MODE_RAW, MODE_BINARY) and is_compressed(data):
+            return loads(data)
+        return data
+
+
+def open_cache(directory: str, codec: str = "none", **settings) -> Cache:
+    """Open a diskcache that stores values compressed with a codec and decompresses them transparently when they are read.  The codec is not stored in the settings of the cache, so the cache can be opened with a different codec later
+
+    Args:
+        directory (str): the directory of the cache
+        codec (str, optional): the codec specification, for example "zstd:3". Defaults to "none".
+
+    Returns:
+        Cache: the opened cache
+    """
+    parse_codec(codec)
+    cache = Cache(directory, disk=CompressedDisk, **settings)
+    cache.disk.codec = codec
+    return cache
@@ -0,0 +1,35 @@
+"""This file has an example of a worker that evaluates many samples in a single vectorised call"""
+
+import numpy as np
+import bencher as bch
+
+
+class BatchedWave(bch.ParametrizedSweep):
+    theta = bch.FloatSweep(default=0, bounds=[0, np.pi], doc="Input angle", units="rad", samples=30)
+    offset = bch.FloatSweep(default=0, bounds=[0, 0.3], doc="dc offset", units="v", samples=30)
+
+    out_sin = bch.ResultVar(units="v", doc="sin of theta plus offset")
+    out_cos = bch.ResultVar(units="v", doc="cos of theta plus offset")
+
+    def __call__(self, **kwargs):
+        self.update_params_from_kwargs(**kwargs)
+        self.out_sin = np.sin(self.theta) + self.offset
+        self.out_cos = np.cos(self.theta) + self.offset
+        return super().__call__(**kwargs)
+
+    def call_batch(self, **kwargs) -> dict:
+        # every input is an array with one value per sample so the whole batch is calculated at once
+        theta, offset = kwargs["theta"], kwargs["offset"]
+        return {"out_sin": np.sin(theta) + offset, "out_cos": np.cos(theta) + offset}
+
+
+def example_batch(run_cfg: bch.BenchRunCfg = None, report: bch.BenchReport = None) -> bch.Bench:
+    """This example shows how to implement call_batch so that bencher can pass columns of inputs to a vectorised worker instead of calling it once per sample"""
+
+    bench = BatchedWave().to_bench(run_cfg, report)
+    bench.plot_sweep(input_vars=["theta", "offset"], result_vars=["out_sin", "out_cos"])
+    return bench
+
+
+if __name__ == "__main__":
+    example_batch().report.show()
@@ -0,0 +1,151 @@
+"""An append only store of the results of over_time benchmarks.  Each run is written to its own chunk file and recorded in an index, so adding a run does not read or rewrite the history, and loading a window of the history only reads the chunks in the window"""
+
+from __future__ import annotations
+from typing import List, Optional, Tuple
+import json
+import logging
+import os
+import shutil
+import time
+import numpy as np
+import xarray as xr
+from .cache_backends import ShardedStore
+from .compression import dumps, loads
+
+INDEX_NAME = "index.jsonl"
+
+
+class HistoryStore:
+    """Stores the history of each benchmark in a directory of chunks, one chunk per run, and an index file with a line per chunk that records the over_time coordinates of the chunk.  Chunks are written atomically before their line is appended to the index, so a run that is interrupted never leaves a partial chunk in the history"""
+
+    def __init__(self, directory: str = "cachedir/history_chunks", codec: str = "none") -> None:
+        """
+        Args:
+            directory (str, optional): the directory of the history. Defaults to "cachedir/history_chunks".
+            codec (str, optional): the codec the chunks are compressed with. Defaults to "none".
+        """
+        self.directory = os.path.abspath(directory)
+        self.codec = codec
+
+    def run_dir(self, key) -> str:
+        return os.path.join(self.directory, str(key))
+
+    def __contains__(self, key) -> bool:
+        return os.path.exists(os.path.join(self.run_dir(key), INDEX_NAME))
+
+    def append(self, key, dataset: xr.Dataset) -> str:
+        """Add a run to the history of a benchmark without reading the existing history
+
+        Args:
+            key: the hash of the benchmark
+            dataset (xr.Dataset): the results of the run, with an over_time dimension
+
+        Returns:
+            str: the path of the chunk the run was written to
+        """
+        run_dir = self.run_dir(key)
+        times = dataset.coords["over_time"].values
+        chunk = f"{time.time_ns()}_{os.getpid()}.chunk"
+        path = os.path.join(run_dir, chunk)
+        ShardedStore.write_atomic(path, dumps(dataset, self.codec))
+        entry = {
+            "chunk": chunk,
+            "times": [str(t) for t in times],
+            "datetime": bool(np.issubdtype(times.dtype, np.datetime64)),
+        }
+        # a single short write in append mode, so concurrent runs do not interleave their lines
+        with open(os.path.join(run_dir, INDEX_NAME), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        return path
+
+    def index(self, key) -> List[dict]:
+        """The chunks of a benchmark in the order they were added"""
+        try:
+            with open(os.path.join(self.run_dir(key), INDEX_NAME), encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def chunk_times(entry: dict) -> np.ndarray:
+        if entry["datetime"]:
+            return np.array(entry["times"], dtype="datetime64[ns]")
+        return np.array(entry["times"])
+
+    def times(self, key) -> np.ndarray:
+        """The over_time coordinates of all the runs of a benchmark, read from the index"""
+        index = self.index(key)
+        if not index:
+            return np.array([])
+        return np.concatenate([self.chunk_times(e) for e in index])
+
+    def load(self, key, start=None, end=None, last: Optional[int] = None) -> Optional[xr.Dataset]:
+        """Load a window of the history of a benchmark.  Only the chunks with runs in the window are read
+
+        Args:
+            key: the hash of the benchmark
+            start (optional): the earliest over_time coordinate to load. Defaults to None.
+            end (optional): the latest over_time coordinate to load. Defaults to None.
+            last (int, optional): only load the most recent runs in the window. Defaults to None.
+
+        Returns:
+            Optional[xr.Dataset]: the runs in the window concatenated over time, or None if there are none
+        """
+        selected = []
+        for entry in self.index(key):
+            times = self.chunk_times(entry)
+            mask = np.ones(len(times), dtype=bool)
+            if start is not None:
+                mask &= times >= self._as_time(start, entry)
+            if end is not None:
+                mask &= times <= self._as_time(end, entry)
+            if mask.any():
+                selected.append((entry, mask))
+        if last is not None:
+            selected = self._take_last(selected, last)
+        if not selected:
+            return None
+        datasets = []
+        for entry, mask in selected:
+            ds = self.load_chunk(key, entry)
+            datasets.append(ds if mask.all() else ds.isel(over_time=np.flatnonzero(mask)))
+        if len(datasets) == 1:
+            return datasets[0]
+        return xr.concat(datasets, "over_time")
+
+    @staticmethod
+    def _as_time(value, entry: dict):
+        return np.datetime64(value, "ns") if entry["datetime"] else str(value)
+
+    @staticmethod
+    def _take_last(
+        selected: List[Tuple[dict, np.ndarray]], last: int
+    ) -> List[Tuple[dict, np.ndarray]]:
+        kept = []
+        for entry, mask in reversed(selected):
+            if last <= 0:
+                break
+            indices = np.flatnonzero(mask)[-last:]
+            trimmed = np.zeros(len(mask), dtype=bool)
+            trimmed[indices] = True
+            kept.append((entry, trimmed))
+            last -= len(indices)
+        return kept[::-1]
+
+    def load_chunk(self, key, entry: dict) -> xr.Dataset:
+        with open(os.path.join(self.run_dir(key), entry["chunk"]), "rb") as f:
+            return loads(f.read())
+
+    def chunk_paths(self, key) -> List[str]:
+        return [os.path.join(self.run_dir(key), e["chunk"]) for e in self.index(key)]
+
+    def clear(self, key) -> List[str]:
+        """Delete the history of a benchmark
+
+        Returns:
+            List[str]: the paths of the chunks that were deleted
+        """
+        paths = self.chunk_paths(key)
+        shutil.rmtree(self.run_dir(key), ignore_errors=True)
+        logging.info(f"removed {len(paths)} runs from the history")
+        return paths
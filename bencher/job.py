@@ -1,9 +1,27 @@
 from __future__ import annotations
-from typing import Callable
+from typing import Any, Callable, Dict, List, Tuple
+from contextlib import contextmanager
+import asyncio
+from functools import partial
+import inspect
 import logging
+import sqlite3
+import threading
+import time
 from diskcache import Cache
-from concurrent.futures import Future, ProcessPoolExecutor
-from .utils import hash_sha1
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait as futures_wait,
+)
+from .utils import hash_canonical
+from .worker_registry import init_worker_process
+from .remote_worker import RemoteExecutor
+from .memory_cache import shared_memory_cache
+from .blob_store import BlobStore
+from .cache_backends import CacheBackends, open_read_only
 from strenum import StrEnum
 from enum import auto
 
@@ -16,58 +34,215 @@ except ImportError as e:
 
 class Job:
     def __init__(
-        self, job_id: str, function: Callable, job_args: dict, job_key=None, tag=""
+        self,
+        job_id: str,
+        function: Callable,
+        job_args: dict,
+        job_key=None,
+        tag="",
+        cost_key=None,
+        legacy_key=None,
     ) -> None:
         self.job_id = job_id
         self.function = function
         self.job_args = job_args
         if job_key is None:
-            self.job_key = hash_sha1(tuple(sorted(self.job_args.items())))
+            self.job_key = hash_canonical(tuple(sorted(self.job_args.items())))
         else:
             self.job_key = job_key
         self.tag = tag
+        # the key the wall time of the job is recorded under
+        self.cost_key = self.job_key if cost_key is None else cost_key
+        # the key an older version of bencher cached the result under, if the cache is being migrated
+        self.legacy_key = legacy_key
 
 
 # @dataclass
 class JobFuture:
-    def __init__(self, job: Job, res: dict = None, future: Future = None, cache=None) -> None:
+    def __init__(
+        self,
+        job: Job,
+        res: dict = None,
+        future: Future = None,
+        cache=None,
+        duration: float = None,
+        durations=None,
+        stored: bool = False,
+    ) -> None:
         self.job = job
         self.res = res
         self.future = future
+        self.duration = duration
+        self.durations = durations
         # either a result or a future needs to be passed
         assert self.res is not None or self.future is not None, (
             "make sure you are returning a dict or super().__call__(**kwargs) from your __call__ function"
         )
 
         self.cache = cache
+        # the worker has already written the result to the cache backend
+        self.stored = stored
 
     def result(self):
         if self.future is not None:
-            self.res = self.future.result()
+            self.res, self.duration = self.future.result()
         if self.cache is not None and self.res is not None:
-            self.cache.set(self.job.job_key, self.res, tag=self.job.tag)
+            self.res = self.cache.set(
+                self.job.job_key, self.res, tag=self.job.tag, stored=self.stored
+            )
+        if self.durations is not None and self.duration is not None:
+            self.durations.set(self.job.cost_key, self.duration, tag=self.job.tag)
         return self.res
 
 
-def run_job(job: Job) -> dict:
-    result = job.function(**job.job_args)
+def call_job(job: Job):
+    """Call the job function.  If the worker is an async function this returns a coroutine"""
+    return job.function(**job.job_args)
+
+
+def await_result(result):
+    """Run the coroutine returned by an async worker to completion, otherwise return the result unchanged"""
+    if inspect.isawaitable(result):
+        # async workers can be used with any executor but only run concurrently with Executors.ASYNCIO
+        result = asyncio.run(result)
     return result
 
 
+def run_job(job: Job) -> dict:
+    return await_result(call_job(job))
+
+
+def run_job_timed(job: Job) -> Tuple[dict, float]:
+    """Run the job and return the result and the wall time of the job in seconds"""
+    start = time.perf_counter()
+    result = run_job(job)
+    return result, time.perf_counter() - start
+
+
+def run_job_stored(
+    store, job: Job, blobs: BlobStore = None, namespace: str = None
+) -> Tuple[dict, float]:
+    """Run the job and write the result to a cache backend that supports concurrent writers from the worker, instead of sending it to the parent process to be written.  If there is a blob store, large results are written to it by the worker as well and the parent process only receives the references"""
+    result, duration = run_job_timed(job)
+    if result is not None:
+        if blobs is not None:
+            result = blobs.externalise(result)
+            blobs.retain(namespace, job.job_key, result, job.tag)
+        store.set(job.job_key, result, tag=job.tag)
+    return result, duration
+
+
+async def call_job_timed(job: Job) -> Tuple[dict, float]:
+    """Run the job on the event loop of Executors.ASYNCIO and return the result and the wall time of the job in seconds"""
+    start = time.perf_counter()
+    result = call_job(job)
+    if inspect.isawaitable(result):
+        result = await result
+    return result, time.perf_counter() - start
+
+
+class AsyncioExecutor(Executor):
+    """An executor that runs jobs on an asyncio event loop in a background thread. Coroutines returned by async workers are awaited on the loop so that up to max_concurrency of them run concurrently.  Synchronous workers run on the loop thread one at a time, so use Executors.THREADS for blocking code"""
+
+    def __init__(self, max_concurrency: int = None) -> None:
+        if max_concurrency is None:
+            max_concurrency = 64
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.pending = set()
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        async with self.semaphore:
+            result = fn(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        future = asyncio.run_coroutine_threadsafe(self.run(fn, *args, **kwargs), self.loop)
+        self.pending.add(future)
+        future.add_done_callback(self.pending.discard)
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        if cancel_futures:
+            for future in list(self.pending):
+                future.cancel()
+        if wait:
+            futures_wait(list(self.pending))
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
 class Executors(StrEnum):
     SERIAL = auto()  # slow but reliable
-    MULTIPROCESSING = auto()  # breaks for large number of futures
+    MULTIPROCESSING = auto()  # use max_jobs_in_flight to limit the number of pending futures
     SCOOP = auto()  # requires running with python -m scoop your_file.py
-    # THREADS=auto() #not that useful as most bench code is cpu bound
+    THREADS = auto()  # for io bound workers or workers that release the GIL
+    ASYNCIO = auto()  # for workers with an async __call__ function
+    REMOTE = auto()  # send jobs to the bencher-worker agents listed in BenchRunCfg.remote_workers
 
     @staticmethod
-    def factory(provider: Executors) -> Future:
+    def factory(
+        provider: Executors, max_workers: int = None, remote_workers: List[str] = None
+    ) -> Future:
         providers = {
-            Executors.SERIAL: None,
-            Executors.MULTIPROCESSING: ProcessPoolExecutor(),
-            Executors.SCOOP: scoop_future_executor,
+            Executors.SERIAL: lambda: None,
+            Executors.MULTIPROCESSING: lambda: ProcessPoolExecutor(
+                max_workers=max_workers, initializer=init_worker_process
+            ),
+            Executors.SCOOP: lambda: scoop_future_executor,
+            Executors.THREADS: lambda: ThreadPoolExecutor(max_workers=max_workers),
+            Executors.ASYNCIO: lambda: AsyncioExecutor(max_concurrency=max_workers),
+            Executors.REMOTE: lambda: RemoteExecutor(remote_workers),
         }
-        return providers[provider]
+        return providers[provider]()
+
+
+class ExecutorPool:
+    """Owns executors that outlive a single sweep so that warm worker processes are reused across sweeps, levels and repeats instead of being respawned each time.  The executors are only released when shutdown() is called or the pool is used as a context manager.
+
+    A pool can be passed to Bench directly, or activated with ExecutorPool.activate() so that any Bench created in that context uses it.
+    """
+
+    active: ExecutorPool = None
+
+    def __init__(self) -> None:
+        self.executors = {}
+
+    def get(
+        self, executor_type: Executors, max_workers: int = None, remote_workers: List[str] = None
+    ):
+        """Get the executor for an executor type, number of workers and set of remote workers, creating it the first time it is requested"""
+        key = (executor_type, max_workers, tuple(remote_workers) if remote_workers else None)
+        if key not in self.executors:
+            self.executors[key] = Executors.factory(executor_type, max_workers, remote_workers)
+        return self.executors[key]
+
+    @contextmanager
+    def activate(self):
+        """Use this pool for any Bench that was not explicitly given a pool"""
+        previous = ExecutorPool.active
+        ExecutorPool.active = self
+        try:
+            yield self
+        finally:
+            ExecutorPool.active = previous
+
+    def shutdown(self) -> None:
+        for executor in self.executors.values():
+            if executor is not None:
+                executor.shutdown()
+        self.executors = {}
+
+    def __enter__(self) -> ExecutorPool:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
 
 
 class FutureCache:
@@ -81,14 +256,56 @@ class FutureCache:
         tag_index: bool = True,
         size_limit: int = int(20e9),  # 20 GB
         cache_results=True,
+        executor_pool: ExecutorPool = None,
+        max_workers: int = None,
+        remote_workers: List[str] = None,
+        record_durations: bool = False,
+        memory_cache_entries: int = 0,
+        memory_cache_bytes: int = None,
+        backend: CacheBackends = CacheBackends.DISKCACHE,
+        codec: str = "none",
+        blob_threshold: int = None,
+        read_only_caches: List[str] = None,
     ):
         self.executor_type = executor
+        self.max_workers = max_workers
+        self.remote_workers = remote_workers
         self.executor = None
+        # if a pool is passed, the executor is owned by the pool and is not shut down when this cache is closed
+        self.executor_pool = executor_pool
         if cache_results:
-            self.cache = Cache(f"cachedir/{cache_name}", tag_index=tag_index, size_limit=size_limit)
+            self.cache = CacheBackends.factory(
+                backend,
+                f"cachedir/{cache_name}",
+                tag_index=tag_index,
+                size_limit=size_limit,
+                codec=codec,
+            )
             logging.info(f"cache dir: {self.cache.directory}")
         else:
             self.cache = None
+        if self.cache is not None and memory_cache_entries > 0:
+            self.memory_cache = shared_memory_cache(
+                self.cache.directory, memory_cache_entries, memory_cache_bytes
+            )
+        else:
+            self.memory_cache = None
+        # shared caches that are looked up, in order, when a result is not in this cache
+        self.layers = []
+        if self.cache is not None:
+            for directory in read_only_caches or []:
+                try:
+                    self.layers.append(open_read_only(directory))
+                except (FileNotFoundError, sqlite3.Error) as e:
+                    logging.warning(f"not using the shared cache {directory}: {e}")
+        if self.cache is not None and blob_threshold is not None:
+            self.blobs = BlobStore(threshold=blob_threshold)
+        else:
+            self.blobs = None
+        if record_durations:
+            self.durations = Cache(f"cachedir/{cache_name}_durations", tag_index=tag_index)
+        else:
+            self.durations = None
 
         self.overwrite = overwrite
         self.call_count = 0
@@ -97,39 +314,204 @@ class FutureCache:
         self.worker_wrapper_call_count = 0
         self.worker_fn_call_count = 0
         self.worker_cache_call_count = 0
+        self.memory_hit_count = 0
+        self.disk_hit_count = 0
+        self.shared_hit_count = 0
+
+    def probe(self, jobs: List[Job]) -> Dict[str, JobFuture]:
+        """Load the results of all the jobs that are already in the cache in a single transaction, instead of looking up each job as it is submitted.  The jobs that are not found should be submitted with check_cache=False
 
-    def submit(self, job: Job) -> JobFuture:
+        Args:
+            jobs (List[Job]): the jobs to look up
+
+        Returns:
+            Dict[str, JobFuture]: the completed jobs that were found in the cache, by job key
+        """
+        if self.cache is None or self.overwrite:
+            return {}
+        found = {}
+        missing = []
+        for job in jobs:
+            res = self.memory_cache.get(job.job_key) if self.memory_cache is not None else None
+            if res is not None:
+                self.memory_hit_count += 1
+                found[job.job_key] = JobFuture(job=job, res=self.internalise(res))
+            else:
+                missing.append(job)
+        if missing:
+            with self.cache.transact():
+                for job in missing:
+                    res, tag = self.load_disk(job.job_key, job.legacy_key)
+                    if res is not None:
+                        if self.memory_cache is not None:
+                            self.memory_cache.set(job.job_key, res, tag=tag)
+                        found[job.job_key] = JobFuture(job=job, res=self.internalise(res))
+        self.worker_wrapper_call_count += len(found)
+        self.worker_cache_call_count += len(found)
+        logging.info(f"found {len(found)}/{len(jobs)} jobs in cache")
+        return found
+
+    def submit(self, job: Job, check_cache: bool = True) -> JobFuture:
         self.worker_wrapper_call_count += 1
 
-        if self.cache is not None:
-            if not self.overwrite and job.job_key in self.cache:
+        if self.cache is not None and not self.overwrite and check_cache:
+            res = self.load(job.job_key, job.legacy_key)
+            if res is not None:
                 logging.info(f"Found job: {job.job_id} in cache, loading...")
                 # logging.info(f"Found key: {job.job_key} in cache")
                 self.worker_cache_call_count += 1
                 return JobFuture(
                     job=job,
-                    res=self.cache[job.job_key],
+                    res=res,
                 )
 
         self.worker_fn_call_count += 1
 
         if self.executor_type is not Executors.SERIAL:
             if self.executor is None:
-                self.executor = Executors.factory(self.executor_type)
+                if self.executor_pool is not None:
+                    self.executor = self.executor_pool.get(
+                        self.executor_type, self.max_workers, self.remote_workers
+                    )
+                else:
+                    self.executor = Executors.factory(
+                        self.executor_type, self.max_workers, self.remote_workers
+                    )
         if self.executor is not None:
             self.overwrite_msg(job, " starting parallel job...")
+            # the asyncio executor awaits coroutines from async workers on its own event loop
+            job_fn = call_job_timed if self.executor_type == Executors.ASYNCIO else run_job_timed
+            stored = self.workers_write_results()
+            if stored:
+                job_fn = partial(
+                    run_job_stored, self.cache, blobs=self.blobs, namespace=self.cache.directory
+                )
             return JobFuture(
                 job=job,
-                future=self.executor.submit(run_job, job),
-                cache=self.cache,
+                future=self.executor.submit(job_fn, job),
+                cache=self if self.cache is not None else None,
+                durations=self.durations,
+                stored=stored,
             )
         self.overwrite_msg(job, " starting serial job...")
+        res, duration = run_job_timed(job)
         return JobFuture(
             job=job,
-            res=run_job(job),
-            cache=self.cache,
+            res=res,
+            cache=self if self.cache is not None else None,
+            duration=duration,
+            durations=self.durations,
         )
 
+    def workers_write_results(self) -> bool:
+        """Results are written to the cache by the worker processes or threads that compute them if the backend supports concurrent writers and the workers run on this host"""
+        return (
+            self.cache is not None
+            and getattr(self.cache, "concurrent_writes", False)
+            and self.executor_type in (Executors.MULTIPROCESSING, Executors.THREADS)
+        )
+
+    def load(self, key: str, legacy_key: str = None):
+        """Load a result from the memory tier, or from disk if it is not in memory
+
+        Args:
+            key (str): the key of the job
+            legacy_key (str, optional): the key an older version of bencher cached the result under. Defaults to None.
+
+        Returns:
+            the result, or None if it is not in the cache
+        """
+        if self.memory_cache is not None:
+            res = self.memory_cache.get(key)
+            if res is not None:
+                self.memory_hit_count += 1
+                return self.internalise(res)
+        res, tag = self.load_disk(key, legacy_key)
+        if res is not None and self.memory_cache is not None:
+            self.memory_cache.set(key, res, tag=tag)
+        return self.internalise(res)
+
+    def load_disk(self, key: str, legacy_key: str = None) -> Tuple[Any, str]:
+        """Look up a result on disk, then under its legacy key, then in the shared caches.  A result that is found under its legacy key is copied to its current key
+
+        Args:
+            key (str): the key of the job
+            legacy_key (str, optional): the key an older version of bencher cached the result under. Defaults to None.
+
+        Returns:
+            Tuple[Any, str]: the result and its tag, or (None, None) if it is not in any cache
+        """
+        # a single lookup instead of checking if the key is in the cache and then reading it.  The tag is loaded so the entry can be evicted from the memory tier by tag
+        res, tag = self.cache.get(key, tag=True)
+        if res is None and legacy_key is not None:
+            res, tag = self.cache.get(legacy_key, tag=True)
+            if res is not None:
+                # migrate the result to the current key
+                self.cache.set(key, res, tag=tag)
+        if res is not None:
+            self.disk_hit_count += 1
+            return res, tag
+        return self.load_shared(key)
+
+    def load_shared(self, key: str) -> Tuple[Any, str]:
+        """Look up a result in the read only shared caches, in order.  Results that are found are not copied to this cache, as the shared caches are persistent
+
+        Args:
+            key (str): the key of the job
+
+        Returns:
+            Tuple[Any, str]: the result and its tag, or (None, None) if no shared cache has it
+        """
+        for layer in self.layers:
+            res, tag = layer.get(key, tag=True)
+            if res is not None:
+                self.shared_hit_count += 1
+                return res, tag
+        return None, None
+
+    def set(self, key: str, value, tag: str = "", stored: bool = False):
+        """Store a result on disk and in the memory tier.  If there is a blob store, large arrays and the files the result refers to are stored in it and the cache entry refers to them
+
+        Args:
+            key (str): the key of the job
+            value: the result of the job
+            tag (str, optional): the tag of the job. Defaults to "".
+            stored (bool, optional): the result was already written to the backend by the worker, so only the memory tier is updated. Defaults to False.
+
+        Returns:
+            the result as it is loaded from the cache
+        """
+        if not stored:
+            if self.blobs is not None:
+                value = self.blobs.externalise(value)
+                # the references are recorded before the entry is written so a blob is never deleted while an entry refers to it
+                self.blobs.retain(self.cache.directory, key, value, tag)
+            self.cache.set(key, value, tag=tag)
+        if self.memory_cache is not None and isinstance(value, dict):
+            # a copy so that later changes to the dict returned by the worker are not seen by the cache
+            self.memory_cache.set(key, dict(value), tag=tag)
+        return self.internalise(value)
+
+    def internalise(self, res):
+        """Replace the references to arrays in the blob store with the arrays"""
+        if self.blobs is None:
+            return res
+        return BlobStore.internalise(res)
+
+    def expected_durations(self, jobs: List[Job]) -> List[float | None]:
+        """The wall time in seconds each job took the last time it was run, or None if it has not been recorded.  The times are read in a single transaction instead of one per job
+
+        Args:
+            jobs (List[Job]): the jobs to look up
+
+        Returns:
+            List[float | None]: the recorded times in the order of the jobs
+        """
+        if self.durations is None:
+            return [None] * len(jobs)
+        with self.durations.transact():
+            return [self.durations.get(job.cost_key) for job in jobs]
+
     def overwrite_msg(self, job: Job, suffix: str) -> None:
         msg = "OVERWRITING" if self.overwrite else "NOT in"
         logging.info(f"{job.job_id} {msg} cache{suffix}")
@@ -139,21 +521,42 @@ class FutureCache:
         self.worker_wrapper_call_count = 0
         self.worker_fn_call_count = 0
         self.worker_cache_call_count = 0
+        self.memory_hit_count = 0
+        self.disk_hit_count = 0
+        self.shared_hit_count = 0
 
     def clear_cache(self) -> None:
         if self.cache:
             self.cache.clear()
+        if self.blobs is not None:
+            self.blobs.release_namespace(self.cache.directory)
+        if self.memory_cache is not None:
+            self.memory_cache.clear()
 
     def clear_tag(self, tag: str) -> None:
         logging.info(f"clearing the sample cache for tag: {tag}")
         removed_vals = self.cache.evict(tag)
         logging.info(f"removed: {removed_vals} items from the cache")
+        if self.memory_cache is not None:
+            self.memory_cache.evict(tag)
+        if self.durations is not None:
+            self.durations.evict(tag)
+        if self.blobs is not None:
+            self.blobs.release_tag(self.cache.directory, tag)
 
     def close(self) -> None:
         if self.cache:
             self.cache.close()
+        if self.durations is not None:
+            self.durations.close()
+        if self.blobs is not None:
+            self.blobs.close()
+        for layer in self.layers:
+            layer.close()
+        self.layers = []
         if self.executor:
-            self.executor.shutdown()
+            if self.executor_pool is None:
+                self.executor.shutdown()
             self.executor = None
 
     def stats(self) -> str:
@@ -161,7 +564,21 @@ class FutureCache:
         logging.info(f"cache calls: {self.worker_cache_call_count}")
         logging.info(f"worker calls: {self.worker_fn_call_count}")
         if self.cache:
-            return f"cache size :{int(self.cache.volume() / 1000000)}MB / {int(self.size_limit / 1000000)}MB"
+            msg = f"cache size :{int(self.cache.volume() / 1000000)}MB / {int(self.size_limit / 1000000)}MB"
+            lookups = (
+                self.memory_hit_count
+                + self.disk_hit_count
+                + self.shared_hit_count
+                + self.worker_fn_call_count
+            )
+            if lookups > 0 and not self.overwrite:
+                msg += (
+                    f", memory hits: {self.memory_hit_count}/{lookups} ({self.memory_hit_count / lookups:.0%})"
+                    f", disk hits: {self.disk_hit_count}/{lookups} ({self.disk_hit_count / lookups:.0%})"
+                )
+                if self.layers:
+                    msg += f", shared hits: {self.shared_hit_count}/{lookups} ({self.shared_hit_count / lookups:.0%})"
+            return msg
         return ""
 
 
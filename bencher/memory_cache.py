@@ -0,0 +1,137 @@
+"""An in-process tier in front of the sample cache on disk.  The most recently used results are kept in memory so that samples that are loaded again by the next level or repeat of a BenchRunner do not need a disk lookup"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any
+import os
+import sys
+import numpy as np
+
+# cache directory -> LRUCache shared by every FutureCache of that directory in this process
+_shared = {}
+
+
+def size_of(value: Any) -> int:
+    """Estimate the memory used by a value without pickling it.  Arrays are measured by the size of their data and containers by the sum of their items.  Other objects are measured by sys.getsizeof, which does not count the objects they refer to, so the estimate is only a lower bound for them
+
+    Args:
+        value (Any): a result of a worker
+
+    Returns:
+        int: the estimated size of the value in bytes
+    """
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(size_of(v) for v in value.flat)
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(size_of(k) + size_of(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(size_of(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def copy_mutable(value: Any) -> Any:
+    """Copy the mutable containers and arrays of a value so that changing the copy does not change the value kept in the cache"""
+    if isinstance(value, dict):
+        return {k: copy_mutable(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_mutable(v) for v in value]
+    if isinstance(value, set):
+        return set(value)
+    if isinstance(value, np.ndarray) and value.flags.writeable:
+        return value.copy()
+    return value
+
+
+class LRUCache:
+    """A bounded mapping that evicts the least recently used entries when it holds more than max_entries entries or more than max_bytes of values.  Values are copied when they are set and when they are returned by get, down to their mutable containers and arrays, so callers can change them without changing the cache"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = None) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (value, tag, estimated size of the value)
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        # identifies the cache on disk that the entries were loaded from
+        self.disk_key = None
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        self.entries.move_to_end(key)
+        return copy_mutable(entry[0])
+
+    def set(self, key: Any, value: Any, tag: str = None) -> None:
+        self.pop(key)
+        nbytes = 0
+        if self.max_bytes is not None:
+            nbytes = size_of(value)
+            if nbytes > self.max_bytes:
+                # a value that does not fit would evict every other entry
+                return
+        self.entries[key] = (copy_mutable(value), tag, nbytes)
+        self.nbytes += nbytes
+        self.trim()
+
+    def pop(self, key: Any) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+
+    def trim(self) -> None:
+        while len(self.entries) > self.max_entries or (
+            self.max_bytes is not None and self.nbytes > self.max_bytes
+        ):
+            _, (_, _, nbytes) = self.entries.popitem(last=False)
+            self.nbytes -= nbytes
+
+    def evict(self, tag: str) -> int:
+        """Remove all the entries with a tag
+
+        Args:
+            tag (str): the tag the entries were set with
+
+        Returns:
+            int: the number of entries removed
+        """
+        keys = [k for k, (_, t, _) in self.entries.items() if t == tag]
+        for k in keys:
+            self.pop(k)
+        return len(keys)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.nbytes = 0
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def shared_memory_cache(directory: str, max_entries: int, max_bytes: int = None) -> LRUCache:
+    """Get the memory tier of a cache directory.  The tier is shared by every FutureCache in this process that uses the directory, so it outlives a single sweep
+
+    Args:
+        directory (str): the directory of the cache on disk
+        max_entries (int): the maximum number of entries kept in memory
+        max_bytes (int, optional): the maximum total estimated size of the entries kept in memory. Defaults to None.
+
+    Returns:
+        LRUCache: the memory tier of the directory
+    """
+    # if the cache on disk is deleted and created again, the entries in memory are no longer valid
+    key = (directory, os.stat(directory).st_ino)
+    memory = _shared.get(directory)
+    if (
+        memory is None
+        or memory.disk_key != key
+        or (memory.max_entries, memory.max_bytes) != (max_entries, max_bytes)
+    ):
+        # the sizes of the entries are only measured when there is a byte limit, so start again if the limits change
+        memory = _shared[directory] = LRUCache(max_entries, max_bytes)
+        memory.disk_key = key
+    return memory
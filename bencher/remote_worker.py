@@ -0,0 +1,233 @@
+"""Distribute the jobs of a sweep over TCP to worker agents running on other hosts.  Start an agent on each host with the bencher-worker entry point and list the agents in BenchRunCfg.remote_workers to run a sweep with Executors.REMOTE.
+
+Jobs and results are pickled, so agents must be able to import the code of the benchmark and should only be exposed to trusted networks.  Connections are authenticated with the key in the BENCHER_AUTHKEY environment variable, which must be set to the same secret for the coordinator and the agents.  Agents and executors refuse to start without it, and agents only listen on the loopback interface unless another host is passed.
+"""
+
+from __future__ import annotations
+from typing import Callable, List, Tuple
+from concurrent.futures import Executor, Future
+from contextlib import suppress
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+import argparse
+import logging
+import os
+import queue
+import socket
+import threading
+import traceback
+from bencher.worker_registry import release_all_contexts
+
+DEFAULT_PORT = 7600
+
+
+def default_authkey() -> bytes:
+    """The key that connections between executors and agents are authenticated with
+
+    Raises:
+        RuntimeError: If the BENCHER_AUTHKEY environment variable is not set.  Anyone who knows the key can run code on the agents, so there is no default key
+
+    Returns:
+        bytes: the value of the BENCHER_AUTHKEY environment variable
+    """
+    authkey = os.environ.get("BENCHER_AUTHKEY")
+    if not authkey:
+        raise RuntimeError(
+            "Set the BENCHER_AUTHKEY environment variable to a secret shared by the benchmark and the bencher-worker agents"
+        )
+    return authkey.encode()
+
+
+def parse_address(address: str | Tuple[str, int]) -> Tuple[str, int]:
+    """Convert a host:port string to a (host, port) tuple
+
+    Args:
+        address (str | Tuple[str, int]): a host:port string or a (host, port) tuple
+
+    Returns:
+        Tuple[str, int]: the address as a (host, port) tuple
+    """
+    if isinstance(address, str):
+        host, _, port = address.rpartition(":")
+        return host, int(port)
+    return tuple(address)
+
+
+class RemoteExecutor(Executor):
+    """An executor that sends jobs to remote worker agents.  Each agent evaluates one job at a time and takes the next pending job as soon as it returns a result, so faster hosts evaluate more of the sweep.  Jobs that were sent to an agent that disconnects are given to the remaining agents"""
+
+    def __init__(self, addresses: List[str], authkey: bytes = None) -> None:
+        if not addresses:
+            raise ValueError(
+                "Executors.REMOTE needs at least one address in BenchRunCfg.remote_workers"
+            )
+        self.authkey = default_authkey() if authkey is None else authkey
+        self.jobs = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.shutting_down = False
+        self.threads = [
+            threading.Thread(target=self.serve_agent, args=(parse_address(a),), daemon=True)
+            for a in addresses
+        ]
+        self.agents_alive = len(self.threads)
+        for t in self.threads:
+            t.start()
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        future = Future()
+        with self.lock:
+            if self.shutting_down:
+                raise RuntimeError("cannot submit jobs after shutdown")
+            if self.agents_alive == 0:
+                raise RuntimeError("none of the remote workers are available")
+            self.jobs.put((future, fn, args, kwargs))
+        return future
+
+    def serve_agent(self, address: Tuple[str, int]) -> None:
+        """Send jobs to the agent at address until the executor is shut down or the agent disconnects"""
+        item = None
+        try:
+            with Client(address, authkey=self.authkey) as conn:
+                logging.info(f"connected to remote worker {address}")
+                while True:
+                    item = self.jobs.get()
+                    if item is None:
+                        return
+                    future, fn, args, kwargs = item
+                    if not future.running() and not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        conn.send((fn, args, kwargs))
+                        success, value = conn.recv()
+                    except (OSError, EOFError):
+                        raise
+                    except Exception as e:  # pylint: disable=broad-except
+                        # the job could not be pickled or the reply could not be unpickled
+                        success, value = False, e
+                    if success:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+                    item = None
+        except (OSError, EOFError, AuthenticationError) as e:
+            logging.warning(f"lost remote worker {address}: {e}")
+        finally:
+            self.agent_finished(item)
+
+    def agent_finished(self, item) -> None:
+        """Give the job the agent was evaluating to the other agents, or fail every pending job if there are no agents left"""
+        with self.lock:
+            self.agents_alive -= 1
+            if item is not None:
+                self.jobs.put(item)
+            if self.agents_alive > 0:
+                return
+            while True:
+                try:
+                    pending = self.jobs.get_nowait()
+                except queue.Empty:
+                    return
+                if pending is not None and not pending[0].done():
+                    pending[0].set_exception(
+                        RuntimeError("none of the remote workers are available")
+                    )
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self.lock:
+            self.shutting_down = True
+            if cancel_futures:
+                while True:
+                    try:
+                        pending = self.jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    if pending is not None:
+                        pending[0].cancel()
+            for _ in self.threads:
+                self.jobs.put(None)
+        if wait:
+            for t in self.threads:
+                t.join()
+
+
+class RemoteWorkerAgent:
+    """Evaluates jobs sent by a RemoteExecutor.  Every connection is served by its own thread, so a coordinator can open several connections to the same agent.  Each thread evaluates its jobs with its own copy of the worker, so jobs from different connections do not share the state of the worker"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, authkey: bytes = None):
+        self.authkey = default_authkey() if authkey is None else authkey
+        self.listener = Listener((host, port), authkey=self.authkey)
+        self.closed = False
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.listener.address
+
+    def serve_forever(self) -> None:
+        while not self.closed:
+            try:
+                conn = self.listener.accept()
+            except Exception as e:  # pylint: disable=broad-except
+                if self.closed:
+                    break
+                logging.warning(f"rejected connection: {e}")
+                continue
+            threading.Thread(target=self.serve_connection, args=(conn,), daemon=True).start()
+
+    def serve_connection(self, conn) -> None:
+        with conn:
+            while True:
+                try:
+                    fn, args, kwargs = conn.recv()
+                except (OSError, EOFError):
+                    return
+                try:
+                    reply = (True, fn(*args, **kwargs))
+                except Exception as e:  # pylint: disable=broad-except
+                    reply = (False, e)
+                try:
+                    conn.send(reply)
+                except (OSError, EOFError):
+                    return
+                except Exception:  # pylint: disable=broad-except
+                    # the result or exception could not be pickled
+                    conn.send((False, RuntimeError(traceback.format_exc())))
+
+    def close(self) -> None:
+        self.closed = True
+        # wake up the blocking accept() so serve_forever can return
+        with suppress(OSError):
+            socket.create_connection(self.address, timeout=1).close()
+        self.listener.close()
+        release_all_contexts()
+
+
+def main(argv: List[str] = None) -> None:
+    """Entry point of bencher-worker"""
+    parser = argparse.ArgumentParser(
+        description="Evaluate the jobs of bencher sweeps that are run with Executors.REMOTE.  The connection is authenticated with the BENCHER_AUTHKEY environment variable"
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="the interface to listen on.  Only pass an interface that is reachable from other hosts on a trusted network",
+    )
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="the port to listen on")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        agent = RemoteWorkerAgent(args.host, args.port)
+    except RuntimeError as e:
+        parser.error(str(e))
+    host, port = agent.address
+    print(f"bencher-worker listening on {host}:{port}", flush=True)
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+from contextlib import suppress
+from typing import Any, List, Optional
+import os
+import numpy as np
+import xarray as xr
+from xarray.backends import BackendArray
+from xarray.core import indexing
+
+
+class ResultBuffer:
+    """Stores the results of a sweep in preallocated flat numpy arrays. Samples are written with flat indices calculated from the n-d index of the sample, and the arrays are only wrapped into an xr.Dataset once the sweep has completed. This avoids the overhead of xarray indexing for every sample and supports any number of dimensions"""
+
+    def __init__(
+        self, dims_name: List[str], dims_size: List[int], coords: dict, directory: str = None
+    ) -> None:
+        """
+        Args:
+            dims_name (List[str]): the names of the dimensions
+            dims_size (List[int]): the sizes of the dimensions
+            coords (dict): the coordinates of the dimensions
+            directory (str, optional): if set, the numeric arrays are memory mapped .npy files in this directory so that results larger than memory are paged to disk as they are filled. Defaults to None.
+        """
+        self.dims_name = list(dims_name)
+        self.dims_size = tuple(dims_size)
+        self.coords = coords
+        self.size = int(np.prod(self.dims_size))
+        self.data_vars = {}
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def add_var(self, name: str, fill_value: Any, dtype: Any) -> None:
+        """Allocate a flat array for a result variable
+
+        Args:
+            name (str): name of the variable in the dataset
+            fill_value (Any): the value of samples that have not been set
+            dtype (Any): the numpy dtype of the array
+        """
+        if self.directory is not None and np.dtype(dtype).kind in "biufc":
+            path = os.path.join(self.directory, f"{len(self.data_vars)}.npy")
+            # unlink the file of a previous run so results that still map it are not changed
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            buffer = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(self.size,))
+            buffer[:] = fill_value
+            self.data_vars[name] = buffer
+        else:
+            self.data_vars[name] = np.full(self.size, fill_value, dtype=dtype)
+
+    def flat_index(self, index_tuple) -> int | np.ndarray:
+        """Convert an n-d index (or a tuple of arrays of n-d indices) to flat indices into the buffer"""
+        return np.ravel_multi_index(index_tuple, self.dims_size)
+
+    def set(self, name: str, flat_index: int | np.ndarray, value: Any) -> None:
+        self.data_vars[name][flat_index] = value
+
+    def to_dataset(self) -> xr.Dataset:
+        """Wrap the buffers in an xr.Dataset without copying them"""
+        data_vars = {
+            k: (self.dims_name, v.reshape(self.dims_size)) for k, v in self.data_vars.items()
+        }
+        return xr.Dataset(data_vars=data_vars, coords=self.coords)
+
+
+class SparseArray(BackendArray):
+    """A result variable of a sparse sweep stored as a list of the flat indices of the sampled coordinates and their values.  A dense array is only built for the part of the variable that is indexed, so plotting a slice of a large sparse sweep does not allocate the whole grid"""
+
+    def __init__(
+        self, index: np.ndarray, sampled: np.ndarray, shape: tuple, fill_value: Any
+    ) -> None:
+        """
+        Args:
+            index (np.ndarray): the sorted flat indices of the sampled coordinates
+            sampled (np.ndarray): the value of each sampled coordinate
+            shape (tuple): the shape of the dense array
+            fill_value (Any): the value of the coordinates that were not sampled
+        """
+        self.index = index
+        self.sampled = sampled
+        self.shape = tuple(shape)
+        self.dtype = sampled.dtype
+        self.fill_value = fill_value
+
+    def __getitem__(self, key: indexing.ExplicitIndexer) -> np.ndarray:
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.OUTER, self._getitem
+        )
+
+    def _getitem(self, key: tuple) -> np.ndarray:
+        coords = np.unravel_index(self.index, self.shape)
+        mask = np.ones(len(self.index), dtype=bool)
+        positions = []
+        out_shape = []
+        for dim_key, dim_coords, size in zip(key, coords, self.shape):
+            selected = np.arange(size)[dim_key]
+            lookup = np.full(size, -1)
+            lookup[np.atleast_1d(selected)] = np.arange(np.size(selected))
+            position = lookup[dim_coords]
+            mask &= position >= 0
+            positions.append(position)
+            if np.ndim(selected) > 0:
+                out_shape.append(len(selected))
+        out = np.full(
+            [np.size(np.arange(size)[k]) for k, size in zip(key, self.shape)],
+            self.fill_value,
+            dtype=self.dtype,
+        )
+        out[tuple(p[mask] for p in positions)] = self.sampled[mask]
+        return out.reshape(out_shape)
+
+    def todense(self) -> np.ndarray:
+        return self._getitem(tuple(slice(None) for _ in self.shape))
+
+
+def sparse_array(variable: xr.Variable) -> Optional[SparseArray]:
+    """Get the SparseArray of a variable if the variable is an unindexed view of it"""
+    data = variable._data  # pylint: disable=protected-access
+    if isinstance(data, indexing.LazilyIndexedArray) and isinstance(data.array, SparseArray):
+        if all(k == slice(None) for k in data.key.tuple):
+            return data.array
+    return None
+
+
+class SparseResultBuffer(ResultBuffer):
+    """A ResultBuffer that only allocates the coordinates of the sweep that are sampled.  Sweeps with a constraint on their inputs skip most of the Cartesian product of the inputs, so the results are stored as a list of coordinates and wrapped in SparseArrays that are converted to dense arrays when they are indexed"""
+
+    def __init__(
+        self, dims_name: List[str], dims_size: List[int], coords: dict, index_tuples: List[tuple]
+    ) -> None:
+        """
+        Args:
+            dims_name (List[str]): the names of the dimensions
+            dims_size (List[int]): the sizes of the dimensions
+            coords (dict): the coordinates of the dimensions
+            index_tuples (List[tuple]): the n-d indices of the sampled coordinates
+        """
+        super().__init__(dims_name, dims_size, coords)
+        if len(index_tuples) > 0:
+            flat = np.ravel_multi_index(tuple(np.array(index_tuples).T), self.dims_size)
+        else:
+            flat = np.array([], dtype=np.int64)
+        self.index = np.unique(flat)
+        self.size = len(self.index)
+        self.fill_values = {}
+
+    def add_var(self, name: str, fill_value: Any, dtype: Any) -> None:
+        super().add_var(name, fill_value, dtype)
+        self.fill_values[name] = fill_value
+
+    def flat_index(self, index_tuple) -> int | np.ndarray:
+        """Convert an n-d index (or a tuple of arrays of n-d indices) to indices into the list of sampled coordinates"""
+        return np.searchsorted(self.index, np.ravel_multi_index(index_tuple, self.dims_size))
+
+    def to_dataset(self) -> xr.Dataset:
+        """Wrap the buffers in SparseArrays without copying them"""
+        data_vars = {
+            k: xr.Variable(
+                self.dims_name,
+                indexing.LazilyIndexedArray(
+                    SparseArray(self.index, v, self.dims_size, self.fill_values[k])
+                ),
+            )
+            for k, v in self.data_vars.items()
+        }
+        return xr.Dataset(data_vars=data_vars, coords=self.coords)
@@ -0,0 +1,309 @@
+"""Columnar storage of the results of whole benchmarks.  Each data variable of a BenchResult dataset is stored in its own file next to a small metadata record, and loaded lazily when it is first used, so a large result can be opened without reading the variables that are not plotted"""
+
+from __future__ import annotations
+from collections import defaultdict
+from contextlib import suppress
+from typing import Any, Optional
+import logging
+import os
+import shutil
+import socket
+import weakref
+from uuid import uuid4
+import numpy as np
+import xarray as xr
+from xarray.backends import BackendArray
+from xarray.core import indexing
+from .compression import dumps, loads
+from .result_buffer import sparse_array
+
+META_NAME = "meta.pkl"
+EXTRAS_NAME = "extras.pkl"
+CURRENT_NAME = "current"
+TMP_SUFFIX = ".tmp"
+LEASE_PREFIX = "lease."
+_HOST = socket.gethostname()
+
+
+class ColumnArray(BackendArray):
+    """A data variable stored in a column file that is only read when the variable is indexed.  Numeric columns are memory mapped, and object columns are unpickled on first use"""
+
+    def __init__(self, path: str, shape: tuple, dtype: np.dtype) -> None:
+        self.path = path
+        self.shape = shape
+        self.dtype = dtype
+        self._values = None
+        _live_columns.add(self)
+
+    def read(self) -> np.ndarray:
+        if self._values is None:
+            if self.path.endswith(".npy"):
+                self._values = np.load(self.path, mmap_mode="r")
+            else:
+                with open(self.path, "rb") as f:
+                    self._values = loads(f.read())
+        return self._values
+
+    def __getitem__(self, key: indexing.ExplicitIndexer) -> np.ndarray:
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.BASIC, self._getitem
+        )
+
+    def _getitem(self, key) -> np.ndarray:
+        return np.asarray(self.read()[key])
+
+    def __getstate__(self):
+        # the values are read again after unpickling
+        return (self.path, self.shape, self.dtype)
+
+    def __setstate__(self, state) -> None:
+        self.path, self.shape, self.dtype = state
+        self._values = None
+        _live_columns.add(self)
+
+
+# the columns of loaded results, so the versions they read from are not deleted while they are used
+_live_columns: weakref.WeakSet[ColumnArray] = weakref.WeakSet()
+
+
+def referenced(version_dir: str) -> bool:
+    """Returns true if a result loaded in this process reads columns from a version directory"""
+    prefix = version_dir + os.sep
+    return any(c.path.startswith(prefix) for c in list(_live_columns))
+
+
+def lease_path(version_dir: str) -> str:
+    """The lease file that marks a version directory as used by this process"""
+    return os.path.join(version_dir, f"{LEASE_PREFIX}{_HOST}.{os.getpid()}")
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def leased_by_other_process(version_dir: str) -> bool:
+    """Returns true if another process that is still running has loaded a result from a version directory.  Leases of processes on other hosts are always honoured, as it can not be checked if they are running"""
+    try:
+        names = os.listdir(version_dir)
+    except FileNotFoundError:
+        return False
+    for name in names:
+        if not name.startswith(LEASE_PREFIX):
+            continue
+        host, _, pid = name[len(LEASE_PREFIX) :].rpartition(".")
+        if host != _HOST:
+            return True
+        if int(pid) != os.getpid() and process_alive(int(pid)):
+            return True
+    return False
+
+
+class ResultStore:
+    """Stores BenchResults in a directory per key.  The directory has a file per data variable, a metadata record with the rest of the BenchResult and its coordinates, and the hmaps and dataset lists of the result if it has any.
+
+    Each save of a key writes a new version directory and then atomically replaces a pointer file that names the current version, so a result that is interrupted while it is saved is never loaded, and results that were loaded before and read their columns lazily keep reading the version they were loaded from.
+
+    Loading a version writes a lease file with the host and pid of the process to the version directory.  Old versions are deleted once no result loaded in this process refers to them and no other running process holds a lease on them, so plot servers and sweeps in other processes can keep reading the versions they loaded
+    """
+
+    def __init__(self, directory: str = "cachedir/results", codec: str = "none") -> None:
+        """
+        Args:
+            directory (str, optional): the directory of the results. Defaults to "cachedir/results".
+            codec (str, optional): the codec the metadata and object columns are compressed with. Numeric columns are not compressed so they can be memory mapped. Defaults to "none".
+        """
+        self.directory = os.path.abspath(directory)
+        self.codec = codec
+
+    def result_dir(self, key: Any) -> str:
+        return os.path.join(self.directory, str(key))
+
+    def current_version(self, key: Any) -> Optional[str]:
+        """The directory of the current version of the result of a key, or None if it has not been saved"""
+        result_dir = self.result_dir(key)
+        try:
+            with open(os.path.join(result_dir, CURRENT_NAME), "r", encoding="utf-8") as f:
+                return os.path.join(result_dir, f.read())
+        except FileNotFoundError:
+            return None
+
+    def __contains__(self, key: Any) -> bool:
+        version_dir = self.current_version(key)
+        return version_dir is not None and os.path.exists(os.path.join(version_dir, META_NAME))
+
+    def save(self, key: Any, bench_res) -> None:
+        """Save a BenchResult with each data variable in its own column file
+
+        Args:
+            key (Any): the hash of the benchmark configuration
+            bench_res (BenchResult): the result to save
+        """
+        result_dir = self.result_dir(key)
+        version = uuid4().hex
+        tmp_dir = os.path.join(result_dir, f"{version}{TMP_SUFFIX}")
+        os.makedirs(tmp_dir)
+
+        ds = bench_res.ds
+        columns = {}
+        for i, (name, var) in enumerate(ds.data_vars.items()):
+            sparse = sparse_array(var.variable)
+            if sparse is not None:
+                # the results of constrained sweeps are saved as their list of sampled coordinates
+                filename = f"col{i}.sparse"
+                self.write(os.path.join(tmp_dir, filename), dumps(sparse, self.codec))
+                columns[name] = (filename, var.dims, sparse.shape, sparse.dtype, var.attrs)
+                continue
+            values = var.values
+            if values.dtype.kind in "biufcmM":
+                filename = f"col{i}.npy"
+                np.save(os.path.join(tmp_dir, filename), values, allow_pickle=False)
+            else:
+                filename = f"col{i}.pkl"
+                self.write(os.path.join(tmp_dir, filename), dumps(values, self.codec))
+            columns[name] = (filename, var.dims, values.shape, values.dtype, var.attrs)
+
+        extras = {"hmaps": bench_res.hmaps, "dataset_list": bench_res.dataset_list}
+        has_extras = bool(bench_res.hmaps) or bool(bench_res.dataset_list)
+        if has_extras:
+            self.write(os.path.join(tmp_dir, EXTRAS_NAME), dumps(extras, self.codec))
+
+        # the metadata is the BenchResult without its data variables, hmaps and datasets.  The constraint of the sweep is not saved as it is often a lambda that can not be pickled
+        object_index = bench_res.object_index
+        constraint = getattr(bench_res.bench_cfg, "constraint", None)
+        try:
+            if constraint is not None:
+                bench_res.bench_cfg.constraint = None
+            bench_res.ds = ds.drop_vars(list(ds.data_vars))
+            bench_res.object_index = []
+            bench_res.hmaps = defaultdict(dict)
+            bench_res.dataset_list = []
+            meta = {"result": bench_res, "columns": columns, "has_extras": has_extras}
+            self.write(os.path.join(tmp_dir, META_NAME), dumps(meta, self.codec))
+        finally:
+            if constraint is not None:
+                bench_res.bench_cfg.constraint = constraint
+            bench_res.ds = ds
+            bench_res.object_index = object_index
+            bench_res.hmaps = extras["hmaps"]
+            bench_res.dataset_list = extras["dataset_list"]
+
+        os.replace(tmp_dir, os.path.join(result_dir, version))
+        pointer = os.path.join(result_dir, f"{CURRENT_NAME}.{version}{TMP_SUFFIX}")
+        with open(pointer, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(result_dir, CURRENT_NAME))
+        self.prune(key)
+
+    def prune(self, key: Any) -> int:
+        """Delete the versions of the result of a key that are not current, that no result loaded in this process refers to and that no other running process holds a lease on.  Versions that are still being written are kept
+
+        Returns:
+            int: the number of versions that were deleted
+        """
+        result_dir = self.result_dir(key)
+        current = self.current_version(key)
+        deleted = 0
+        for entry in os.scandir(result_dir):
+            if (
+                not entry.is_dir()
+                or entry.name.endswith(TMP_SUFFIX)
+                or entry.path == current
+                or referenced(entry.path)
+            ):
+                continue
+            # this process no longer uses the version, so only the leases of other processes keep it
+            with suppress(FileNotFoundError):
+                os.remove(lease_path(entry.path))
+            if not leased_by_other_process(entry.path):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                deleted += 1
+        return deleted
+
+    @staticmethod
+    def write(path: str, data: bytes) -> None:
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def load(self, key: Any):
+        """Load a BenchResult.  Only the metadata is read, the data variables are read when they are used
+
+        Args:
+            key (Any): the hash of the benchmark configuration
+
+        Returns:
+            BenchResult: the result, or None if there is no result for the key
+        """
+        meta = None
+        # the version can be pruned by another process between reading the pointer and taking the lease, so the pointer is read again if that happens
+        for _ in range(3):
+            result_dir = self.current_version(key)
+            if result_dir is None:
+                return None
+            try:
+                # take the lease before reading the version so it is not deleted while the columns are read lazily
+                self.write(lease_path(result_dir), b"")
+                with open(os.path.join(result_dir, META_NAME), "rb") as f:
+                    meta = loads(f.read())
+                break
+            except FileNotFoundError:
+                continue
+        if meta is None:
+            return None
+        bench_res = meta["result"]
+        data_vars = {}
+        for name, (filename, dims, shape, dtype, attrs) in meta["columns"].items():
+            if filename.endswith(".sparse"):
+                with open(os.path.join(result_dir, filename), "rb") as f:
+                    column = loads(f.read())
+            else:
+                column = ColumnArray(os.path.join(result_dir, filename), shape, dtype)
+            data_vars[name] = xr.Variable(dims, indexing.LazilyIndexedArray(column), attrs)
+        bench_res.ds = bench_res.ds.assign(data_vars)
+        if meta["has_extras"]:
+            with open(os.path.join(result_dir, EXTRAS_NAME), "rb") as f:
+                extras = loads(f.read())
+            bench_res.hmaps = extras["hmaps"]
+            bench_res.dataset_list = extras["dataset_list"]
+        return bench_res
+
+    def delete(self, key: Any) -> bool:
+        """Delete the result of a key.  The versions that loaded results still refer to are deleted by a later save or delete of the key once they are no longer used
+
+        Returns:
+            bool: true if there was a result to delete
+        """
+        result_dir = self.result_dir(key)
+        try:
+            os.remove(os.path.join(result_dir, CURRENT_NAME))
+        except FileNotFoundError:
+            return False
+        self.prune(key)
+        try:
+            os.rmdir(result_dir)
+        except OSError:
+            pass  # there are versions that are still used
+        return True
+
+
+def load_bench_result(key: Any, cache, store: ResultStore) -> Optional[Any]:
+    """Load a BenchResult from the result store, or from the benchmark cache where older versions of bencher pickled the whole result
+
+    Args:
+        key (Any): the hash of the benchmark configuration
+        cache (Cache): the benchmark cache
+        store (ResultStore): the result store
+
+    Returns:
+        Optional[BenchResult]: the result or None if it has not been saved
+    """
+    bench_res = store.load(key)
+    if bench_res is None and key in cache:
+        logging.info(f"loading pickled results from key: {key}")
+        bench_res = cache[key]
+    return bench_res
@@ -1,5 +1,5 @@
 import logging
-from typing import List, Any, Tuple, Optional
+from typing import Callable, List, Any, Tuple, Optional
 from enum import Enum, auto
 import xarray as xr
 from param import Parameter
@@ -38,6 +38,35 @@ class ReduceType(Enum):
     NONE = auto()  # don't reduce
 
 
+def reduce_blockwise(
+    dataset: xr.Dataset,
+    reduce: Callable[[xr.Dataset], xr.Dataset],
+    dim: str = "repeat",
+    block_bytes: int = 64 * 2**20,
+) -> xr.Dataset:
+    """Reduce a dataset over a dimension in blocks along its largest other dimension, so that only one block of a dataset that is memory mapped from disk is read into memory at a time
+
+    Args:
+        dataset (xr.Dataset): the dataset to reduce
+        reduce (Callable[[xr.Dataset], xr.Dataset]): the reduction of a block over dim
+        dim (str, optional): the dimension that is reduced. Defaults to "repeat".
+        block_bytes (int, optional): the approximate size of a block. Defaults to 64MiB.
+
+    Returns:
+        xr.Dataset: the reduced dataset
+    """
+    dims = [d for d in dataset.dims if d != dim]
+    if len(dims) == 0:
+        return reduce(dataset)
+    block_dim = max(dims, key=lambda d: dataset.sizes[d])
+    size = dataset.sizes[block_dim]
+    step = max(1, block_bytes // max(1, dataset.nbytes // size))
+    if step >= size:
+        return reduce(dataset)
+    blocks = [reduce(dataset.isel({block_dim: slice(i, i + step)})) for i in range(0, size, step)]
+    return xr.concat(blocks, dim=block_dim, data_vars="minimal", coords="minimal")
+
+
 class EmptyContainer:
     """A wrapper for list like containers that only appends if the item is not None"""
 
@@ -94,7 +123,14 @@ class BenchResultBase(OptunaResult):
         if reduce == ReduceType.AUTO:
             reduce = ReduceType.REDUCE if self.bench_cfg.repeats > 1 else ReduceType.SQUEEZE
 
+        # a shallow copy, the data of the variables is not copied
         ds_out = self.ds.copy()
+        if self.bench_cfg.out_of_core:
+            reducer = reduce_blockwise
+        else:
+
+            def reducer(dataset: xr.Dataset, reduce: Callable) -> xr.Dataset:
+                return reduce(dataset)
 
         if result_var is not None:
             ds_out = ds_out[result_var.name].to_dataset(name=result_var.name)
@@ -107,8 +143,8 @@ class BenchResultBase(OptunaResult):
 
         match reduce:
             case ReduceType.REDUCE:
-                ds_reduce_mean = ds_out.mean(dim="repeat", keep_attrs=True)
-                ds_reduce_std = ds_out.std(dim="repeat", keep_attrs=False)
+                ds_reduce_mean = reducer(ds_out, lambda d: d.mean(dim="repeat", keep_attrs=True))
+                ds_reduce_std = reducer(ds_out, lambda d: d.std(dim="repeat", keep_attrs=False))
                 ds_reduce_std = rename_ds(ds_reduce_std, "std")
                 ds_out = xr.merge([ds_reduce_mean, ds_reduce_std])
                 ds_out = xr.merge(
@@ -118,9 +154,9 @@ class BenchResultBase(OptunaResult):
                     ]
                 )
             case ReduceType.MINMAX:  # TODO, need to pass mean, center of minmax, and minmax
-                ds_reduce_mean = ds_out.mean(dim="repeat", keep_attrs=True)
-                ds_reduce_min = ds_out.min(dim="repeat")
-                ds_reduce_max = ds_out.max(dim="repeat")
+                ds_reduce_mean = reducer(ds_out, lambda d: d.mean(dim="repeat", keep_attrs=True))
+                ds_reduce_min = reducer(ds_out, lambda d: d.min(dim="repeat"))
+                ds_reduce_max = reducer(ds_out, lambda d: d.max(dim="repeat"))
                 ds_reduce_range = rename_ds(ds_reduce_max - ds_reduce_min, "range")
                 ds_out = xr.merge([ds_reduce_mean, ds_reduce_range])
             case ReduceType.SQUEEZE:
@@ -1,17 +1,21 @@
 from collections import namedtuple
 import xarray as xr
 import hashlib
+import struct
+from enum import Enum
 import re
 import math
 from colorsys import hsv_to_rgb
 from pathlib import Path
 from uuid import uuid4
 from functools import partial
-from typing import Callable, Any, List, Tuple
+from typing import Callable, Any, Iterable, Iterator, List, Optional, Tuple
+from itertools import islice
 import logging
 import os
 import tempfile
 import shutil
+import types
 
 import param
 import numpy as np
@@ -75,6 +79,212 @@ def hash_sha1(var: any) -> str:
     return hashlib.sha1(str(var).encode("ASCII")).hexdigest()
 
 
+def _canonical_float(var: float, out: bytearray) -> None:
+    out += b"f"
+    out += _pack_float(var)
+
+
+def _canonical_int(var: int, out: bytearray) -> None:
+    out += b"i"
+    out += str(var).encode()
+    out += b";"
+
+
+def _canonical_str(var: str, out: bytearray) -> None:
+    data = var.encode("utf-8")
+    out += b"s"
+    out += _pack_len(len(data))
+    out += data
+
+
+def _canonical_sequence(tag: bytes) -> Callable:
+    def write(var, out: bytearray) -> None:
+        out += tag
+        out += _pack_len(len(var))
+        for v in var:
+            _write_canonical(v, out)
+
+    return write
+
+
+def _canonical_dict(var: dict, out: bytearray) -> None:
+    out += b"d"
+    out += _pack_len(len(var))
+    # the order the items were added does not change the hash
+    for k, v in sorted((canonical_bytes(k), v) for k, v in var.items()):
+        out += k
+        _write_canonical(v, out)
+
+
+# writers for the exact types that are most common in sweeps, so they are found without isinstance checks
+_canonical_writers = {
+    float: _canonical_float,
+    int: _canonical_int,
+    str: _canonical_str,
+    tuple: _canonical_sequence(b"t"),
+    list: _canonical_sequence(b"l"),
+    dict: _canonical_dict,
+}
+_pack_float = struct.Struct("<d").pack
+_pack_len = struct.Struct("<Q").pack
+
+
+def _write_canonical(var: Any, out: bytearray) -> None:
+    writer = _canonical_writers.get(type(var))
+    if writer is not None:
+        writer(var, out)
+    elif var is None:
+        out += b"N"
+    elif isinstance(var, (bool, np.bool_)):
+        out += b"T" if var else b"F"
+    elif isinstance(var, Enum):
+        out += b"e"
+        _canonical_str(type(var).__qualname__, out)
+        _write_canonical(var.value, out)
+    elif isinstance(var, (float, np.floating)):
+        _canonical_float(float(var), out)
+    elif isinstance(var, (int, np.integer)):
+        _canonical_int(int(var), out)
+    elif isinstance(var, str):
+        _canonical_str(str(var), out)
+    elif isinstance(var, bytes):
+        out += b"b"
+        out += _pack_len(len(var))
+        out += var
+    elif isinstance(var, np.ndarray):
+        out += b"a"
+        _canonical_str(var.dtype.str, out)
+        _canonical_sequence(b"t")(var.shape, out)
+        out += np.ascontiguousarray(var).tobytes()
+    elif isinstance(var, (tuple, list)):
+        _canonical_sequence(b"t" if isinstance(var, tuple) else b"l")(var, out)
+    elif isinstance(var, dict):
+        _canonical_dict(var, out)
+    else:
+        # other types fall back to their string representation
+        out += b"r"
+        _canonical_str(type(var).__qualname__, out)
+        _canonical_str(str(var), out)
+
+
+def canonical_bytes(var: Any) -> bytes:
+    """Serialise a value to bytes that only depend on the value and not on how it is formatted as a string, so that for example python and numpy floats with the same value have the same representation.  Supports None, bools, ints, floats, strings, bytes, enums, numpy arrays and tuples, lists and dicts of them.  Other types are represented by their type name and str()
+
+    Args:
+        var (Any): the value to serialise
+
+    Returns:
+        bytes: the canonical representation of the value
+    """
+    out = bytearray()
+    _write_canonical(var, out)
+    return bytes(out)
+
+
+def hash_canonical(var: Any) -> str:
+    """A fast hash of the canonical binary representation of a value that is the same each time the program is run.  Used for the keys of the samples of a sweep, which are hashed once per sample
+
+    Args:
+        var (Any): the value to hash
+
+    Returns:
+        str: a 32 character hex digest
+    """
+    return hashlib.blake2b(canonical_bytes(var), digest_size=16).hexdigest()
+
+
+class _Unhashable(Exception):
+    pass
+
+
+# types whose values are represented exactly by canonical_bytes
+_stable_types = (type(None), bool, int, float, complex, str, bytes, np.generic, np.ndarray, Enum)
+
+
+def _code_state(code: types.CodeType) -> tuple:
+    consts = tuple(_code_state(c) if isinstance(c, types.CodeType) else c for c in code.co_consts)
+    return (code.co_code, consts, code.co_names)
+
+
+def _global_names(code: types.CodeType) -> set:
+    names = set(code.co_names)
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            names |= _global_names(c)
+    return names
+
+
+def _value_state(value: Any, seen: set) -> Any:
+    if isinstance(value, _stable_types):
+        return value
+    if isinstance(value, (tuple, list)):
+        return type(value)(_value_state(v, seen) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return ("set", sorted((canonical_bytes(_value_state(v, seen)) for v in value)))
+    if isinstance(value, dict):
+        return {k: _value_state(v, seen) for k, v in value.items()}
+    if isinstance(value, (types.ModuleType, type)):
+        # modules and classes are identified by name
+        return (
+            "global",
+            getattr(value, "__module__", None),
+            value.__name__,
+            value.__qualname__ if isinstance(value, type) else None,
+        )
+    if callable(value):
+        return _callable_state(value, seen)
+    raise _Unhashable(f"{type(value).__qualname__} has no stable representation")
+
+
+def _callable_state(fn: Callable, seen: set) -> Any:
+    if isinstance(fn, partial):
+        return (
+            "partial",
+            _callable_state(fn.func, seen),
+            _value_state(fn.args, seen),
+            _value_state(fn.keywords, seen),
+        )
+    if isinstance(fn, types.BuiltinFunctionType):
+        return ("builtin", getattr(fn, "__module__", None), fn.__qualname__)
+    if not isinstance(fn, types.FunctionType):
+        raise _Unhashable(f"{type(fn).__qualname__} is not a function")
+    if id(fn) in seen:
+        return ("recursive", fn.__qualname__)
+    seen.add(id(fn))
+    code = fn.__code__
+    closure = tuple(_value_state(c.cell_contents, seen) for c in fn.__closure__ or ())
+    referenced = {
+        name: _value_state(fn.__globals__[name], seen)
+        for name in sorted(_global_names(code))
+        if name in fn.__globals__
+    }
+    return (
+        "function",
+        fn.__qualname__,
+        _code_state(code),
+        _value_state(fn.__defaults__, seen),
+        _value_state(fn.__kwdefaults__, seen),
+        closure,
+        referenced,
+    )
+
+
+def hash_callable(fn: Callable) -> Optional[str]:
+    """A hash of the behaviour of a function that is the same each time the program is run.  The hash covers the bytecode, constants and names of the function, its default arguments, the values of its closure cells and the values of the globals it refers to, so changing a threshold in a lambda changes the hash.  Functions that refer to values without a stable representation, such as arbitrary objects, can not be hashed reliably
+
+    Args:
+        fn (Callable): a function, lambda, builtin or functools.partial
+
+    Returns:
+        Optional[str]: the hash, or None if the function can not be hashed reliably
+    """
+    try:
+        return hash_canonical(_callable_state(fn, set()))
+    except (_Unhashable, AttributeError, ValueError) as e:
+        logging.debug(f"can not hash {fn}: {e}")
+        return None
+
+
 def capitalise_words(message: str):
     """Given a string of lowercase words, capitalise them
 
@@ -163,6 +373,18 @@ def gen_path(filename, folder="generic", suffix=".dat"):
     return f"{path.absolute().as_posix()}/{filename}_{uuid4()}{suffix}"
 
 
+_GENERATED_NAME = re.compile(
+    r"(?P<name>.+)_[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}.*"
+)
+
+
+def is_generated_path(path: str) -> bool:
+    """Returns true if a path has the form of the paths from gen_path, a unique file name in a folder named after the file"""
+    path = Path(path)
+    match = _GENERATED_NAME.fullmatch(path.name)
+    return match is not None and match["name"] == path.parent.name
+
+
 def gen_video_path(video_name: str = "vid", extension: str = ".mp4") -> str:
     return gen_path(video_name, "vid", extension)
 
@@ -195,6 +417,13 @@ def listify(obj) -> list:
     return [obj]
 
 
+def chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
 def get_name(var):
     if isinstance(var, param.Parameter):
         return var.name
@@ -4,6 +4,7 @@ from param import Parameter, Parameterized
 import holoviews as hv
 import panel as pn
 from copy import deepcopy
+import numpy as np
 
 from bencher.utils import make_namedtuple, hash_sha1
 from bencher.variables.results import ALL_RESULT_TYPES, ResultHmap
@@ -89,7 +90,11 @@ class ParametrizedSweep(Parameterized):
     def get_results_values_as_dict(self, holomap=None) -> dict:
         """Get a dictionary of result variables with the name and the current value"""
         values = self.param.values()
-        output = {key: values[key] for key in self.get_input_and_results().results}
+        output = {
+            key: values[key]
+            for key, v in type(self).param.objects().items()
+            if isinstance(v, ALL_RESULT_TYPES)
+        }
         if holomap is not None:
             output |= {"hmap": holomap}
         return output
@@ -200,6 +205,29 @@ class ParametrizedSweep(Parameterized):
         """
         return self.get_results_values_as_dict()
 
+    def setup(self) -> None:
+        """Override this function to load expensive state such as models or datasets that is needed to evaluate samples.  It is called once in each process or thread that evaluates samples of this worker before the first sample, instead of once per sample in __call__.  Threads that evaluate samples at the same time each set up their own copy of the worker, so state set up here is reused for every sample that the process or thread evaluates"""
+
+    def teardown(self) -> None:
+        """Override this function to release any state loaded in setup().  It is called for each copy of the worker that was set up, when a worker process exits, or at the end of the sweep for workers evaluated in the main process"""
+
+    def call_batch(self, **kwargs) -> dict:
+        """Evaluate many samples of the sweep in a single call.  Override this function to opt in to batched evaluation, which is much faster than calling __call__ once per sample for cheap vectorised workers.  Each keyword argument is a numpy array with one entry per sample. Constant inputs are passed as arrays of the same length.  The default implementation calls __call__ once per sample, and bencher only uses batched evaluation for classes that override it
+
+        Returns:
+            dict: a dictionary of result variable names to arrays with one entry per sample.  ResultVec values should have the shape (samples, vec_size)
+        """
+        samples = len(next(iter(kwargs.values()))) if kwargs else 0
+        results = [self.__call__(**{k: v[i] for k, v in kwargs.items()}) for i in range(samples)]
+        if not results:
+            return {}
+        return {k: np.array([r[k] for r in results]) for k in results[0]}
+
+    @classmethod
+    def has_batch_call(cls) -> bool:
+        """Returns true if this class overrides call_batch and can evaluate samples in batches"""
+        return cls.call_batch is not ParametrizedSweep.call_batch
+
     def plot_hmap(self, **kwargs):
         return self.__call__(**kwargs)["hmap"]
 
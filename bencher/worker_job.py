@@ -1,9 +1,53 @@
-from typing import List, Tuple, Any
+from typing import List, Tuple, Any, Iterable
 from dataclasses import dataclass, field
-from .utils import hash_sha1
+import hashlib
+from .utils import hash_sha1, hash_canonical, canonical_bytes
 from bencher.utils import hmap_canonical_input
 
 
+class SampleKeyEncoder:
+    """Computes the same keys as hash_canonical((sorted(function_input.items()), tag)) for the samples of a sweep, without serialising every input of every sample.  The canonical bytes of each (name, value) input are computed the first time the value is seen and are joined for each sample, so for large sweeps the cost of a key is a join and a single blake2b digest"""
+
+    def __init__(
+        self,
+        dims_name: List[str],
+        constant_inputs: dict,
+        tag: str,
+        exclude: Iterable[str] = (),
+    ) -> None:
+        constant_inputs = constant_inputs or {}
+        names = {n: d for d, n in enumerate(dims_name) if n not in constant_inputs}
+        names |= {n: None for n in constant_inputs}
+        names = {n: d for n, d in names.items() if n not in exclude}
+
+        # each part of the key is either the bytes of a constant input or the dimension and the cache of the bytes of its values
+        self.parts = []
+        for name in sorted(names):
+            d = names[name]
+            if d is None:
+                self.parts.append(canonical_bytes((name, constant_inputs[name])))
+            else:
+                self.parts.append((d, name, {}))
+        # the headers of canonical_bytes for a tuple of 2 items that starts with a list of the inputs
+        self.prefix = b"t" + (2).to_bytes(8, "little") + b"l" + len(names).to_bytes(8, "little")
+        self.suffix = canonical_bytes(tag)
+
+    def key(self, index_tuple: Tuple[int], function_input_vars: List) -> str:
+        parts = [self.prefix]
+        for part in self.parts:
+            if part.__class__ is bytes:
+                parts.append(part)
+            else:
+                d, name, encoded = part
+                i = index_tuple[d]
+                value = encoded.get(i)
+                if value is None:
+                    value = encoded[i] = canonical_bytes((name, function_input_vars[d]))
+                parts.append(value)
+        parts.append(self.suffix)
+        return hashlib.blake2b(b"".join(parts), digest_size=16).hexdigest()
+
+
 @dataclass
 class WorkerJob:
     function_input_vars: List
@@ -18,22 +62,65 @@ class WorkerJob:
     fn_inputs_sorted: List[str] = None
     function_input_signature_pure: str = None
     function_input_signature_benchmark_context: str = None
+    cost_key: str = None
     found_in_cache: bool = False
     msgs: List[str] = field(default_factory=list)
 
-    def setup_hashes(self) -> None:
+    def setup_hashes(self, key_encoder: SampleKeyEncoder = None, hmap_input: bool = True) -> None:
+        """Set up the inputs of the sample and the key it is cached under
+
+        Args:
+            key_encoder (SampleKeyEncoder, optional): computes the key from the encoded inputs shared by all the samples of the sweep. If None the key is computed from the inputs of this sample. Defaults to None.
+            hmap_input (bool, optional): set up the key of the sample in the holomaps of the results. Defaults to True.
+        """
         self.function_input = dict(zip(self.dims_name, self.function_input_vars))
 
-        self.canonical_input = hmap_canonical_input(self.function_input)
+        if hmap_input:
+            self.canonical_input = hmap_canonical_input(self.function_input)
 
         if self.constant_inputs is not None:
             self.function_input = self.function_input | self.constant_inputs
 
         # store a tuple of the inputs as keys for a holomap
         # the signature is the hash of the inputs to to the function + meta variables such as repeat and time + the hash of the benchmark sweep as a whole (without the repeats hash)
-        self.fn_inputs_sorted = sorted(self.function_input.items())
-        self.function_input_signature_pure = hash_sha1((self.fn_inputs_sorted, self.tag))
+        if key_encoder is None:
+            self.fn_inputs_sorted = sorted(self.function_input.items())
+            self.function_input_signature_pure = hash_canonical((self.fn_inputs_sorted, self.tag))
+        else:
+            self.function_input_signature_pure = key_encoder.key(
+                self.index_tuple, self.function_input_vars
+            )
+
+        self.function_input_signature_benchmark_context = hashlib.blake2b(
+            f"{self.function_input_signature_pure}:{self.bench_cfg_sample_hash}".encode(),
+            digest_size=16,
+        ).hexdigest()
 
-        self.function_input_signature_benchmark_context = hash_sha1(
-            (self.function_input_signature_pure, self.bench_cfg_sample_hash)
-        )
+    def setup_cost_key(self, key_encoder: SampleKeyEncoder = None) -> None:
+        """The expected cost of a sample is the same for every repeat and time snapshot, so the key the wall time of the sample is recorded under does not include them
+
+        Args:
+            key_encoder (SampleKeyEncoder, optional): an encoder that excludes repeat and over_time. Defaults to None.
+        """
+        if key_encoder is not None:
+            self.cost_key = key_encoder.key(self.index_tuple, self.function_input_vars)
+        else:
+            cost_inputs = [
+                i
+                for i in sorted(self.function_input.items())
+                if i[0] not in ("repeat", "over_time")
+            ]
+            self.cost_key = hash_canonical((cost_inputs, self.tag))
+
+    def legacy_signature(self) -> str:
+        """The sha1 key that versions of bencher before the canonical binary keys cached the sample under"""
+        return hash_sha1((sorted(self.function_input.items()), self.tag))
+
+
+@dataclass(slots=True)
+class InlineSample:
+    """A compact record of a sample that is evaluated inline without the sample cache, so none of the hashes of WorkerJob are needed"""
+
+    index_tuple: Tuple[int]
+    function_input: dict
+    canonical_input: Tuple[Any] = None
@@ -0,0 +1,292 @@
+"""A process local registry of the workers that evaluate samples of a sweep.  The worker and the static context of the sweep are sent to each process once instead of being pickled into every job, and the worker is set up the first time a process evaluates a sample for it so expensive state such as models or datasets is only loaded once per process instead of once per sample"""
+
+from __future__ import annotations
+from typing import Any, Callable, Tuple
+from copy import deepcopy
+import atexit
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from multiprocessing.util import Finalize
+from bencher.utils import hash_sha1
+
+# context key -> WorkerContext that has been set up in this process
+_contexts = {}
+# context key -> WorkerContext that has been registered by this process but not set up yet
+_registered = {}
+# context key -> number of samples that are being evaluated with the context in this process
+_in_use = {}
+# keys of the set up contexts that were sent to this process by another process, oldest first
+_received = []
+_lock = threading.Lock()
+_context_dir = None
+
+# worker processes and agents are reused by later sweeps that send them new contexts, so only the most recent contexts they received are kept set up
+MAX_RECEIVED_CONTEXTS = 1
+
+
+class WorkerContext:
+    """The worker and the parts of the sweep configuration that are needed to evaluate a sample.
+
+    Samples that are evaluated at the same time by the threads of Executors.THREADS, the connections of a remote agent or the coroutines of Executors.ASYNCIO each use their own copy of the worker, because workers usually store the inputs of a sample in the parameters of the instance.  The first copy is the worker itself, and the others are copied from the worker before it was set up.  Each copy is set up once and then reused by the thread that set it up, so setup() runs once per thread rather than once per sample
+    """
+
+    def __init__(self, worker: Any, pass_repeat: bool = False) -> None:
+        self.worker = worker
+        self.pass_repeat = pass_repeat
+        # the worker before it was set up, that the copies for other threads are made from
+        self.template = None
+        # every copy of the worker that has been set up, including the worker itself
+        self.copies = []
+        self.worker_free = True
+        # the copies that are set up and not in use, per thread
+        self.idle = threading.local()
+        self.copies_lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        return {"worker": self.worker, "pass_repeat": self.pass_repeat}
+
+    def __setstate__(self, state: dict) -> None:
+        # the copies and locks are not sent to other processes
+        self.__init__(state["worker"], state["pass_repeat"])  # pylint: disable=unnecessary-dunder-call
+
+    def setup(self) -> None:
+        try:
+            self.template = deepcopy(self.worker)
+        except (TypeError, pickle.PicklingError, AttributeError) as e:
+            logging.warning(
+                f"the worker can not be copied, so samples that run at the same time share it: {e}"
+            )
+        self.copies = [self.worker]
+        self._setup_worker(self.worker)
+
+    @staticmethod
+    def _setup_worker(worker: Any) -> None:
+        if hasattr(worker, "setup"):
+            worker.setup()
+
+    def teardown(self) -> None:
+        with self.copies_lock:
+            copies, self.copies = self.copies, []
+        for worker in copies:
+            if hasattr(worker, "teardown"):
+                worker.teardown()
+
+    def acquire(self) -> Any:
+        """Get a set up copy of the worker that no other sample is using.  The copy should be passed to release() when the sample is evaluated"""
+        idle = getattr(self.idle, "workers", None)
+        if idle:
+            return idle.pop()
+        with self.copies_lock:
+            if self.worker_free:
+                self.worker_free = False
+                return self.worker
+            if self.template is None:
+                return self.worker
+            worker = deepcopy(self.template)
+            self.copies.append(worker)
+        self._setup_worker(worker)
+        return worker
+
+    def release(self, worker: Any) -> None:
+        """Return a copy of the worker from acquire() so the next sample evaluated by this thread reuses it"""
+        if not hasattr(self.idle, "workers"):
+            self.idle.workers = []
+        self.idle.workers.append(worker)
+
+    def __call__(self, worker: Any = None, /, **kwargs) -> Any:
+        function_input_deep = deepcopy(kwargs)
+        if not self.pass_repeat:
+            function_input_deep.pop("repeat", None)
+        function_input_deep.pop("over_time", None)
+        function_input_deep.pop("time_event", None)
+        if worker is None:
+            worker = self.worker
+        return worker(**function_input_deep)
+
+
+def worker_key(worker: Any) -> str:
+    """A key that identifies a worker instance in the process that created it. The key is the same in every process that the worker is sent to
+
+    Args:
+        worker (Any): a worker instance such as a ParametrizedSweep or a function
+
+    Returns:
+        str: a key that is unique to the worker instance
+    """
+    return f"{type(worker).__qualname__}:{getattr(worker, 'name', '')}:{id(worker)}:{os.getpid()}"
+
+
+def content_key(key: str, context: WorkerContext) -> Tuple[str, bytes]:
+    """Add a digest of the pickled context to a key.  Processes that set up a context keep it for the next sweep, so a worker instance that was changed between sweeps needs a new key to be sent to them again
+
+    Args:
+        key (str): the key of the worker instance
+        context (WorkerContext): the context of the sweep
+
+    Returns:
+        Tuple[str, bytes]: the key of the content of the context and the pickled context
+    """
+    data = pickle.dumps(context)
+    return f"{key}:{hashlib.sha1(data).hexdigest()}", data
+
+
+def register_context(key: str, context: WorkerContext) -> None:
+    """Make a context available to the serial, thread and asyncio executors running in this process.  The context is set up the first time a sample is evaluated"""
+    with _lock:
+        if key not in _contexts:
+            _registered[key] = context
+
+
+def publish_context(key: str, context: WorkerContext, data: bytes = None) -> str:
+    """Write a context to a file that worker processes load the first time they evaluate a sample for it, so that it is only sent once per process.  The file is only written once per key, so the key should include the digest of the context from content_key()
+
+    Args:
+        key (str): the key of the context
+        context (WorkerContext): the context to send to the worker processes
+        data (bytes, optional): the pickled context if it has already been pickled. Defaults to None.
+
+    Returns:
+        str: the path of the file that the context was written to
+    """
+    global _context_dir  # pylint: disable=global-statement
+    if _context_dir is None:
+        _context_dir = tempfile.mkdtemp(prefix="bencher_ctx_")
+        atexit.register(shutil.rmtree, _context_dir, ignore_errors=True)
+    path = os.path.join(_context_dir, f"{hash_sha1(key)}.pkl")
+    if not os.path.exists(path):
+        if data is None:
+            data = pickle.dumps(context)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _setup_context(
+    key: str, context_path: str, context: WorkerContext
+) -> Tuple[WorkerContext, list]:
+    """Set up a context that has not been set up in this process yet.  Must be called with _lock held
+
+    Returns:
+        Tuple[WorkerContext, list]: the set up context, and the (key, context) pairs of the idle received contexts that were evicted to make room for it and need to be torn down
+    """
+    if key in _contexts:
+        return _contexts[key], []
+    received = key not in _registered
+    if context is None:
+        context = _registered.pop(key, None)
+    if context is None:
+        with open(context_path, "rb") as f:
+            context = pickle.load(f)
+    logging.info(f"setting up worker {key} in process {os.getpid()}")
+    context.setup()
+    _contexts[key] = context
+
+    evicted = []
+    if received:
+        _received.append(key)
+        for old_key in list(_received):
+            if len(_received) <= MAX_RECEIVED_CONTEXTS:
+                break
+            if old_key != key and not _in_use.get(old_key):
+                _received.remove(old_key)
+                evicted.append((old_key, _contexts.pop(old_key)))
+    return context, evicted
+
+
+def _teardown(contexts: list) -> None:
+    for key, context in contexts:
+        logging.info(f"tearing down worker {key} in process {os.getpid()}")
+        context.teardown()
+
+
+def get_context(key: str, context_path: str = None, context: WorkerContext = None) -> WorkerContext:
+    """Get a context that has been set up in this process.  If the context has not been seen by this process yet, it is taken from the passed context, the registered contexts or loaded from context_path and then set up.  Setting up a context that was sent by another process tears down the older received contexts that are not in use
+
+    Args:
+        key (str): the key of the context
+        context_path (str, optional): the file the context was published to. Defaults to None.
+        context (WorkerContext, optional): the context if it was sent with the job. Defaults to None.
+
+    Returns:
+        WorkerContext: the set up context
+    """
+    ctx = _contexts.get(key)
+    if ctx is not None:
+        return ctx
+    with _lock:
+        ctx, evicted = _setup_context(key, context_path, context)
+    _teardown(evicted)
+    return ctx
+
+
+def run_in_context(key: str, context_path: str, context: WorkerContext, /, **kwargs) -> Any:
+    """Evaluate a sample with the set up context for key, using a copy of the worker that no other sample is using at the same time. The arguments before kwargs are positional only so they cannot clash with the names of the sweep inputs.  If the worker is async the coroutine it returns is wrapped so the copy is released when the coroutine completes"""
+    with _lock:
+        ctx = _contexts.get(key)
+        evicted = []
+        if ctx is None:
+            ctx, evicted = _setup_context(key, context_path, context)
+        _in_use[key] = _in_use.get(key, 0) + 1
+    _teardown(evicted)
+
+    worker = None
+
+    def done() -> None:
+        if worker is not None:
+            ctx.release(worker)
+        with _lock:
+            _in_use[key] -= 1
+            if _in_use[key] == 0:
+                del _in_use[key]
+
+    try:
+        worker = ctx.acquire()
+        result = ctx(worker, **kwargs)
+    except BaseException:
+        done()
+        raise
+    if inspect.iscoroutine(result):
+        return _release_when_done(result, done)
+    done()
+    return result
+
+
+async def _release_when_done(coroutine, done: Callable[[], None]) -> Any:
+    try:
+        return await coroutine
+    finally:
+        done()
+
+
+def release_context(key: str) -> None:
+    """Tear down a context if it was set up in this process and remove it from the registry"""
+    with _lock:
+        context = _contexts.pop(key, None)
+        _registered.pop(key, None)
+        if key in _received:
+            _received.remove(key)
+    if context is not None:
+        _teardown([(key, context)])
+
+
+def release_all_contexts() -> None:
+    for key in list(_contexts):
+        release_context(key)
+
+
+def init_worker_process() -> None:
+    """Executor initializer for worker processes. The contexts that were set up by the process are torn down when it exits.  Processes that are forked start without the contexts of the parent process, so every context of the process is a received context"""
+    with _lock:
+        _contexts.clear()
+        _registered.clear()
+        _received.clear()
+        _in_use.clear()
+    Finalize(None, release_all_contexts, exitpriority=10)
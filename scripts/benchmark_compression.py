@@ -0,0 +1,75 @@
+"""Measure the compression ratio and throughput of the cache codecs on the kinds of values bencher caches: a single sample result, a BenchResult of a sweep and the dataset of a sweep.
+
+Run with: python scripts/benchmark_compression.py
+"""
+
+import logging
+import pickle
+import time
+
+import numpy as np
+
+import bencher as bch
+from bencher.compression import CODECS, compress, decompress
+
+
+class NoisyWorker(bch.ParametrizedSweep):
+    x = bch.FloatSweep(default=0, bounds=[0, 1], doc="first input")
+    y = bch.FloatSweep(default=0, bounds=[0, 1], doc="second input")
+
+    out = bch.ResultVar(doc="a smooth function of the inputs")
+    noise = bch.ResultVar(doc="random noise")
+
+    def __call__(self, **kwargs):
+        self.update_params_from_kwargs(**kwargs)
+        self.out = np.sin(self.x * 3) * np.cos(self.y * 2)
+        self.noise = np.random.normal()
+        return super().__call__()
+
+
+def payloads() -> dict:
+    run_cfg = bch.BenchRunCfg(auto_plot=False, repeats=5)
+    bench = NoisyWorker().to_bench(run_cfg)
+    res = bench.plot_sweep(
+        "compression",
+        input_vars=[NoisyWorker.param.x.with_samples(40), NoisyWorker.param.y.with_samples(40)],
+        plot_callbacks=False,
+    )
+    res.object_index = []
+    return {
+        "sample": {"out": 0.5, "noise": 0.1},
+        "BenchResult": res,
+        "dataset": res.ds,
+        "float array": {"out": np.random.normal(size=(200, 200))},
+    }
+
+
+def measure(data: bytes, codec: str, repeats: int = 5):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        compressed = compress(data, codec)
+    compress_time = (time.perf_counter() - start) / repeats
+    start = time.perf_counter()
+    for _ in range(repeats):
+        decompress(compressed)
+    decompress_time = (time.perf_counter() - start) / repeats
+    return len(data) / len(compressed), compress_time, decompress_time
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    codecs = ["none", "zlib:1", "zlib:6", "lzma:0", "lzma:6", "zstd:1", "zstd:3", "zstd:9", "lz4:0"]
+    codecs = [c for c in codecs if CODECS[c.partition(":")[0]][4]]
+    for name, value in payloads().items():
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"{name}: {len(data) / 1000:.1f}kB pickled")
+        for codec in codecs:
+            ratio, compress_time, decompress_time = measure(data, codec)
+            mb = len(data) / 1e6
+            print(
+                f"  {codec:8} ratio {ratio:5.2f}  compress {mb / compress_time:8.1f}MB/s  decompress {mb / decompress_time:8.1f}MB/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Measure the number of samples per second bencher can evaluate for a worker that does almost no work, with and without inline sample evaluation.
+
+Run with: python scripts/benchmark_sample_overhead.py
+"""
+
+import logging
+import time
+
+import bencher as bch
+
+
+class CheapWorker(bch.ParametrizedSweep):
+    x = bch.IntSweep(default=0, bounds=[0, 99], doc="first input")
+    y = bch.IntSweep(default=0, bounds=[0, 99], doc="second input")
+
+    out = bch.ResultVar(doc="sum of the inputs")
+
+    def __call__(self, **kwargs):
+        self.update_params_from_kwargs(**kwargs)
+        self.out = self.x + self.y
+        return super().__call__()
+
+
+def samples_per_second(inline_samples: bool, samples: int = 100) -> float:
+    run_cfg = bch.BenchRunCfg(auto_plot=False, inline_samples=inline_samples)
+    bench = CheapWorker().to_bench(run_cfg)
+    start = time.perf_counter()
+    bench.plot_sweep(
+        "sample_overhead",
+        input_vars=[
+            CheapWorker.param.x.with_samples(samples),
+            CheapWorker.param.y.with_samples(samples),
+        ],
+        result_vars=["out"],
+        plot_callbacks=False,
+    )
+    return samples * samples / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    for inline in [False, True]:
+        print(f"inline_samples={inline}: {samples_per_second(inline):.0f} samples/s")
@@ -33,6 +33,7 @@ from bencher.example.example_video import example_video
 from bencher.example.example_filepath import example_filepath
 from bencher.example.meta.example_meta import example_meta
 from bencher.example.example_docs import example_docs
+from bencher.example.example_batch import example_batch
 
 import os
 
@@ -155,6 +156,9 @@ class TestBenchExamples(unittest.TestCase):
     def test_example_meta(self) -> None:
         self.examples_asserts(example_meta(self.create_run_cfg()))
 
+    def test_example_batch(self) -> None:
+        self.examples_asserts(example_batch(self.create_run_cfg()))
+
     # def test_example_meta_scatter(self) -> None:
     # self.examples_asserts(example_meta_scatter(self.create_run_cfg()))
 
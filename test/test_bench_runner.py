@@ -2,9 +2,22 @@
 import unittest
 from unittest.mock import Mock
 from bencher.example.benchmark_data import SimpleBenchClass, SimpleBenchClassFloat
+import os
+import numpy as np
 import bencher as bch
 
 
+class WorkerPid(bch.ParametrizedSweep):
+    var1 = bch.IntSweep(default=0, bounds=[0, 3])
+
+    pid = bch.ResultVar(doc="The id of the process that computed the sample")
+
+    def __call__(self, **kwargs) -> dict:
+        self.update_params_from_kwargs(**kwargs)
+        self.pid = os.getpid()
+        return super().__call__()
+
+
 class TestBenchRunner(unittest.TestCase):
     # Tests that bch.BenchRunner can be created with default configuration and the import statement in the bch.BenchRunner class is fixed
     def test_benchrunner_default_configuration_fixed(self):
@@ -194,3 +207,42 @@ class TestBenchRunner(unittest.TestCase):
     #     self.assertEqual(results[0].bench_cfg.run_tag, "1")
 
     # Tests that bch.BenchRunner can handle empty list of Benchable functions
+
+    def test_benchrunner_reuses_worker_processes(self):
+        run_cfg = bch.BenchRunCfg(executor=bch.Executors.MULTIPROCESSING, auto_plot=False)
+        bench_runner = bch.BenchRunner("bench_runner_pool", run_cfg=run_cfg)
+        bench_runner.add_bench(WorkerPid())
+
+        results = bench_runner.run(min_level=2, max_level=3, cache_results=False)
+        executor = bench_runner.executor_pool.executors[(bch.Executors.MULTIPROCESSING, None, None)]
+
+        pids = [set(np.unique(r.ds["pid"].values)) for r in results]
+        # the second level should be computed by the processes spawned for the first level
+        all_pids = set(executor._processes.keys())  # pylint: disable=protected-access
+        for p in pids:
+            self.assertTrue(p.issubset(all_pids))
+
+        # the pool is still alive after run() so the next run reuses it
+        bench_runner.run(level=2, cache_results=False)
+        self.assertIs(
+            executor,
+            bench_runner.executor_pool.executors[(bch.Executors.MULTIPROCESSING, None, None)],
+        )
+
+        bench_runner.shutdown()
+        self.assertEqual(bench_runner.executor_pool.executors, {})
+
+    def test_bench_uses_active_pool(self):
+        with bch.ExecutorPool() as pool:
+            with pool.activate():
+                bench = WorkerPid().to_bench(
+                    bch.BenchRunCfg(executor=bch.Executors.MULTIPROCESSING, auto_plot=False)
+                )
+                res1 = bench.plot_sweep(plot_callbacks=False)
+                res2 = bench.plot_sweep(plot_callbacks=False)
+            self.assertIsNone(bch.ExecutorPool.active)
+            executor = pool.executors[(bch.Executors.MULTIPROCESSING, None, None)]
+            all_pids = set(executor._processes.keys())  # pylint: disable=protected-access
+            for res in [res1, res2]:
+                self.assertTrue(set(np.unique(res.ds["pid"].values)).issubset(all_pids))
+        self.assertEqual(pool.executors, {})
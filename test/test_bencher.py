@@ -8,12 +8,15 @@ from copy import deepcopy
 import logging
 
 from hypothesis import given, settings, strategies as st
+import numpy as np
 
 from datetime import datetime
 from diskcache import Cache
 
 from bencher.example.benchmark_data import ExampleBenchCfgIn, ExampleBenchCfgOut, bench_function
-from bencher import Bench, BenchCfg, BenchRunCfg
+from bencher.example.example_batch import BatchedWave
+from bencher import Bench, BenchCfg, BenchRunCfg, ParametrizedSweep
+import xarray as xr
 
 
 def get_hash_isolated_process() -> bytes:
@@ -381,3 +384,70 @@ class TestBencher(unittest.TestCase):
                 result_vars=[ExampleBenchCfgOut.param.out_sin],
                 const_vars=[(ExampleBenchCfgIn.offset, 0.1)],  # forgot to use param here
             )
+
+    @settings(deadline=10000, max_examples=5)
+    @given(batch_size=st.integers(min_value=1, max_value=20), repeats=st.integers(1, 2))
+    def test_batch_call_matches_per_sample_call(self, batch_size, repeats) -> None:
+        """check that evaluating a sweep with call_batch gives the same dataset as calling the worker once per sample"""
+
+        class PerSampleWave(BatchedWave):
+            call_batch = ParametrizedSweep.call_batch
+
+        self.assertTrue(BatchedWave.has_batch_call())
+        self.assertFalse(PerSampleWave.has_batch_call())
+
+        run_cfg = BenchRunCfg(repeats=repeats, auto_plot=False, batch_size=batch_size)
+        input_vars = [BatchedWave.param.theta.with_samples(5)]
+        const_vars = [(BatchedWave.param.offset, 0.1)]
+
+        datasets = []
+        for worker in [BatchedWave(), PerSampleWave()]:
+            bench = Bench("test_batch_call", worker)
+            res = bench.plot_sweep(
+                input_vars=input_vars,
+                const_vars=const_vars,
+                run_cfg=run_cfg,
+                plot_callbacks=False,
+            )
+            self.assertEqual(bench.sample_cache.worker_fn_call_count, 5 * repeats)
+            datasets.append(res.ds)
+
+        xr.testing.assert_allclose(datasets[0], datasets[1])
+
+    def test_default_batch_call(self) -> None:
+        """check that the default call_batch calls the worker once per sample"""
+        theta = np.linspace(0, np.pi, 4)
+        offset = np.full(4, 0.1)
+        expected = BatchedWave().call_batch(theta=theta, offset=offset)
+        results = ParametrizedSweep.call_batch(BatchedWave(), theta=theta, offset=offset)
+        for k, v in expected.items():
+            np.testing.assert_allclose(results[k], v)
+
+    @settings(deadline=10000, max_examples=5)
+    @given(repeats=st.integers(1, 3))
+    def test_inline_call_matches_job_call(self, repeats) -> None:
+        """check that evaluating serial uncached samples inline gives the same dataset as submitting them as jobs"""
+
+        class PerSampleWave(BatchedWave):
+            call_batch = ParametrizedSweep.call_batch
+
+        datasets = []
+        for inline_samples in [True, False]:
+            run_cfg = BenchRunCfg(
+                repeats=repeats,
+                auto_plot=False,
+                inline_samples=inline_samples,
+            )
+            bench = Bench("test_inline_call", PerSampleWave())
+            res = bench.plot_sweep(
+                input_vars=[PerSampleWave.param.theta.with_samples(5)],
+                const_vars=[(PerSampleWave.param.offset, 0.1)],
+                run_cfg=run_cfg,
+                plot_callbacks=False,
+            )
+            self.assertEqual(bench.use_inline_call(run_cfg), inline_samples)
+            self.assertEqual(bench.sample_cache.worker_wrapper_call_count, 5 * repeats)
+            self.assertEqual(bench.sample_cache.worker_fn_call_count, 5 * repeats)
+            datasets.append(res.ds)
+
+        xr.testing.assert_allclose(datasets[0], datasets[1])
@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import unittest
+from uuid import uuid4
+from hypothesis import given, settings, strategies as st
+import numpy as np
+import xarray as xr
+import bencher as bch
+from bencher.blob_store import BlobArray, BlobStore
+from bencher.job import FutureCache, Job
+
+
+def large_result(x: int) -> dict:
+    path = bch.gen_path("blob_test", "blob_test", ".txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("the same content for every job")
+    return {"array": np.full(1000, x % 2, dtype=np.float64), "file": path, "x": x}
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.blobs = BlobStore(f"{self.directory}/blobs", threshold=100, media_root=self.directory)
+
+    def tearDown(self) -> None:
+        self.blobs.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_file(self, name: str, content: str, generated: bool = True) -> str:
+        if generated:
+            stem, suffix = os.path.splitext(name)
+            os.makedirs(os.path.join(self.directory, stem), exist_ok=True)
+            path = os.path.join(self.directory, stem, f"{stem}_{uuid4()}{suffix}")
+        else:
+            path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def test_deduplicates(self):
+        a = self.blobs.externalise({"out": np.arange(100), "small": np.arange(3)})
+        b = self.blobs.externalise({"out": np.arange(100)})
+        self.assertIsInstance(a["out"], BlobArray)
+        self.assertIsInstance(a["small"], np.ndarray)
+        self.assertEqual(a["out"].path, b["out"].path)
+        np.testing.assert_array_equal(BlobStore.internalise(b)["out"], np.arange(100))
+
+        files = [self.write_file(f"img{i}.png", "image") for i in range(3)]
+        paths = {self.blobs.externalise({"img": f})["img"] for f in files}
+        self.assertEqual(len(paths), 1)
+        self.assertTrue(paths.pop().endswith(".png"))
+        self.assertFalse(any(os.path.exists(f) for f in files))
+
+    def test_only_generated_files_are_moved(self):
+        path = self.write_file("results.csv", "a file the user keeps", generated=False)
+        self.assertEqual(self.blobs.externalise({"file": path})["file"], path)
+        self.assertTrue(os.path.exists(path))
+
+    def test_file_referred_to_twice(self):
+        path = self.write_file("img.png", "image")
+        value = self.blobs.externalise({"img": path, "thumbnail": path})
+        self.assertEqual(value["img"], value["thumbnail"])
+        self.assertTrue(os.path.exists(value["img"]))
+        self.blobs.retain("cache", "a", value)
+        self.assertEqual(self.blobs.ref_count(value["img"]), 1)
+        self.assertEqual(self.blobs.release("cache", ["a"]), 1)
+        self.assertFalse(os.path.exists(value["img"]))
+
+    def test_retain_without_blobs(self):
+        self.blobs.retain("cache", "a", {"x": 1})
+        self.assertEqual(len(self.blobs.refs), 0)
+        value = self.blobs.externalise({"out": np.arange(100)})
+        self.blobs.retain("cache", "a", value)
+        # storing a value without blobs for an owner that had blobs releases them
+        self.blobs.retain("cache", "a", {"x": 1})
+        self.assertFalse(os.path.exists(value["out"].path))
+
+    def test_reference_counts(self):
+        value = self.blobs.externalise({"out": np.arange(100)})
+        path = value["out"].path
+        self.blobs.retain("cache", "a", value, tag="t1")
+        self.blobs.retain("cache", "b", value, tag="t2")
+        self.blobs.retain("cache", "b", value, tag="t2")
+        self.assertEqual(self.blobs.ref_count(path), 2)
+
+        self.assertEqual(self.blobs.release_tag("cache", "t1"), 0)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.blobs.release("cache", ["b"]), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.blobs.ref_count(path), 0)
+
+    def test_retag_and_namespaces(self):
+        value = self.blobs.externalise({"out": np.arange(100)})
+        path = value["out"].path
+        self.blobs.retain("cache", "a", value, tag="old")
+        # the owner is stored again with a new tag, so clearing the old tag keeps the blob
+        self.blobs.retain("cache", "a", value, tag="new")
+        self.blobs.retain("other", "a", value)
+        self.assertEqual(self.blobs.release_tag("cache", "old"), 0)
+        self.assertEqual(self.blobs.ref_count(path), 2)
+
+        self.assertEqual(self.blobs.release_namespace("cache"), 0)
+        self.assertEqual(self.blobs.release_namespace("other"), 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_references_in_dataset(self):
+        value = self.blobs.externalise({"img": self.write_file("img.png", "image")})
+        ds = xr.Dataset({"img": (["x"], np.array([value["img"], "other"], dtype=object))})
+        self.assertEqual(self.blobs.references(ds), {value["img"]})
+
+
+class TestSampleCacheBlobs(unittest.TestCase):
+    @settings(deadline=60000, max_examples=4)
+    @given(
+        backend=st.sampled_from(list(bch.CacheBackends)),
+        executor=st.sampled_from([bch.Executors.SERIAL, bch.Executors.MULTIPROCESSING]),
+    )
+    def test_sample_cache_blobs(self, backend, executor):
+        cache = FutureCache(
+            executor=executor,
+            overwrite=True,
+            cache_name="test_blob_cache",
+            backend=backend,
+            blob_threshold=1000,
+        )
+        cache.clear_cache()
+        results = [
+            cache.submit(Job(str(x), large_result, {"x": x}, job_key=f"k{x}", tag="t")).result()
+            for x in range(4)
+        ]
+        # identical arrays and files are stored once
+        self.assertEqual(len({r["file"] for r in results}), 1)
+        self.assertTrue(cache.blobs.is_blob(results[0]["file"]))
+        self.assertEqual(cache.blobs.ref_count(results[0]["file"]), 4)
+        for x, r in enumerate(results):
+            np.testing.assert_array_equal(r["array"], np.full(1000, x % 2))
+
+        cache.overwrite = False
+        cache.memory_cache = None
+        loaded = cache.submit(Job("1", large_result, {"x": 1}, job_key="k1", tag="t")).result()
+        self.assertEqual(cache.worker_fn_call_count, 4)
+        np.testing.assert_array_equal(loaded["array"], np.ones(1000))
+        self.assertEqual(loaded["file"], results[0]["file"])
+
+        cache.clear_tag("t")
+        self.assertFalse(os.path.exists(results[0]["file"]))
+        cache.close()
+
+    def test_off_by_default(self):
+        self.assertIsNone(bch.BenchRunCfg().blob_threshold)
+        cache = FutureCache(overwrite=True, cache_name="test_blob_default")
+        result = cache.submit(Job("0", large_result, {"x": 0}, job_key="k0")).result()
+        # the file stays where the worker wrote it and the array can be changed in place
+        self.assertIsNone(cache.blobs)
+        self.assertTrue(os.path.exists(result["file"]))
+        result["array"][0] = 2
+        cache.close()
@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from hypothesis import given, settings, strategies as st
+import numpy as np
+import bencher as bch
+from bencher.cache_backends import ReadOnlyCache, ShardedStore, open_read_only
+from bencher.compression import open_cache
+from bencher.job import FutureCache, Job
+from bencher.example.benchmark_data import SimpleBenchClassFloat
+
+
+def double(x):
+    return {"result": x * 2}
+
+
+def write_results(directory: str, worker: int) -> None:
+    store = ShardedStore(directory)
+    for i in range(20):
+        store.set(f"key{i}", {"worker": worker, "value": i}, tag=f"tag{i % 2}")
+
+
+class TestShardedStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.store = ShardedStore(self.directory)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_get_set(self):
+        self.assertNotIn("a", self.store)
+        self.assertEqual(self.store.get("a", default=1), 1)
+        self.assertEqual(self.store.get("a", tag=True), (None, None))
+        with self.assertRaises(KeyError):
+            self.store["a"]  # pylint: disable=pointless-statement
+
+        self.store.set("a", {"result": 1}, tag="t")
+        self.store["not/a safe:filename"] = 2
+        self.assertIn("a", self.store)
+        self.assertEqual(self.store["a"], {"result": 1})
+        self.assertEqual(self.store.get("a", tag=True), ({"result": 1}, "t"))
+        self.assertEqual(self.store["not/a safe:filename"], 2)
+        self.assertGreater(self.store.volume(), 0)
+
+        # a store opened on the same directory sees the results
+        self.assertEqual(ShardedStore(self.directory)["a"], {"result": 1})
+
+    def test_evict_and_clear(self):
+        for i in range(6):
+            self.store.set(i, i, tag=f"tag{i % 2}")
+        # results that are overwritten with a new tag are not evicted with the old tag
+        self.store.set(0, 0, tag="other")
+        self.assertEqual(self.store.evict("tag0"), 2)
+        self.assertEqual(
+            [i in self.store for i in range(6)], [True, True, False, True, False, True]
+        )
+        self.assertEqual(self.store.evict("missing"), 0)
+
+        self.assertEqual(self.store.clear(), 4)
+        self.assertFalse(any(i in self.store for i in range(6)))
+
+    def test_concurrent_writers(self):
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            list(executor.map(write_results, [self.directory] * 4, range(4)))
+        for i in range(20):
+            result, tag = self.store.get(f"key{i}", tag=True)
+            self.assertEqual(tag, f"tag{i % 2}")
+            self.assertEqual(result["value"], i)
+            self.assertIn(result["worker"], range(4))
+        self.assertFalse(
+            [f for _, _, files in os.walk(self.directory) for f in files if f.endswith(".tmp")]
+        )
+        self.assertEqual(self.store.evict("tag0"), 10)
+
+
+class TestCacheBackends(unittest.TestCase):
+    @settings(deadline=30000, max_examples=6)
+    @given(
+        backend=st.sampled_from(list(bch.CacheBackends)),
+        executor=st.sampled_from(
+            [bch.Executors.SERIAL, bch.Executors.THREADS, bch.Executors.MULTIPROCESSING]
+        ),
+    )
+    def test_sweep_cached_in_backend(self, backend, executor):
+        run_cfg = bch.BenchRunCfg(
+            executor=executor,
+            sample_cache_backend=backend,
+            cache_samples=True,
+            auto_plot=False,
+        )
+        bench = bch.Bench("test_cache_backends", SimpleBenchClassFloat(), run_cfg=run_cfg)
+        bench.plot_sweep(input_vars=["var1"], plot_callbacks=False)
+        self.assertEqual(
+            bench.sample_cache.workers_write_results(),
+            backend == bch.CacheBackends.SHARDED and executor != bch.Executors.SERIAL,
+        )
+
+        run_cfg.overwrite_sample_cache = False
+        run_cfg.memory_cache_entries = 0
+        bench.clear_call_counts()
+        res = bench.plot_sweep(input_vars=["var1"], plot_callbacks=False, run_cfg=run_cfg)
+        self.assertEqual(bench.sample_cache.worker_fn_call_count, 0)
+        self.assertEqual(bench.sample_cache.worker_cache_call_count, len(res.ds.coords["var1"]))
+        np.testing.assert_array_equal(
+            res.ds["result"].values.flatten(), res.ds.coords["var1"].values
+        )
+
+
+class TestSharedCaches(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.shared = os.path.join(self.directory, "shared")
+        self.sharded = os.path.join(self.directory, "sharded")
+        with open_cache(self.shared, "zlib") as cache:
+            cache.set("k0", {"result": "shared"}, tag="t")
+            cache.set(("not", "a", "string"), {"result": "tuple key"})
+        ShardedStore(self.sharded).set("k1", {"result": "sharded"}, tag="t")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_read_only_cache(self):
+        layer = open_read_only(self.shared)
+        self.assertIsInstance(layer, ReadOnlyCache)
+        self.assertEqual(layer.get("k0", tag=True), ({"result": "shared"}, "t"))
+        self.assertEqual(layer.get(("not", "a", "string")), {"result": "tuple key"})
+        self.assertNotIn("missing", layer)
+        self.assertEqual(layer.get("missing", default=1), 1)
+        layer.close()
+        self.assertIsInstance(open_read_only(self.sharded), ShardedStore)
+        with self.assertRaises(FileNotFoundError):
+            open_read_only(os.path.join(self.directory, "missing"))
+
+    def test_layers_fall_through(self):
+        cache = FutureCache(
+            overwrite=False,
+            cache_name="test_shared_layers",
+            read_only_caches=[
+                self.shared,
+                self.sharded,
+                os.path.join(self.directory, "missing"),
+            ],
+        )
+        cache.clear_cache()
+        self.assertEqual(len(cache.layers), 2)
+        results = [
+            cache.submit(Job(str(x), double, {"x": x}, job_key=f"k{x}", tag="t")).result()
+            for x in range(3)
+        ]
+        self.assertEqual([r["result"] for r in results], ["shared", "sharded", 4])
+        self.assertEqual(cache.shared_hit_count, 2)
+        self.assertEqual(cache.worker_fn_call_count, 1)
+        self.assertIn("shared hits: 2/3", cache.stats())
+
+        # new results are only written to the local cache
+        self.assertIn("k2", cache.cache)
+        self.assertNotIn("k0", cache.cache)
+        with open_cache(self.shared) as shared:
+            self.assertNotIn("k2", shared)
+
+        found = cache.probe([Job(str(x), double, {"x": x}, job_key=f"k{x}") for x in range(4)])
+        self.assertEqual(sorted(found), ["k0", "k1", "k2"])
+        cache.close()
@@ -0,0 +1,108 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import numpy as np
+import bencher as bch
+from bencher.blob_store import BlobArray
+from bencher.compression import dumps
+from bencher.cache_bundle import BundlePath, ENTRIES_NAME, export_bundle, import_bundle, main
+from bencher.job import FutureCache, Job
+
+
+def media_result(x: int) -> dict:
+    path = bch.gen_path("bundle_test", "bundle_test", ".txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"file {x}")
+    return {"array": np.full(1000, x, dtype=np.float64), "file": path, "x": x}
+
+
+class TestCacheBundle(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.bundle = os.path.join(self.directory, "bundle.tar.xz")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def fill_cache(self, backend: bch.CacheBackends) -> None:
+        cache = FutureCache(
+            cache_name="test_bundle_src", backend=backend, blob_threshold=1000, overwrite=True
+        )
+        cache.clear_cache()
+        for x in range(4):
+            tag = "a" if x < 3 else "b"
+            cache.submit(Job(str(x), media_result, {"x": x}, job_key=f"k{x}", tag=tag)).result()
+        cache.close()
+
+    def test_export_import(self):
+        for backend in bch.CacheBackends:
+            self.fill_cache(backend)
+            self.assertEqual(
+                export_bundle(self.bundle, ["a"], "test_bundle_src", backend=backend), 3
+            )
+
+            dst = FutureCache(cache_name="test_bundle_dst", backend=backend, blob_threshold=1000)
+            dst.clear_cache()
+            dst.close()
+            # the files the results referred to are deleted when the source cache is cleared
+            src = FutureCache(cache_name="test_bundle_src", backend=backend, blob_threshold=1000)
+            src.clear_cache()
+            src.close()
+
+            self.assertEqual(import_bundle(self.bundle, "test_bundle_dst", backend=backend), 3)
+            self.assertEqual(import_bundle(self.bundle, "test_bundle_dst", backend=backend), 0)
+
+            dst = FutureCache(
+                cache_name="test_bundle_dst", backend=backend, blob_threshold=1000, overwrite=False
+            )
+            self.assertIsNone(dst.load("k3"))
+            for x in range(3):
+                res = dst.load(f"k{x}")
+                np.testing.assert_array_equal(res["array"], np.full(1000, x))
+                with open(res["file"], encoding="utf-8") as f:
+                    self.assertEqual(f.read(), f"file {x}")
+                self.assertTrue(dst.blobs.is_blob(res["file"]))
+                self.assertIsInstance(dst.cache.get(f"k{x}")["array"], BlobArray)
+            dst.clear_cache()
+            dst.close()
+
+    def test_cli(self):
+        self.fill_cache(bch.CacheBackends.DISKCACHE)
+        main(
+            [
+                "cache",
+                "export",
+                "--tag",
+                "a",
+                "--tag",
+                "b",
+                "--cache-name",
+                "test_bundle_src",
+                "-o",
+                self.bundle,
+            ]
+        )
+        main(["cache", "import", self.bundle, "--cache-name", "test_bundle_cli", "--overwrite"])
+        dst = FutureCache(cache_name="test_bundle_cli", overwrite=False)
+        self.assertEqual(dst.load("k3")["x"], 3)
+        dst.clear_cache()
+        dst.close()
+
+    def write_bundle(self, entries: list, files: dict) -> None:
+        with tarfile.open(self.bundle, "w:xz") as tar:
+            for name, data in [(ENTRIES_NAME, dumps(entries, "none"))] + list(files.items()):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+    def test_paths_outside_cachedir_are_rejected(self):
+        self.write_bundle([("k0", {"file": BundlePath("../outside.txt")}, "a")], {})
+        with self.assertRaises(ValueError):
+            import_bundle(self.bundle, "test_bundle_unsafe")
+        self.write_bundle([], {"files/../../outside.txt": b"data"})
+        with self.assertRaises(ValueError):
+            import_bundle(self.bundle, "test_bundle_unsafe")
+        self.assertFalse(os.path.exists("outside.txt"))
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+from uuid import uuid4
+import bencher as bch
+from bencher.checkpoint_log import CheckpointLog
+
+
+class Interrupted(Exception):
+    pass
+
+
+class FailingSweep(bch.ParametrizedSweep):
+    x = bch.IntSweep(default=0, bounds=[0, 9])
+
+    out = bch.ResultVar()
+    path = bch.ResultPath()
+
+    calls = 0
+    fail_at = None
+
+    def __call__(self, **kwargs):
+        self.update_params_from_kwargs(**kwargs)
+        FailingSweep.calls += 1
+        if FailingSweep.calls == FailingSweep.fail_at:
+            raise Interrupted()
+        self.out = self.x * 2
+        self.path = f"file_{self.x}"
+        return super().__call__()
+
+
+class TestCheckpointLog(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_replay_discards_partial_record(self):
+        log = CheckpointLog("key", self.directory)
+        self.assertEqual(log.replay(), [])
+        log.append(((0,), {"a": 1}, None))
+        log.extend([((1,), {"a": 2}, None), ((2,), {"a": lambda: 3}, None)])
+        log.close()
+        # simulate the process dying while a record is written
+        with open(log.path, "ab") as f:
+            f.write(b"\x10\x00\x00\x00\x00")
+        size = os.path.getsize(log.path)
+
+        log = CheckpointLog("key", self.directory)
+        self.assertEqual(log.replay(), [((0,), {"a": 1}, None), ((1,), {"a": 2}, None)])
+        self.assertEqual(os.path.getsize(log.path), size - 5)
+        log.append(((2,), {"a": 3}, None))
+        log.close()
+        self.assertEqual(len(CheckpointLog("key", self.directory).replay()), 3)
+
+        log.delete()
+        self.assertFalse(os.path.exists(log.path))
+
+    def test_resume_interrupted_sweep(self):
+        bench = bch.Bench(f"test_checkpoint_{uuid4().hex}", FailingSweep())
+        run_cfg = bch.BenchRunCfg(checkpoint=True, auto_plot=False)
+        FailingSweep.calls = 0
+        FailingSweep.fail_at = 7
+        with self.assertRaises(Interrupted):
+            bench.plot_sweep(input_vars=["x"], run_cfg=run_cfg, plot_callbacks=False)
+
+        FailingSweep.calls = 0
+        FailingSweep.fail_at = None
+        res = bench.plot_sweep(input_vars=["x"], run_cfg=run_cfg, plot_callbacks=False)
+        # the 6 samples that completed before the sweep was interrupted are replayed
+        self.assertEqual(FailingSweep.calls, 4)
+        self.assertEqual(list(res.ds["out"].values.flatten()), [x * 2 for x in range(10)])
+        self.assertEqual(res.ds["path"].values[3, 0], "file_3")
+        self.assertFalse(os.path.exists(f"cachedir/checkpoints/{res.bench_cfg.hash_value}.log"))
+
+
+if __name__ == "__main__":
+    unittest.main()
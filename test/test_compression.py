@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+import unittest
+from diskcache import Cache
+from hypothesis import given, settings, strategies as st
+import numpy as np
+import bencher as bch
+from bencher.cache_backends import ShardedStore
+from bencher.compression import CODECS, compress, decompress, dumps, loads, open_cache, parse_codec
+from bencher.example.benchmark_data import SimpleBenchClassFloat
+
+available_codecs = [name for name, spec in CODECS.items() if spec[4]]
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    @settings(deadline=None)
+    @given(codec=st.sampled_from(available_codecs), data=st.binary(max_size=2000))
+    def test_round_trip(self, codec, data):
+        self.assertEqual(decompress(compress(data, codec)), data)
+
+    def check_codec(self, codec: str) -> None:
+        if not CODECS[codec][4]:
+            self.skipTest(f"the {codec} codec is not installed")
+        data = np.arange(10000).tobytes()
+        compressed = compress(data, codec)
+        self.assertLess(len(compressed), len(data))
+        self.assertEqual(decompress(compressed), data)
+        value = {"out": np.arange(1000)}
+        np.testing.assert_array_equal(loads(dumps(value, f"{codec}:1"))["out"], value["out"])
+
+    def test_zstd(self):
+        self.check_codec("zstd")
+
+    def test_lz4(self):
+        self.check_codec("lz4")
+
+    def test_parse_codec(self):
+        self.assertEqual(parse_codec("zlib:6"), ("zlib", 6))
+        self.assertEqual(parse_codec("zlib"), ("zlib", 1))
+        self.assertEqual(parse_codec(None), ("none", 0))
+        with self.assertRaises(ValueError):
+            parse_codec("missing")
+        for name, spec in CODECS.items():
+            if not spec[4]:
+                with self.assertRaises(ValueError):
+                    parse_codec(name)
+
+    def test_compresses(self):
+        value = {"out": np.zeros(10000)}
+        self.assertLess(len(dumps(value, "zlib")), len(dumps(value, "none")) / 10)
+        np.testing.assert_array_equal(loads(dumps(value, "zlib"))["out"], value["out"])
+
+    def test_cache_reads_any_codec(self):
+        directory = f"{self.directory}/cache"
+        with Cache(directory) as cache:
+            cache["plain"] = {"out": 1}
+        with open_cache(directory, "zlib", size_limit=int(1e9)) as cache:
+            cache["zlib"] = {"out": np.arange(1000)}
+            self.assertEqual(cache["plain"], {"out": 1})
+        # the codec is not saved in the settings of the cache
+        with open_cache(directory, "lzma") as cache:
+            cache["lzma"] = {"out": 2}
+            value, _ = cache.get("zlib", tag=True)
+            np.testing.assert_array_equal(value["out"], np.arange(1000))
+            self.assertEqual(cache["lzma"], {"out": 2})
+            self.assertEqual(cache["plain"], {"out": 1})
+
+    def test_sharded_store_codec(self):
+        ShardedStore(self.directory, "zlib").set("a", {"out": np.arange(1000)}, tag="t")
+        store = ShardedStore(self.directory)
+        value, tag = store.get("a", tag=True)
+        self.assertEqual(tag, "t")
+        np.testing.assert_array_equal(value["out"], np.arange(1000))
+
+    def test_sweep_with_codecs(self):
+        run_cfg = bch.BenchRunCfg(
+            sample_cache_codec="zlib",
+            bench_cache_codec="lzma",
+            cache_samples=True,
+            cache_results=True,
+            auto_plot=False,
+        )
+        bench = bch.Bench("test_compression", SimpleBenchClassFloat(), run_cfg=run_cfg)
+        res = bench.plot_sweep(input_vars=["var1"], plot_callbacks=False)
+
+        # the BenchResult is loaded from the compressed benchmark cache
+        run_cfg.sample_cache_codec = "none"
+        run_cfg.overwrite_sample_cache = False
+        run_cfg.memory_cache_entries = 0
+        bench.clear_call_counts()
+        res2 = bench.plot_sweep(input_vars=["var1"], plot_callbacks=False, run_cfg=run_cfg)
+        self.assertEqual(bench.sample_cache.worker_wrapper_call_count, 0)
+        np.testing.assert_array_equal(res2.ds["result"].values, res.ds["result"].values)
+
+        # the samples are loaded from the compressed sample cache
+        run_cfg.cache_results = False
+        res3 = bench.plot_sweep(input_vars=["var1"], plot_callbacks=False, run_cfg=run_cfg)
+        self.assertEqual(bench.sample_cache.worker_fn_call_count, 0)
+        self.assertGreater(bench.sample_cache.worker_cache_call_count, 0)
+        np.testing.assert_array_equal(res3.ds["result"].values, res.ds["result"].values)
@@ -0,0 +1,85 @@
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+import numpy as np
+import xarray as xr
+import bencher as bch
+from bencher.history_store import HistoryStore
+from bencher.example.benchmark_data import SimpleBenchClassFloat
+
+
+def run_dataset(day: int) -> xr.Dataset:
+    return xr.Dataset(
+        {"out": (["x", "over_time"], np.full((3, 1), day, dtype=float))},
+        coords={"x": [0, 1, 2], "over_time": [np.datetime64(f"2024-01-{day:02d}", "ns")]},
+    )
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.history = HistoryStore(self.directory, codec="zlib")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_append_and_load(self):
+        self.assertNotIn("key", self.history)
+        self.assertIsNone(self.history.load("key"))
+        for day in range(1, 6):
+            self.history.append("key", run_dataset(day))
+        self.assertIn("key", self.history)
+        self.assertEqual(len(self.history.times("key")), 5)
+
+        ds = self.history.load("key")
+        np.testing.assert_array_equal(ds["out"].values[0], [1, 2, 3, 4, 5])
+
+        ds = self.history.load("key", start="2024-01-02", end="2024-01-04")
+        np.testing.assert_array_equal(ds["out"].values[0], [2, 3, 4])
+
+        ds = self.history.load("key", end="2024-01-04", last=2)
+        np.testing.assert_array_equal(ds["out"].values[0], [3, 4])
+
+    def test_only_reads_window(self):
+        for day in range(1, 6):
+            self.history.append("key", run_dataset(day))
+        loaded = []
+        load_chunk = self.history.load_chunk
+        self.history.load_chunk = lambda key, entry: loaded.append(entry) or load_chunk(key, entry)
+        self.history.load("key", last=2)
+        self.assertEqual(len(loaded), 2)
+
+    def test_multi_run_chunk(self):
+        # a history migrated from a single dataset is one chunk with many runs
+        self.history.append("key", xr.concat([run_dataset(1), run_dataset(2)], "over_time"))
+        self.history.append("key", run_dataset(3))
+        ds = self.history.load("key", last=2)
+        np.testing.assert_array_equal(ds["out"].values[0], [2, 3])
+
+    def test_clear(self):
+        path = self.history.append("key", run_dataset(1))
+        self.assertEqual(self.history.clear("key"), [path])
+        self.assertNotIn("key", self.history)
+
+
+class TestBenchHistory(unittest.TestCase):
+    def test_over_time_window(self):
+        bench = bch.Bench("test_history_window", SimpleBenchClassFloat())
+        for day in range(1, 5):
+            run_cfg = bch.BenchRunCfg(
+                over_time=True,
+                auto_plot=False,
+                clear_history=day == 1,
+                history_window=3,
+            )
+            res = bench.plot_sweep(
+                input_vars=["var1"],
+                run_cfg=run_cfg,
+                time_src=datetime(2000, 1, day),
+                plot_callbacks=False,
+            )
+            self.assertEqual(len(res.ds.coords["over_time"]), min(day, 3))
+        self.assertEqual(
+            res.ds.coords["over_time"].values[-1], np.datetime64(datetime(2000, 1, 4), "ns")
+        )
@@ -1,7 +1,14 @@
 import unittest
 import bencher as bch
 import random
+import time
+import threading
+import asyncio
+import numpy as np
+from bencher.utils import hash_sha1
+from bencher.worker_job import WorkerJob
 from bencher.job import JobFunctionCache
+from bencher.example.benchmark_data import SimpleBenchClassFloat
 
 from hypothesis import given, strategies as st, settings
 
@@ -18,9 +25,63 @@ class CachedParamExample(bch.CachedParams):
         return self.get_results_values_as_dict()
 
 
+class AsyncSleep(bch.ParametrizedSweep):
+    var1 = bch.IntSweep(default=0, bounds=[0, 9])
+
+    result = bch.ResultVar()
+
+    # async workers override __call__ with a coroutine function, which bencher awaits
+    async def __call__(self, **kwargs):  # pylint: disable=invalid-overridden-method
+        await asyncio.sleep(0.2)
+        return {"result": kwargs["var1"] * 2}
+
+
+class SlowCorner(bch.ParametrizedSweep):
+    var1 = bch.IntSweep(default=0, bounds=[0, 4])
+
+    result = bch.ResultVar()
+
+    calls = []
+
+    def __call__(self, **kwargs):
+        self.update_params_from_kwargs(**kwargs)
+        SlowCorner.calls.append(self.var1)
+        time.sleep(0.02 * self.var1)
+        self.result = self.var1
+        return super().__call__()
+
+
+class CountRunning(bch.ParametrizedSweep):
+    """Records the largest number of samples that were running at the same time"""
+
+    var1 = bch.IntSweep(default=0, bounds=[0, 11])
+
+    result = bch.ResultVar()
+
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def __call__(self, **kwargs):
+        self.update_params_from_kwargs(**kwargs)
+        with CountRunning.lock:
+            CountRunning.running += 1
+            CountRunning.peak = max(CountRunning.peak, CountRunning.running)
+        time.sleep(0.02)
+        with CountRunning.lock:
+            CountRunning.running -= 1
+        self.result = self.var1
+        return super().__call__()
+
+
+THREAD_EXECUTORS = [bch.Executors.THREADS, bch.Executors.ASYNCIO]
+
+
 class TestJob(unittest.TestCase):
     @settings(deadline=500)
-    @given(st.sampled_from([bch.Executors.SERIAL, bch.Executors.MULTIPROCESSING]))
+    @given(
+        st.sampled_from([bch.Executors.SERIAL, bch.Executors.MULTIPROCESSING] + THREAD_EXECUTORS)
+    )
     def test_basic(self, executor):
         cp = CachedParamExample()  # clears cache by default
 
@@ -50,7 +111,9 @@ class TestJob(unittest.TestCase):
         self.assertNotEqual(res1["result"], res1cp3["result"])
 
     @settings(deadline=500)
-    @given(st.sampled_from([bch.Executors.SERIAL, bch.Executors.MULTIPROCESSING]))
+    @given(
+        st.sampled_from([bch.Executors.SERIAL, bch.Executors.MULTIPROCESSING] + THREAD_EXECUTORS)
+    )
     def test_overwrite(self, executor):
         cp = CachedParamExample()  # clears cache by default
 
@@ -93,6 +156,123 @@ class TestJob(unittest.TestCase):
 
         bench_run.run(level=2)
 
+    @settings(deadline=10000, max_examples=4)
+    @given(st.sampled_from([1, 3]))
+    def test_max_jobs_in_flight(self, max_jobs_in_flight):
+        run_cfg = bch.BenchRunCfg()
+        run_cfg.executor = bch.Executors.MULTIPROCESSING
+        run_cfg.max_jobs_in_flight = max_jobs_in_flight
+        run_cfg.repeats = 2
+        run_cfg.auto_plot = False
+        bench = bch.Bench("test_max_jobs_in_flight", SimpleBenchClassFloat(), run_cfg=run_cfg)
+        res = bench.plot_sweep(input_vars=["var1"], plot_callbacks=False)
+
+        # every sample should be stored in the correct location of the dataset even though they complete out of order
+        ds = res.ds
+        for repeat in ds.coords["repeat"].values:
+            np.testing.assert_array_equal(
+                ds["result"].sel(repeat=repeat).values, ds.coords["var1"].values
+            )
+
+    @settings(deadline=10000, max_examples=3)
+    @given(st.sampled_from([1, 2, 3]))
+    def test_max_jobs_in_flight_bound(self, max_jobs_in_flight):
+        CountRunning.peak = 0
+        run_cfg = bch.BenchRunCfg(
+            executor=bch.Executors.THREADS,
+            max_workers=8,
+            max_jobs_in_flight=max_jobs_in_flight,
+            auto_plot=False,
+        )
+        bench = bch.Bench("test_max_jobs_in_flight_bound", CountRunning(), run_cfg=run_cfg)
+        res = bench.plot_sweep(plot_callbacks=False)
+        np.testing.assert_array_equal(res.ds["result"].values.flatten(), np.arange(12))
+        # there are more threads than the bound, so only the bound limits how many jobs run at once
+        self.assertLessEqual(CountRunning.peak, max_jobs_in_flight)
+        self.assertGreaterEqual(CountRunning.peak, 1)
+
+    @settings(deadline=10000, max_examples=3)
+    @given(st.sampled_from([bch.Executors.SERIAL] + THREAD_EXECUTORS))
+    def test_async_worker(self, executor):
+        run_cfg = bch.BenchRunCfg(executor=executor, max_workers=10, auto_plot=False)
+        bench = bch.Bench("test_async_worker", AsyncSleep(), run_cfg=run_cfg)
+        start = time.time()
+        res = bench.plot_sweep(plot_callbacks=False)
+        duration = time.time() - start
+
+        np.testing.assert_array_equal(res.ds["result"].values.flatten(), np.arange(10) * 2)
+        if executor != bch.Executors.SERIAL:
+            # 10 samples of 0.2 seconds run concurrently
+            self.assertLess(duration, 1.5)
+
+    def test_order_jobs_by_cost(self):
+        run_cfg = bch.BenchRunCfg(
+            executor=bch.Executors.THREADS,
+            max_workers=1,
+            order_jobs_by_cost=True,
+            repeats=2,
+            auto_plot=False,
+        )
+        bench = bch.Bench("test_order_jobs_by_cost", SlowCorner(), run_cfg=run_cfg)
+        bench.plot_sweep(plot_callbacks=False)
+
+        # every repeat of a sample shares the recorded time of the sample
+        SlowCorner.calls = []
+        res = bench.plot_sweep(plot_callbacks=False)
+        self.assertEqual(SlowCorner.calls, [4, 4, 3, 3, 2, 2, 1, 1, 0, 0])
+        np.testing.assert_array_equal(res.ds["result"].values[:, 0], np.arange(5))
+
+    def test_probe(self):
+        cache = bch.job.FutureCache(
+            overwrite=False, cache_name="test_probe", memory_cache_entries=0
+        )
+        cache.clear_cache()
+        jobs = [bch.job.Job(str(i), pow, {"base": i, "exp": 2}, job_key=f"k{i}") for i in range(6)]
+        for job in jobs[:4]:
+            cache.submit(job).result()
+        cache.clear_call_counts()
+
+        found = cache.probe(jobs)
+        self.assertEqual(sorted(found), ["k0", "k1", "k2", "k3"])
+        self.assertEqual(found["k3"].result(), 9)
+        self.assertEqual(cache.worker_cache_call_count, 4)
+        self.assertEqual(cache.disk_hit_count, 4)
+        self.assertEqual(cache.worker_fn_call_count, 0)
+
+        cache.overwrite = True
+        self.assertEqual(cache.probe(jobs), {})
+        cache.close()
+
+    def test_legacy_cache_keys(self):
+        cache = bch.job.FutureCache(
+            overwrite=False, cache_name="test_legacy", memory_cache_entries=0
+        )
+        cache.clear_cache()
+        # caches written by older versions are migrated by default
+        self.assertTrue(bch.BenchRunCfg().legacy_cache_keys)
+        job = WorkerJob([np.float64(0.5), 1], (0, 0), ["var1", "repeat"], None, "", "tag")
+        job.setup_hashes()
+        # a result cached by an older version of bencher under the sha1 of the string of the inputs
+        legacy_key = hash_sha1((sorted(job.function_input.items()), "tag"))
+        self.assertEqual(job.legacy_signature(), legacy_key)
+        cache.cache.set(legacy_key, {"result": 3}, tag="tag")
+
+        cache_job = bch.job.Job("0", None, job.function_input, job.function_input_signature_pure)
+        self.assertEqual(cache.probe([cache_job]), {})
+
+        cache_job.legacy_key = job.legacy_signature()
+        self.assertEqual(cache.probe([cache_job])[cache_job.job_key].result(), {"result": 3})
+        # the result is copied to the new key
+        self.assertEqual(cache.cache[job.function_input_signature_pure], {"result": 3})
+
+        # jobs that are submitted without probing are migrated too
+        cache.clear_cache()
+        cache.cache.set(legacy_key, {"result": 4}, tag="tag")
+        self.assertEqual(cache.submit(cache_job).result(), {"result": 4})
+        self.assertEqual(cache.worker_fn_call_count, 0)
+        self.assertEqual(cache.cache[job.function_input_signature_pure], {"result": 4})
+        cache.close()
+
 
 if __name__ == "__main__":
     TestJob().test_bench_runner_parallel(True).report.show()
@@ -0,0 +1,104 @@
+import sys
+import unittest
+import numpy as np
+from bencher.job import FutureCache, Job
+from bencher.memory_cache import LRUCache, size_of
+
+
+def double(x):
+    return {"result": x * 2}
+
+
+class NotPickled:
+    def __reduce__(self):
+        raise AssertionError("size_of should not pickle values")
+
+
+class TestMemoryCache(unittest.TestCase):
+    def test_lru_entry_limit(self):
+        lru = LRUCache(max_entries=2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        self.assertEqual(lru.get("a"), 1)  # a is now the most recently used
+        lru.set("c", 3)
+        self.assertNotIn("b", lru)
+        self.assertEqual(lru.get("a"), 1)
+        self.assertEqual(lru.get("c"), 3)
+
+    def test_lru_byte_limit(self):
+        value = {"out": np.zeros(100)}
+        size = size_of(value)
+        self.assertGreater(size, value["out"].nbytes)
+        lru = LRUCache(max_entries=100, max_bytes=2 * size)
+        for key in "abc":
+            lru.set(key, value)
+        self.assertEqual(len(lru), 2)
+        self.assertEqual(lru.nbytes, 2 * size)
+        self.assertNotIn("a", lru)
+
+        # values larger than the limit are not kept
+        lru.set("big", {"out": np.zeros(1000)})
+        self.assertNotIn("big", lru)
+        self.assertEqual(len(lru), 2)
+
+    def test_size_of(self):
+        self.assertEqual(size_of(np.zeros(10)), 80)
+        value = NotPickled()
+        self.assertEqual(size_of(value), sys.getsizeof(value))
+        labels = np.array(["a", "bc"], dtype=object)
+        self.assertEqual(size_of(labels), labels.nbytes + size_of("a") + size_of("bc"))
+
+    def test_lru_copies_values(self):
+        lru = LRUCache()
+        value = {"out": np.zeros(3), "items": [1]}
+        lru.set("a", value)
+        value["out"][0] = 1
+        loaded = lru.get("a")
+        loaded["items"].append(2)
+        loaded["other"] = 1
+        self.assertEqual(lru.get("a")["items"], [1])
+        self.assertNotIn("other", lru.get("a"))
+        np.testing.assert_array_equal(lru.get("a")["out"], np.zeros(3))
+
+    def test_lru_evict_tag(self):
+        lru = LRUCache()
+        lru.set("a", 1, tag="x")
+        lru.set("b", 2, tag="y")
+        self.assertEqual(lru.evict("x"), 1)
+        self.assertNotIn("a", lru)
+        self.assertIn("b", lru)
+
+    def test_memory_tier_hits(self):
+        def submit_all(cache):
+            for x in range(5):
+                cache.submit(Job(str(x), double, {"x": x}, job_key=f"k{x}", tag="t")).result()
+
+        cache = FutureCache(
+            overwrite=False, cache_name="test_memory_tier", memory_cache_entries=100
+        )
+        cache.clear_cache()
+        submit_all(cache)
+        self.assertEqual(cache.worker_fn_call_count, 5)
+
+        # a new FutureCache of the same directory shares the memory tier
+        cache.close()
+        cache = FutureCache(
+            overwrite=False, cache_name="test_memory_tier", memory_cache_entries=100
+        )
+        submit_all(cache)
+        self.assertEqual(cache.memory_hit_count, 5)
+        self.assertEqual(cache.disk_hit_count, 0)
+        self.assertIn("memory hits: 5/5 (100%)", cache.stats())
+
+        # results that are only on disk are loaded into memory the first time they are read
+        cache.clear_call_counts()
+        cache.memory_cache.clear()
+        submit_all(cache)
+        submit_all(cache)
+        self.assertEqual(cache.disk_hit_count, 5)
+        self.assertEqual(cache.memory_hit_count, 5)
+        self.assertEqual(cache.worker_fn_call_count, 0)
+
+        cache.clear_tag("t")
+        self.assertEqual(len(cache.memory_cache), 0)
+        cache.close()
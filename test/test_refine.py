@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+import bencher as bch
+
+
+class CountingFloatSweep(bch.ParametrizedSweep):
+    x = bch.FloatSweep(default=0, bounds=[0, 1])
+    y = bch.BoolSweep()
+
+    out = bch.ResultVar()
+
+    calls = 0
+
+    def __call__(self, **kwargs):
+        self.update_params_from_kwargs(**kwargs)
+        CountingFloatSweep.calls += 1
+        self.out = self.x + 10 * self.y
+        return super().__call__()
+
+
+class TestRefine(unittest.TestCase):
+    def test_refine_only_calculates_new_samples(self):
+        CountingFloatSweep.calls = 0
+        bench = bch.Bench("test_refine", CountingFloatSweep())
+        run_cfg = bch.BenchRunCfg(level=3, cache_samples=False, auto_plot=False)
+        res3 = bench.plot_sweep(input_vars=["x", "y"], run_cfg=run_cfg, plot_callbacks=False)
+        self.assertEqual(CountingFloatSweep.calls, 3 * 2)
+
+        res4 = bench.refine(res3)
+        self.assertEqual(res4.bench_cfg.level, 4)
+        self.assertEqual(len(res4.ds.coords["x"]), 5)
+        # the 3 values of x of level 3 are reused and 2 new values are calculated
+        self.assertEqual(CountingFloatSweep.calls, 3 * 2 + 2 * 2)
+
+        res5 = bench.refine(res4)
+        self.assertEqual(CountingFloatSweep.calls, 3 * 2 + 2 * 2 + 4 * 2)
+        y = res5.ds.coords["y"].values == "True"
+        expected = res5.ds.coords["x"].values[:, None] + 10 * y[None, :]
+        np.testing.assert_allclose(
+            res5.ds["out"].transpose("x", "y", "repeat").values[..., 0], expected
+        )
+
+        ds3 = res5.select_level(res5.ds, 3)
+        np.testing.assert_allclose(ds3.coords["x"].values, res3.ds.coords["x"].values)
+        np.testing.assert_allclose(ds3["out"].values, res3.ds["out"].values)
+
+    def test_refine_requires_level(self):
+        bench = bch.Bench("test_refine_no_level", CountingFloatSweep())
+        res = bench.plot_sweep(
+            input_vars=["x"],
+            run_cfg=bch.BenchRunCfg(cache_samples=False, auto_plot=False),
+            plot_callbacks=False,
+        )
+        with self.assertRaises(ValueError):
+            bench.refine(res)
+
+    def test_refine_requires_same_bench(self):
+        res = bch.Bench("test_refine_a", CountingFloatSweep()).plot_sweep(
+            input_vars=["x"],
+            run_cfg=bch.BenchRunCfg(level=2, cache_samples=False, auto_plot=False),
+            plot_callbacks=False,
+        )
+        with self.assertRaises(ValueError):
+            bch.Bench("test_refine_b", CountingFloatSweep()).refine(res)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+import numpy as np
+import xarray as xr
+import bencher as bch
+from bencher.example.example_simple_float import SimpleFloat
+from bencher.remote_worker import RemoteExecutor, RemoteWorkerAgent, parse_address
+
+
+def start_agents(count: int) -> list[RemoteWorkerAgent]:
+    agents = [RemoteWorkerAgent("localhost", 0) for _ in range(count)]
+    for agent in agents:
+        threading.Thread(target=agent.serve_forever, daemon=True).start()
+    return agents
+
+
+def agent_addresses(agents: list[RemoteWorkerAgent]) -> list[str]:
+    return [f"{host}:{port}" for host, port in (a.address for a in agents)]
+
+
+class StatefulDoubler(bch.ParametrizedSweep):
+    """A worker that keeps the inputs of the sample in its parameters while it evaluates it"""
+
+    var1 = bch.IntSweep(default=0, bounds=[0, 9])
+
+    result = bch.ResultVar()
+
+    def __call__(self, **kwargs) -> dict:
+        self.update_params_from_kwargs(**kwargs)
+        time.sleep(0.01)
+        self.result = self.var1 * 2
+        return super().__call__()
+
+
+def fail(value):
+    raise ValueError(value)
+
+
+@mock.patch.dict(os.environ, {"BENCHER_AUTHKEY": "test_remote_worker"})
+class TestRemoteWorker(unittest.TestCase):
+    def test_requires_authkey(self):
+        with mock.patch.dict(os.environ, {"BENCHER_AUTHKEY": ""}):
+            with self.assertRaises(RuntimeError):
+                RemoteWorkerAgent("localhost", 0)
+            with self.assertRaises(RuntimeError):
+                RemoteExecutor(["localhost:7600"])
+        agent = RemoteWorkerAgent(port=0)
+        self.assertEqual(agent.address[0], "127.0.0.1")
+        agent.close()
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address("localhost:7600"), ("localhost", 7600))
+        self.assertEqual(parse_address(("localhost", 7600)), ("localhost", 7600))
+
+    def test_sweep_matches_serial(self):
+        """check that a sweep distributed over several agents gives the same results as a serial sweep"""
+        agents = start_agents(3)
+        datasets = []
+        try:
+            for run_cfg in [
+                bch.BenchRunCfg(auto_plot=False),
+                bch.BenchRunCfg(
+                    auto_plot=False,
+                    executor=bch.Executors.REMOTE,
+                    remote_workers=agent_addresses(agents),
+                ),
+            ]:
+                bench = SimpleFloat().to_bench(run_cfg)
+                res = bench.plot_sweep("test_remote", input_vars=["theta"], result_vars=["out_sin"])
+                self.assertEqual(bench.sample_cache.worker_fn_call_count, 30)
+                datasets.append(res.ds)
+        finally:
+            for agent in agents:
+                agent.close()
+
+        xr.testing.assert_allclose(datasets[0], datasets[1])
+
+    def test_connections_use_their_own_worker(self):
+        agents = start_agents(1)
+        try:
+            # two connections to the same agent evaluate samples at the same time
+            run_cfg = bch.BenchRunCfg(
+                auto_plot=False,
+                executor=bch.Executors.REMOTE,
+                remote_workers=agent_addresses(agents) * 2,
+            )
+            res = StatefulDoubler().to_bench(run_cfg).plot_sweep(plot_callbacks=False)
+        finally:
+            agents[0].close()
+        np.testing.assert_array_equal(res.ds["result"].values.flatten(), np.arange(10) * 2)
+
+    def test_exceptions_are_returned(self):
+        agents = start_agents(1)
+        executor = RemoteExecutor(agent_addresses(agents))
+        try:
+            with self.assertRaises(ValueError):
+                executor.submit(fail, "remote error").result(timeout=10)
+            self.assertEqual(executor.submit(pow, 2, 10).result(timeout=10), 1024)
+        finally:
+            executor.shutdown()
+            agents[0].close()
+
+    def test_jobs_fail_without_agents(self):
+        agents = start_agents(1)
+        address = agent_addresses(agents)
+        agents[0].close()
+
+        executor = RemoteExecutor(address)
+        executor.threads[0].join(timeout=10)
+        with self.assertRaises(RuntimeError):
+            executor.submit(pow, 2, 10)
+        executor.shutdown()
+
+    def test_bencher_worker_entry_point(self):
+        with subprocess.Popen(
+            [sys.executable, "-m", "bencher.remote_worker", "--host", "localhost", "--port", "0"],
+            stdout=subprocess.PIPE,
+            text=True,
+        ) as proc:
+            try:
+                address = proc.stdout.readline().split()[-1]
+                executor = RemoteExecutor([address])
+                self.assertEqual(executor.submit(pow, 2, 10).result(timeout=30), 1024)
+                executor.shutdown()
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    def test_entry_point_requires_authkey(self):
+        env = {k: v for k, v in os.environ.items() if k != "BENCHER_AUTHKEY"}
+        proc = subprocess.run(
+            [sys.executable, "-m", "bencher.remote_worker", "--port", "0"],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=60,
+            check=False,
+        )
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertIn("BENCHER_AUTHKEY", proc.stderr)
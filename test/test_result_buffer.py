@@ -0,0 +1,213 @@
+import shutil
+import tempfile
+import unittest
+from uuid import uuid4
+import numpy as np
+import bencher as bch
+from bencher.result_buffer import ResultBuffer, SparseArray, SparseResultBuffer, sparse_array
+from bencher.result_store import ResultStore
+from bencher.results.bench_result_base import reduce_blockwise
+
+
+class TenInputs(bch.ParametrizedSweep):
+    """A sweep with more dimensions than xarray indexing used to support"""
+
+    x0 = bch.IntSweep(default=0, bounds=[0, 1])
+    x1 = bch.IntSweep(default=0, bounds=[0, 1])
+    x2 = bch.IntSweep(default=0, bounds=[0, 1])
+    x3 = bch.IntSweep(default=0, bounds=[0, 1])
+    x4 = bch.IntSweep(default=0, bounds=[0, 1])
+    x5 = bch.IntSweep(default=0, bounds=[0, 1])
+    x6 = bch.IntSweep(default=0, bounds=[0, 1])
+    x7 = bch.IntSweep(default=0, bounds=[0, 1])
+    x8 = bch.IntSweep(default=0, bounds=[0, 1])
+    x9 = bch.IntSweep(default=0, bounds=[0, 1])
+
+    result = bch.ResultVar()
+
+    def __call__(self, **kwargs) -> dict:
+        self.update_params_from_kwargs(**kwargs)
+        self.result = sum(v * 2**i for i, v in enumerate(self.get_inputs_as_dict().values()))
+        return super().__call__()
+
+
+class TestResultBuffer(unittest.TestCase):
+    def test_flat_index_matches_nd_index(self):
+        buffer = ResultBuffer(["a", "b", "c"], [2, 3, 4], {"a": [0, 1], "b": [0, 1, 2]})
+        buffer.add_var("val", np.nan, float)
+        buffer.add_var("obj", "NAN", object)
+
+        buffer.set("val", buffer.flat_index((1, 2, 3)), 5.0)
+        buffer.set("obj", buffer.flat_index((0, 1, 2)), [1, 2])
+
+        ds = buffer.to_dataset()
+        self.assertEqual(ds["val"].shape, (2, 3, 4))
+        self.assertEqual(ds["val"].values[1, 2, 3], 5.0)
+        self.assertEqual(ds["obj"].values[0, 1, 2], [1, 2])
+        self.assertEqual(int(np.isnan(ds["val"].values).sum()), 23)
+
+    def test_batch_flat_index(self):
+        buffer = ResultBuffer(["a", "b"], [2, 3], {})
+        buffer.add_var("val", np.nan, float)
+        buffer.set("val", buffer.flat_index((np.array([0, 1]), np.array([2, 0]))), [1.0, 2.0])
+        ds = buffer.to_dataset()
+        self.assertEqual(ds["val"].values[0, 2], 1.0)
+        self.assertEqual(ds["val"].values[1, 0], 2.0)
+
+    def test_more_than_9_dims(self):
+        run_cfg = bch.BenchRunCfg(auto_plot=False, print_bench_results=False)
+        run_cfg.print_bench_inputs = False
+        res = TenInputs().to_bench(run_cfg).plot_sweep(plot_callbacks=False)
+        self.assertEqual(len(res.ds["result"].dims), 11)
+        np.testing.assert_array_equal(np.sort(res.ds["result"].values.flatten()), np.arange(2**10))
+
+    def test_sparse_buffer(self):
+        buffer = SparseResultBuffer(["a", "b"], [3, 4], {}, [(0, 1), (2, 3), (1, 0)])
+        self.assertEqual(buffer.size, 3)
+        buffer.add_var("val", np.nan, float)
+        buffer.add_var("obj", "NAN", object)
+        buffer.set("val", buffer.flat_index((2, 3)), 5.0)
+        buffer.set("val", buffer.flat_index((np.array([0, 1]), np.array([1, 0]))), [1.0, 2.0])
+        buffer.set("obj", buffer.flat_index((0, 1)), [1, 2])
+
+        ds = buffer.to_dataset()
+        self.assertIsInstance(sparse_array(ds["val"].variable), SparseArray)
+        expected = np.full((3, 4), np.nan)
+        expected[0, 1], expected[1, 0], expected[2, 3] = 1.0, 2.0, 5.0
+        np.testing.assert_array_equal(ds["val"].values, expected)
+        np.testing.assert_array_equal(ds["val"].isel(a=2).values, expected[2])
+        np.testing.assert_array_equal(ds["val"].isel(b=[0, 3]).values, expected[:, [0, 3]])
+        self.assertEqual(ds["obj"].values[0, 1], [1, 2])
+        self.assertEqual(ds["obj"].values[2, 2], "NAN")
+
+    def test_memory_mapped_buffer(self):
+        directory = tempfile.mkdtemp()
+        try:
+            buffer = ResultBuffer(["a", "b"], [2, 3], {}, directory)
+            buffer.add_var("val", np.nan, float)
+            buffer.add_var("obj", "NAN", object)
+            self.assertIsInstance(buffer.data_vars["val"], np.memmap)
+            self.assertNotIsInstance(buffer.data_vars["obj"], np.memmap)
+            buffer.set("val", buffer.flat_index((1, 2)), 3.0)
+            buffer.data_vars["val"].flush()
+            np.testing.assert_array_equal(np.load(f"{directory}/0.npy")[5], 3.0)
+            self.assertEqual(buffer.to_dataset()["val"].values[1, 2], 3.0)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_reduce_blockwise(self):
+        rng = np.random.default_rng(0)
+        ds = ResultBuffer(["x", "repeat"], [100, 4], {"x": np.arange(100)})
+        ds.add_var("val", np.nan, float)
+        ds.data_vars["val"][:] = rng.random(400)
+        ds = ds.to_dataset()
+        # blocks of 10 rows of x
+        blocks = reduce_blockwise(ds, lambda d: d.std(dim="repeat"), block_bytes=320)
+        np.testing.assert_allclose(blocks["val"].values, ds["val"].std(dim="repeat").values)
+        np.testing.assert_array_equal(blocks.coords["x"].values, np.arange(100))
+
+    def test_out_of_core_sweep(self):
+        run_cfg = bch.BenchRunCfg(auto_plot=False, repeats=2)
+        res = (
+            TenInputs().to_bench(run_cfg).plot_sweep(input_vars=["x0", "x1"], plot_callbacks=False)
+        )
+        run_cfg.out_of_core = True
+        res_ooc = (
+            TenInputs().to_bench(run_cfg).plot_sweep(input_vars=["x0", "x1"], plot_callbacks=False)
+        )
+        self.assertIsInstance(res_ooc.ds["result"].variable._data.base, np.memmap)  # pylint: disable=protected-access
+        np.testing.assert_array_equal(res_ooc.ds["result"].values, res.ds["result"].values)
+        xr_reduced = res_ooc.to_dataset(bch.ReduceType.REDUCE)
+        np.testing.assert_array_equal(
+            xr_reduced["result"].values, res.to_dataset(bch.ReduceType.REDUCE)["result"].values
+        )
+
+
+class TestConstrainedSweep(unittest.TestCase):
+    def test_constraint(self):
+        bench = TenInputs().to_bench(bch.BenchRunCfg(auto_plot=False))
+        res = bench.plot_sweep(
+            input_vars=["x0", "x1", "x2"],
+            constraint=lambda x: x["x0"] + x["x1"] + x["x2"] <= 1,
+            plot_callbacks=False,
+        )
+        column = sparse_array(res.ds["result"].variable)
+        # only the 4 combinations of the inputs that satisfy the constraint are stored
+        self.assertEqual(len(column.index), 4)
+        values = res.ds["result"].values
+        self.assertEqual(values[0, 1, 0, 0], 2)
+        self.assertEqual(values[1, 0, 0, 0], 1)
+        self.assertTrue(np.isnan(values[1, 1, 0, 0]))
+
+        directory = tempfile.mkdtemp()
+        try:
+            store = ResultStore(directory)
+            store.save("key", res)
+            self.assertIsNotNone(res.bench_cfg.constraint)
+            loaded = store.load("key")
+            self.assertIsInstance(sparse_array(loaded.ds["result"].variable), SparseArray)
+            np.testing.assert_array_equal(loaded.ds["result"].values, values)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_constraint_hash(self):
+        def below(limit):
+            return lambda x: x["x0"] < limit
+
+        def cfg(constraint):
+            return bch.BenchCfg(input_vars=[], result_vars=[], const_vars=[], constraint=constraint)
+
+        hashes = [
+            cfg(constraint).hash_persistent(True)
+            for constraint in [
+                lambda x: x["x0"] < 3,
+                lambda x: x["x0"] < 5,
+                below(3),
+                below(5),
+            ]
+        ]
+        self.assertEqual(len(set(hashes)), 4)
+        self.assertEqual(
+            cfg(lambda x: x["x0"] < 3).hash_persistent(True),
+            cfg(lambda x: x["x0"] < 3).hash_persistent(True),
+        )
+
+    def test_constraint_changes_are_not_loaded_from_cache(self):
+        bench = TenInputs().to_bench(bch.BenchRunCfg(auto_plot=False, cache_results=True))
+        name = uuid4().hex
+        counts = []
+        for limit in [1, 2]:
+            res = bench.plot_sweep(
+                name,
+                input_vars=["x0", "x1", "x2"],
+                constraint=lambda x, limit=limit: x["x0"] + x["x1"] + x["x2"] <= limit,
+                plot_callbacks=False,
+            )
+            counts.append(len(sparse_array(res.ds["result"].variable).index))
+        self.assertEqual(counts, [4, 7])
+
+    def test_unhashable_constraint_is_not_cached(self):
+        class Limit:
+            def __call__(self, x):
+                return x["x0"] + x["x1"] <= 1
+
+        cfg = bch.BenchCfg(input_vars=[], result_vars=[], const_vars=[], constraint=Limit())
+        self.assertFalse(cfg.cacheable())
+        self.assertNotEqual(cfg.hash_persistent(True), cfg.hash_persistent(True))
+
+        bench = TenInputs().to_bench(bch.BenchRunCfg(auto_plot=False, cache_results=True))
+        name = uuid4().hex
+        for run in range(2):
+            # the results are calculated again because they were not cached
+            bench.plot_sweep(
+                name, input_vars=["x0", "x1"], constraint=Limit(), plot_callbacks=False
+            )
+            self.assertEqual(bench.sample_cache.worker_fn_call_count, 3 * (run + 1))
+        with self.assertRaises(ValueError):
+            bench.plot_sweep(
+                name,
+                input_vars=["x0", "x1"],
+                constraint=Limit(),
+                plot_callbacks=False,
+                run_cfg=bch.BenchRunCfg(auto_plot=False, only_plot=True),
+            )
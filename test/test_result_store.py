@@ -0,0 +1,148 @@
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import bencher as bch
+from bencher.compression import open_cache
+from bencher.example.benchmark_data import (
+    ExampleBenchCfgIn,
+    ExampleBenchCfgOut,
+    SimpleBenchClassFloat,
+    bench_function,
+)
+from bencher.result_store import ColumnArray, ResultStore, load_bench_result
+
+
+def column(ds, name) -> ColumnArray:
+    return ds[name].variable._data.array  # pylint: disable=protected-access
+
+
+def read_later(directory: str, conn) -> None:
+    """Load a result in another process and only read its values after the parent has saved a new version"""
+    loaded = ResultStore(directory, codec="zlib").load("key")
+    conn.send("loaded")
+    conn.recv()
+    conn.send(loaded.ds["result"].values)
+
+
+class TestResultStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.store = ResultStore(self.directory, codec="zlib")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def run_bench(self) -> bch.BenchResult:
+        bench = bch.Bench("test_result_store", SimpleBenchClassFloat())
+        return bench.plot_sweep(
+            input_vars=["var1"],
+            run_cfg=bch.BenchRunCfg(repeats=2, auto_plot=False),
+            plot_callbacks=False,
+        )
+
+    def test_lazy_round_trip(self):
+        res = self.run_bench()
+        res.ds["label"] = res.ds["result"].astype(str).astype(object)
+        res.object_index = [object()]
+        self.store.save("key", res)
+        self.assertEqual(len(res.object_index), 1)
+        self.assertIn("key", self.store)
+
+        loaded = self.store.load("key")
+        self.assertEqual(loaded.bench_cfg.title, res.bench_cfg.title)
+        self.assertEqual(loaded.object_index, [])
+        # no variables are read until they are used
+        self.assertIsNone(column(loaded.ds, "result")._values)  # pylint: disable=protected-access
+        np.testing.assert_array_equal(loaded.ds["result"].values, res.ds["result"].values)
+        self.assertIsNone(column(loaded.ds, "label")._values)  # pylint: disable=protected-access
+        np.testing.assert_array_equal(
+            loaded.ds["label"].isel(var1=0).values, res.ds["label"].isel(var1=0).values
+        )
+        self.assertEqual(loaded.ds["result"].dims, res.ds["result"].dims)
+
+        self.assertTrue(self.store.delete("key"))
+        self.assertIsNone(self.store.load("key"))
+
+    def test_save_keeps_versions_that_are_used(self):
+        res = self.run_bench()
+        self.store.save("key", res)
+        loaded = self.store.load("key")
+        expected = res.ds["result"].values.copy()
+
+        res.ds["result"] = res.ds["result"] + 1
+        self.store.save("key", res)
+        # the result loaded before the save still reads the version it was loaded from
+        np.testing.assert_array_equal(loaded.ds["result"].values, expected)
+        np.testing.assert_array_equal(
+            self.store.load("key").ds["result"].values, res.ds["result"].values
+        )
+        self.assertEqual(len(os.listdir(self.store.result_dir("key"))), 3)
+
+        del loaded
+        gc.collect()
+        self.assertEqual(self.store.prune("key"), 1)
+
+        loaded = self.store.load("key")
+        self.assertTrue(self.store.delete("key"))
+        self.assertNotIn("key", self.store)
+        np.testing.assert_array_equal(loaded.ds["result"].values, res.ds["result"].values)
+
+    def test_prune_keeps_versions_other_processes_read(self):
+        res = self.run_bench()
+        self.store.save("key", res)
+        expected = res.ds["result"].values.copy()
+
+        parent, child = multiprocessing.Pipe()
+        reader = multiprocessing.get_context("fork").Process(
+            target=read_later, args=(self.directory, child)
+        )
+        reader.start()
+        # only the child holds its end of the pipe, so recv raises EOFError if it fails
+        child.close()
+        try:
+            self.assertEqual(parent.recv(), "loaded")
+            res.ds["result"] = res.ds["result"] + 1
+            # saving prunes the old version, which the other process is still reading
+            self.store.save("key", res)
+            self.assertEqual(len(os.listdir(self.store.result_dir("key"))), 3)
+            parent.send("read")
+            np.testing.assert_array_equal(parent.recv(), expected)
+        finally:
+            reader.join(timeout=10)
+            reader.kill()
+        # the lease of a process that has exited is ignored
+        self.assertEqual(self.store.prune("key"), 1)
+        self.assertEqual(len(os.listdir(self.store.result_dir("key"))), 2)
+
+    def test_loads_pickled_results(self):
+        res = self.run_bench()
+        with open_cache(f"{self.directory}/legacy") as cache:
+            cache["key"] = res
+            loaded = load_bench_result("key", cache, self.store)
+            np.testing.assert_array_equal(loaded.ds["result"].values, res.ds["result"].values)
+            self.assertIsNone(load_bench_result("missing", cache, self.store))
+
+    def test_cached_results_plot(self):
+        bench = bch.Bench("test_result_store_plot", bench_function, ExampleBenchCfgIn)
+        run_cfg = bch.BenchRunCfg(cache_results=True, clear_cache=True, auto_plot=False)
+        res = bench.plot_sweep(
+            input_vars=[ExampleBenchCfgIn.param.theta],
+            result_vars=[ExampleBenchCfgOut.param.out_sin],
+            run_cfg=run_cfg,
+            plot_callbacks=False,
+        )
+        run_cfg.clear_cache = False
+        run_cfg.only_plot = True
+        loaded = bench.plot_sweep(
+            input_vars=[ExampleBenchCfgIn.param.theta],
+            result_vars=[ExampleBenchCfgOut.param.out_sin],
+            run_cfg=run_cfg,
+            plot_callbacks=False,
+        )
+        self.assertIsInstance(column(loaded.ds, "out_sin"), ColumnArray)
+        np.testing.assert_array_equal(loaded.ds["out_sin"].values, res.ds["out_sin"].values)
+        self.assertIsNotNone(loaded.to_auto_plots())
@@ -0,0 +1,58 @@
+import unittest
+from uuid import uuid4
+import numpy as np
+import bencher as bch
+
+
+class CountingSweep(bch.ParametrizedSweep):
+    x = bch.IntSweep(default=0, bounds=[0, 2])
+
+    out = bch.ResultVar()
+
+    calls = 0
+
+    def __call__(self, **kwargs):
+        self.update_params_from_kwargs(**kwargs)
+        CountingSweep.calls += 1
+        self.out = self.x * 10 + CountingSweep.calls
+        return super().__call__()
+
+
+class TestReuseRepeats(unittest.TestCase):
+    def setUp(self) -> None:
+        # results saved by earlier runs of the tests must not be reused
+        self.name = f"test_reuse_repeats_{uuid4().hex}"
+
+    def run_sweep(self, repeats: int, clear_cache: bool = False, **kwargs) -> bch.BenchResult:
+        bench = bch.Bench(self.name, CountingSweep())
+        run_cfg = bch.BenchRunCfg(
+            repeats=repeats, cache_results=True, clear_cache=clear_cache, auto_plot=False, **kwargs
+        )
+        return bench.plot_sweep(input_vars=["x"], run_cfg=run_cfg, plot_callbacks=False)
+
+    def test_grow_and_shrink_repeats(self):
+        CountingSweep.calls = 0
+        res3 = self.run_sweep(3, clear_cache=True)
+        self.assertEqual(CountingSweep.calls, 9)
+
+        res5 = self.run_sweep(5)
+        # only repeats 4 and 5 are calculated
+        self.assertEqual(CountingSweep.calls, 15)
+        out3 = res3.ds["out"].transpose("x", "repeat").values
+        out5 = res5.ds["out"].transpose("x", "repeat").values
+        np.testing.assert_array_equal(out5[:, :3], out3)
+        self.assertEqual(len(np.unique(out5)), 15)
+
+        res2 = self.run_sweep(2)
+        self.assertEqual(CountingSweep.calls, 15)
+        np.testing.assert_array_equal(res2.ds["out"].transpose("x", "repeat").values, out3[:, :2])
+
+    def test_disabled(self):
+        CountingSweep.calls = 0
+        self.run_sweep(2, clear_cache=True)
+        self.run_sweep(3, reuse_repeats=False)
+        self.assertEqual(CountingSweep.calls, 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
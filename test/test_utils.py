@@ -10,8 +10,13 @@ from bencher.utils import (
     listify,
     tabs_in_markdown,
     mult_tuple,
+    canonical_bytes,
+    hash_canonical,
 )
+from bencher.worker_job import SampleKeyEncoder
 from functools import partial
+from hypothesis import given, strategies as st
+import numpy as np
 import xarray as xr
 
 
@@ -174,3 +179,44 @@ class TestBencherUtils(unittest.TestCase):
         input_str = ""
         expected_output = ""
         self.assertEqual(tabs_in_markdown(input_str), expected_output)
+
+    def test_canonical_bytes(self):
+        # values that are equal but formatted differently have the same representation
+        self.assertEqual(canonical_bytes(0.1), canonical_bytes(np.float64(0.1)))
+        self.assertEqual(canonical_bytes(3), canonical_bytes(np.int64(3)))
+        self.assertEqual(canonical_bytes({"a": 1, "b": 2}), canonical_bytes({"b": 2, "a": 1}))
+
+        # values of different types do not collide
+        self.assertNotEqual(canonical_bytes(1), canonical_bytes(1.0))
+        self.assertNotEqual(canonical_bytes(1), canonical_bytes(True))
+        self.assertNotEqual(canonical_bytes("1"), canonical_bytes(1))
+        self.assertNotEqual(canonical_bytes((1, 2)), canonical_bytes([1, 2]))
+        self.assertNotEqual(canonical_bytes(("ab", "c")), canonical_bytes(("a", "bc")))
+        self.assertNotEqual(
+            canonical_bytes(np.zeros(2, dtype=np.float32)), canonical_bytes(np.zeros(2))
+        )
+
+        self.assertEqual(len(hash_canonical((1, "a"))), 32)
+
+    @given(
+        x=st.floats(allow_nan=False),
+        y=st.integers(),
+        name=st.text(),
+        repeat=st.integers(1, 10),
+    )
+    def test_sample_key_encoder(self, x, y, name, repeat):
+        """check the keys of the encoder are the same as hashing the sorted inputs of each sample"""
+        dims_name = ["y", "x", "repeat"]
+        constant_inputs = {"name": name, "offset": 0.5}
+        values = [y, np.float64(x), repeat]
+        encoder = SampleKeyEncoder(dims_name, constant_inputs, "tag")
+        function_input = dict(zip(dims_name, values)) | constant_inputs
+        expected = hash_canonical((sorted(function_input.items()), "tag"))
+        self.assertEqual(encoder.key((0, 0, 0), values), expected)
+        # the encoded values are reused by later samples with the same indices
+        self.assertEqual(encoder.key((0, 0, 0), values), expected)
+
+        cost_encoder = SampleKeyEncoder(dims_name, constant_inputs, "tag", exclude=["repeat"])
+        function_input.pop("repeat")
+        expected = hash_canonical((sorted(function_input.items()), "tag"))
+        self.assertEqual(cost_encoder.key((0, 0, 0), values), expected)
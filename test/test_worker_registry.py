@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+import unittest
+import numpy as np
+from hypothesis import given, settings, strategies as st
+import bencher as bch
+import pickle
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from bencher.job import ExecutorPool
+from bencher.worker_registry import (
+    WorkerContext,
+    worker_key,
+    content_key,
+    register_context,
+    publish_context,
+    get_context,
+    run_in_context,
+    release_context,
+    init_worker_process,
+)
+
+
+class ExpensiveSetup(bch.ParametrizedSweep):
+    var1 = bch.IntSweep(default=0, bounds=[0, 7])
+
+    setup_calls = bch.ResultVar(doc="The number of times setup was called in the process")
+    pid = bch.ResultVar()
+    result = bch.ResultVar()
+
+    def __init__(self, **params):
+        super().__init__(**params)
+        self.model = None
+        self.num_setup_calls = 0
+        self.torn_down = False
+        self.offset = 0
+        self.payload = None
+
+    def setup(self) -> None:
+        self.num_setup_calls += 1
+        self.model = 10
+
+    def teardown(self) -> None:
+        self.model = None
+        self.torn_down = True
+
+    def __call__(self, **kwargs) -> dict:
+        self.update_params_from_kwargs(**kwargs)
+        self.setup_calls = self.num_setup_calls
+        self.pid = os.getpid()
+        self.result = self.var1 * self.model + self.offset
+        return super().__call__()
+
+
+class StatefulDoubler(bch.ParametrizedSweep):
+    """A worker that keeps the inputs of the sample in its parameters while it evaluates it"""
+
+    var1 = bch.IntSweep(default=0, bounds=[0, 9])
+
+    result = bch.ResultVar()
+
+    def __call__(self, **kwargs) -> dict:
+        self.update_params_from_kwargs(**kwargs)
+        # give the other threads time to change the parameters of a shared instance
+        time.sleep(0.01)
+        self.result = self.var1 * 2
+        return super().__call__()
+
+
+class CountSetupThreads(bch.ParametrizedSweep):
+    var1 = bch.IntSweep(default=0, bounds=[0, 9])
+
+    result = bch.ResultVar()
+
+    setup_threads = []
+    teardowns = 0
+
+    def setup(self) -> None:
+        CountSetupThreads.setup_threads.append(threading.get_ident())
+
+    def teardown(self) -> None:
+        CountSetupThreads.teardowns += 1
+
+    def __call__(self, **kwargs) -> dict:
+        self.update_params_from_kwargs(**kwargs)
+        time.sleep(0.01)
+        self.result = self.var1
+        return super().__call__()
+
+
+class TestWorkerRegistry(unittest.TestCase):
+    def test_setup_once(self):
+        worker = ExpensiveSetup()
+        key = worker_key(worker)
+        context = WorkerContext(worker)
+        register_context(key, context)
+        self.assertEqual(worker.num_setup_calls, 0)
+        self.assertIs(get_context(key), context)
+        self.assertIs(get_context(key, context=WorkerContext(ExpensiveSetup())), context)
+        self.assertEqual(worker.num_setup_calls, 1)
+        self.assertEqual(run_in_context(key, None, None, var1=2, repeat=1)["result"], 20)
+        release_context(key)
+        self.assertTrue(worker.torn_down)
+
+    def test_received_contexts_are_evicted(self):
+        first, second = ExpensiveSetup(), ExpensiveSetup()
+        first_key, second_key = worker_key(first), worker_key(second)
+        # contexts loaded from a published file were sent by another process
+        run_in_context(first_key, publish_context(first_key, WorkerContext(first)), None, var1=1)
+        self.assertEqual(first.num_setup_calls, 0)
+        first_ctx = get_context(first_key)
+        self.assertEqual(first_ctx.worker.num_setup_calls, 1)
+        run_in_context(second_key, publish_context(second_key, WorkerContext(second)), None, var1=1)
+        self.assertTrue(first_ctx.worker.torn_down)
+        self.assertFalse(get_context(second_key).worker.torn_down)
+        release_context(second_key)
+
+    def test_context_sent_once(self):
+        worker = ExpensiveSetup()
+        worker.payload = np.zeros(1000000)
+        key = worker_key(worker)
+        job_fn = partial(run_in_context, key, publish_context(key, WorkerContext(worker)), None)
+
+        # the job only refers to the context by key so it stays small no matter how big the worker is
+        self.assertLess(len(pickle.dumps(job_fn)), 1000)
+
+        with ProcessPoolExecutor(max_workers=2, initializer=init_worker_process) as executor:
+            futures = [executor.submit(job_fn, var1=i, repeat=1) for i in range(8)]
+            results = [f.result() for f in futures]
+        self.assertEqual([r["result"] for r in results], [i * 10 for i in range(8)])
+        self.assertEqual({r["setup_calls"] for r in results}, {1})
+
+    def test_changed_worker_is_sent_again(self):
+        worker = ExpensiveSetup()
+        key, _ = content_key(worker_key(worker), WorkerContext(worker))
+        worker.offset = 5
+        self.assertNotEqual(content_key(worker_key(worker), WorkerContext(worker))[0], key)
+
+        run_cfg = bch.BenchRunCfg(
+            executor=bch.Executors.MULTIPROCESSING, max_workers=1, auto_plot=False
+        )
+        with ExecutorPool() as pool, pool.activate():
+            for offset in [0, 3]:
+                worker.offset = offset
+                res = worker.to_bench(run_cfg).plot_sweep(input_vars=["var1"], plot_callbacks=False)
+                # the pooled worker process sets up the changed worker instead of reusing the old one
+                np.testing.assert_array_equal(
+                    res.ds["result"].values.flatten(), np.arange(8) * 10 + offset
+                )
+
+    @settings(deadline=20000, max_examples=4)
+    @given(
+        st.sampled_from(
+            [
+                bch.Executors.SERIAL,
+                bch.Executors.MULTIPROCESSING,
+                bch.Executors.THREADS,
+                bch.Executors.ASYNCIO,
+            ]
+        )
+    )
+    def test_setup_once_per_process(self, executor):
+        worker = ExpensiveSetup()
+        run_cfg = bch.BenchRunCfg(executor=executor, repeats=3, max_workers=2, auto_plot=False)
+        res = worker.to_bench(run_cfg).plot_sweep(plot_callbacks=False)
+
+        np.testing.assert_array_equal(res.ds["setup_calls"].values, 1)
+        expected = res.ds["var1"] * 10
+        np.testing.assert_array_equal(
+            res.ds["result"].values, expected.broadcast_like(res.ds).values
+        )
+        if executor == bch.Executors.MULTIPROCESSING:
+            # the instance in the main process is never set up
+            self.assertEqual(worker.num_setup_calls, 0)
+            self.assertNotIn(os.getpid(), res.ds["pid"].values)
+        else:
+            self.assertEqual(worker.num_setup_calls, 1)
+            self.assertTrue(worker.torn_down)
+
+    def test_threads_use_their_own_worker(self):
+        results = {}
+        for executor in [bch.Executors.SERIAL, bch.Executors.THREADS]:
+            run_cfg = bch.BenchRunCfg(executor=executor, max_workers=4, auto_plot=False)
+            res = StatefulDoubler().to_bench(run_cfg).plot_sweep(plot_callbacks=False)
+            results[executor] = res.ds["result"].values.flatten()
+        np.testing.assert_array_equal(results[bch.Executors.SERIAL], np.arange(10) * 2)
+        np.testing.assert_array_equal(results[bch.Executors.THREADS], results[bch.Executors.SERIAL])
+
+    def test_setup_once_per_thread(self):
+        CountSetupThreads.setup_threads = []
+        CountSetupThreads.teardowns = 0
+        run_cfg = bch.BenchRunCfg(
+            executor=bch.Executors.THREADS, max_workers=3, repeats=3, auto_plot=False
+        )
+        CountSetupThreads().to_bench(run_cfg).plot_sweep(plot_callbacks=False)
+        threads = CountSetupThreads.setup_threads
+        # each thread sets up its own copy of the worker once and reuses it for the rest of its samples
+        self.assertEqual(len(threads), len(set(threads)))
+        self.assertLessEqual(len(threads), run_cfg.max_workers)
+        self.assertNotIn(threading.get_ident(), threads)
+        # every copy is torn down at the end of the sweep
+        self.assertEqual(CountSetupThreads.teardowns, len(threads))